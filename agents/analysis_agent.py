@@ -8,10 +8,16 @@ from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
 import json
+from utils.indicators import compute_indicators, format_indicator_table
+from utils.llm_cache import LLMCallTimer, install_llm_cache
+from utils.tracing import install_tracing
 
 analysis_app = FastAPI()
 
-llm = ChatGoogleGenerativeAI(model="gemini-2.0-flash", google_api_key=settings.GOOGLE_API_KEY, temperature=0.5)
+llm = ChatGoogleGenerativeAI(model="gemini-2.0-flash", google_api_key=settings.GOOGLE_API_KEY, temperature=0.5, callbacks=[LLMCallTimer()])
+# Identical prompts (same question over unchanged market data) are answered from the shared cache
+llm_cache = install_llm_cache()
+install_tracing(analysis_app, stats={"llm_cache": lambda: llm_cache.stats() if llm_cache else {"enabled": False}})
 
 # Pydantic model for the incoming data from Language Agent
 class AnalysisInput(BaseModel):
@@ -22,6 +28,21 @@ class AnalysisInput(BaseModel):
     earnings_surprises: List[Dict[str, Any]]
     recent_news: List[Dict[str, Any]]
 
+class IndicatorInput(BaseModel):
+    daily_adjusted_data: Dict[str, Any]
+
+@analysis_app.post("/analysis/indicators/")
+async def compute_indicators_endpoint(data: IndicatorInput):
+    """
+    Computes technical indicators for all tickers in one vectorized pass, without calling the LLM.
+    """
+    try:
+        indicators = compute_indicators(data.daily_adjusted_data)
+        return {"indicators": indicators, "table": format_indicator_table(indicators)}
+    except Exception as e:
+        print(f"Error caught in compute_indicators_endpoint: {e}")
+        raise HTTPException(status_code=500, detail=f"Error computing indicators: {e}")
+
 @analysis_app.post("/analysis/analyze_brief_data/")
 async def analyze_brief_data_endpoint(data: AnalysisInput):
     """
@@ -47,20 +68,13 @@ async def analyze_brief_data_endpoint(data: AnalysisInput):
             analysis_context_str += "\n"
 
         if data.daily_adjusted_data:
-            analysis_context_str += "Historical Daily Adjusted Data:\n"
-            for ticker, av_wrapped_daily_data in data.daily_adjusted_data.items():
-                daily_data = av_wrapped_daily_data.get("Time Series (Daily)", {})
-                if daily_data:
-                    sorted_dates = sorted(daily_data.keys(), reverse=True)
-                    analysis_context_str += f"  {ticker} (latest 5 days):\n"
-                    for i in range(min(5, len(sorted_dates))):
-                        date_str = sorted_dates[i]
-                        day_data = daily_data[date_str]
-                        analysis_context_str += (
-                            f"    {date_str}: Close={day_data.get('4. close', 'N/A')}, "
-                            f"Volume={day_data.get('5. volume', 'N/A')}\n"
-                        )
-            analysis_context_str += "\n"
+            indicators = compute_indicators(data.daily_adjusted_data)
+            if indicators:
+                analysis_context_str += (
+                    "Technical Indicators (computed from full daily history; returns, volatility, "
+                    "drawdown and 52-week position in %, VolZ = latest volume z-score vs prior 20 days):\n"
+                )
+                analysis_context_str += format_indicator_table(indicators) + "\n\n"
 
         if data.earnings_surprises:
             analysis_context_str += "Earnings Surprises:\n"
@@ -89,7 +103,8 @@ async def analyze_brief_data_endpoint(data: AnalysisInput):
              "**CRITICAL: If 'Portfolio Initial Data' is provided, you MUST analyze the performance of each stock within that portfolio "
              "relative to its allocation, and assess the portfolio's overall health or recent activity. "
              "Relate individual stock performance and news to their impact on the portfolio where relevant.**"
-             "\n\nFocus on connecting different data points to provide a comprehensive view. For historical data, identify significant price movements or volume changes. "
+             "\n\nFocus on connecting different data points to provide a comprehensive view. For historical data, use the precomputed technical indicators "
+             "(returns, volatility, moving averages, drawdown, volume z-scores, 52-week position) to identify significant price movements or volume changes. "
              "For news, explain its potential impact on relevant companies or the broader market, considering sentiment and direct effects. "
              "Identify opportunities or risks where applicable. "
              "If any data points are missing or indicate issues, mention them. "
@@ -99,7 +114,7 @@ async def analyze_brief_data_endpoint(data: AnalysisInput):
         ])
 
         chain = prompt_template | llm | StrOutputParser()
-        analysis_summary = chain.invoke({"context_data": analysis_context_str})
+        analysis_summary = await chain.ainvoke({"context_data": analysis_context_str})
 
         return {"summary": analysis_summary}
 
@@ -107,5 +122,9 @@ async def analyze_brief_data_endpoint(data: AnalysisInput):
         print(f"Error caught in analysis_brief_data_endpoint: {e}")
         raise HTTPException(status_code=500, detail=f"Error during analysis: {e}")
 
+@analysis_app.get("/analysis/llm_cache/stats")
+async def llm_cache_stats():
+    return llm_cache.stats() if llm_cache else {"enabled": False}
+
 if __name__ == "__main__":
     uvicorn.run(analysis_app, host="0.0.0.0", port=settings.ANALYSIS_AGENT_PORT)
\ No newline at end of file
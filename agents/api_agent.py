@@ -5,13 +5,154 @@ import requests
 import uvicorn
 from datetime import datetime, date # Import date as well
 import json # For printing debug, if needed
+from typing import Dict, List, Optional
+import numpy as np
+import pandas as pd
 
 import yfinance as yf # NEW IMPORT
+from data_ingestion.ohlcv_store import OHLCV_DTYPE, OHLCVStore, period_row_limit, period_start
+from utils.tracing import install_tracing, traced
+from utils.ttl_cache import TTLCache
 
 # Initialize FastAPI app
 api_app = FastAPI()
 
+# In-process caches shared by all requests. Quotes go stale quickly; daily bars only change once a day.
+# Keys are upper-cased symbols for quotes and (symbol, period, start, end, format) for daily history.
+quote_cache = TTLCache(settings.QUOTE_CACHE_TTL_SECONDS, settings.QUOTE_CACHE_MAX_ENTRIES, name="quotes")
+history_cache = TTLCache(settings.HISTORY_CACHE_TTL_SECONDS, settings.HISTORY_CACHE_MAX_ENTRIES, name="daily_adjusted")
+
+# Local on-disk daily history; only bars missing from it are fetched from yfinance
+ohlcv_store = OHLCVStore()
+
+install_tracing(api_app, stats={"quotes": quote_cache.stats, "daily_adjusted": history_cache.stats})
+
+def _parse_symbols(symbols: str) -> List[str]:
+    """Splits a comma-separated symbols query parameter into unique, upper-cased tickers."""
+    parsed = list(dict.fromkeys(s.strip().upper() for s in symbols.split(",") if s.strip()))
+    if not parsed:
+        raise HTTPException(status_code=400, detail="At least one symbol must be provided.")
+    if len(parsed) > settings.API_BATCH_MAX_SYMBOLS:
+        raise HTTPException(status_code=400, detail=f"At most {settings.API_BATCH_MAX_SYMBOLS} symbols can be requested at once.")
+    return parsed
+
+@traced("upstream:yfinance")
+def _download_histories(symbols: List[str], auto_adjust: bool, period: Optional[str] = None, start: Optional[date] = None) -> Dict[str, pd.DataFrame]:
+    """Downloads daily bars for all symbols in one bulk yfinance call and splits them per symbol.
+
+    Bars are requested from `start` when given, otherwise for `period`.
+    Symbols that yfinance could not resolve are simply absent from the result.
+    """
+    window = {"start": start.isoformat()} if start else {"period": period or "max"}
+    bulk = yf.download(
+        symbols, interval="1d", group_by="ticker",
+        auto_adjust=auto_adjust, actions=False, threads=True, progress=False, **window
+    )
+    histories = {}
+    if bulk is None or bulk.empty:
+        return histories
+    for symbol in symbols:
+        if isinstance(bulk.columns, pd.MultiIndex):
+            if symbol not in bulk.columns.get_level_values(0):
+                continue
+            hist = bulk[symbol]
+        else:
+            # Older yfinance versions return flat columns for a single symbol
+            hist = bulk
+        hist = hist.dropna(how="all")
+        if not hist.empty:
+            histories[symbol] = hist
+    return histories
+
+def _quote_from_history(symbol: str, hist: pd.DataFrame) -> dict:
+    """Builds a "Global Quote" payload from the latest daily bars of a bulk download."""
+    latest = hist.iloc[-1]
+    last_price = float(latest["Close"])
+    previous_close = float(hist["Close"].iloc[-2]) if len(hist) > 1 else None
+    normalized_quote = {
+        "symbol": symbol,
+        "open": float(latest["Open"]),
+        "high": float(latest["High"]),
+        "low": float(latest["Low"]),
+        "price": last_price,
+        "volume": int(latest["Volume"]),
+        "latest_trading_day": hist.index[-1].strftime('%Y-%m-%d'),
+        "previous_close": previous_close if previous_close is not None else 'N/A',
+        "change": round(last_price - previous_close, 2) if previous_close is not None else 'N/A',
+        "change_percent": f"{(last_price - previous_close) / previous_close * 100:.2f}%" if previous_close else 'N/A'
+    }
+    return {"Global Quote": normalized_quote}
+
+def _rows_from_history(hist: pd.DataFrame) -> np.ndarray:
+    """Converts an auto-adjusted yfinance history DataFrame into OHLCV store rows (vectorized)."""
+    hist = hist.dropna(subset=["Close"])
+    index = pd.DatetimeIndex(hist.index)
+    if index.tz is not None:
+        index = index.tz_localize(None)
+    rows = np.empty(len(hist), dtype=OHLCV_DTYPE)
+    rows["date"] = index.values.astype("datetime64[D]").astype(np.int64)
+    rows["open"] = hist["Open"].to_numpy(dtype=np.float64)
+    rows["high"] = hist["High"].to_numpy(dtype=np.float64)
+    rows["low"] = hist["Low"].to_numpy(dtype=np.float64)
+    rows["close"] = hist["Close"].to_numpy(dtype=np.float64)
+    rows["adj_close"] = rows["close"] # auto_adjust=True already folds adjustments into OHLC
+    rows["volume"] = hist["Volume"].fillna(0).to_numpy(dtype=np.float64)
+    return rows
+
+def _fetch_history_rows(symbols: List[str], fetch_from: Optional[date]) -> Dict[str, np.ndarray]:
+    """Bulk-fetches auto-adjusted daily bars from fetch_from (None = full history) for the OHLCV store."""
+    histories = _download_histories(symbols, auto_adjust=True, start=fetch_from)
+    return {symbol: _rows_from_history(hist) for symbol, hist in histories.items()}
+
+def _time_series_from_rows(rows: np.ndarray) -> dict:
+    """Converts OHLCV store rows into AlphaVantage's "Time Series (Daily)" structure."""
+    # Keys will be dates, values will be dictionaries of OHLCV.
+    # AlphaVantage returns latest date first, so iterate in reverse for consumers.
+    date_strs = rows["date"].astype("datetime64[D]").astype(str)
+    ordered_time_series = {
+        date_str: {
+            "1. open": f"{open_:.4f}",
+            "2. high": f"{high:.4f}",
+            "3. low": f"{low:.4f}",
+            "4. close": f"{close:.4f}", # This is the adjusted close
+            "5. volume": f"{int(volume)}"
+        }
+        for date_str, open_, high, low, close, volume in zip(
+            date_strs[::-1], rows["open"][::-1], rows["high"][::-1], rows["low"][::-1], rows["close"][::-1], rows["volume"][::-1]
+        )
+    }
+    return {"Time Series (Daily)": ordered_time_series} # Wrap in "Time Series (Daily)" to match previous structure
+
+def _columnar_from_rows(rows: np.ndarray) -> dict:
+    """Converts OHLCV store rows into parallel, oldest-first numeric arrays."""
+    return {
+        "format": "columnar",
+        "dates": rows["date"].astype("datetime64[D]").astype(str).tolist(),
+        "open": rows["open"].round(4).tolist(),
+        "high": rows["high"].round(4).tolist(),
+        "low": rows["low"].round(4).tolist(),
+        "close": rows["close"].round(4).tolist(), # This is the adjusted close
+        "volume": rows["volume"].astype(np.int64).tolist()
+    }
+
+# Wire formats for daily history. "alphavantage" is the legacy per-day dict of formatted strings.
+HISTORY_FORMATS = {
+    "columnar": _columnar_from_rows,
+    "alphavantage": _time_series_from_rows,
+}
+
+def _history_formatter(fmt: str):
+    if fmt not in HISTORY_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {', '.join(HISTORY_FORMATS)}.")
+    return HISTORY_FORMATS[fmt]
+
 def get_yfinance_quote(symbol: str) -> dict:
+    """Returns the real-time quote for a symbol, served from the quote cache when fresh."""
+    symbol = symbol.upper()
+    return quote_cache.get_or_load(symbol, lambda: _fetch_yfinance_quote(symbol))
+
+@traced("upstream:yfinance")
+def _fetch_yfinance_quote(symbol: str) -> dict:
     """Fetches real-time quote for a given stock symbol using yfinance."""
     try:
         ticker = yf.Ticker(symbol)
@@ -51,68 +192,165 @@ def get_yfinance_quote(symbol: str) -> dict:
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error fetching quote for {symbol}: {e}")
 
-def get_yfinance_daily_adjusted(symbol: str, period: str = "6mo") -> dict:
-    """Fetches daily adjusted historical data for a given stock symbol using yfinance.
-    
-    Args:
-        symbol (str): The stock ticker symbol.
-        period (str): Valid periods: "1d", "5d", "1mo", "3mo", "6mo", "1y", "2y", "5y", "10y", "ytd", "max".
-                      "6mo" by default to get a good range for analysis.
+def _load_daily_adjusted(symbols: List[str], period: str, start: Optional[date] = None, end: Optional[date] = None, fmt: str = "columnar"):
+    """Serves daily history for symbols from the local OHLCV store, syncing only missing bars upstream.
+
+    Returns (payloads, errors) dicts keyed by symbol.
     """
     try:
-        ticker = yf.Ticker(symbol)
-        # We need to explicitly fetch history for adjusted close
-        hist = ticker.history(period=period, interval="1d", actions=False, auto_adjust=True)
-        
-        if hist.empty:
-            raise HTTPException(status_code=404, detail=f"No historical data found for {symbol} for period {period}.")
-
-        # Convert DataFrame to a dictionary matching AlphaVantage's "Time Series (Daily)" structure
-        # Keys will be dates, values will be dictionaries of OHLCV
-        time_series_data = {}
-        for index, row in hist.iterrows():
-            date_str = index.strftime('%Y-%m-%d')
-            time_series_data[date_str] = {
-                "1. open": f"{row['Open']:.4f}",
-                "2. high": f"{row['High']:.4f}",
-                "3. low": f"{row['Low']:.4f}",
-                "4. close": f"{row['Close']:.4f}", # This is the adjusted close
-                "5. volume": f"{int(row['Volume'])}"
-                # AlphaVantage also has 'adjusted close' and 'dividend amount' and 'split coefficient'
-                # We can add '6. adjusted close' if needed, which is same as '4. close' here due to auto_adjust=True
-            }
-        
-        # Sort by date in ascending order (AlphaVantage usually provides latest first, so reverse to match)
-        # Or you can reverse it when you return if the consuming agent expects latest first.
-        # For simplicity, let's keep it in the order yfinance gives, which is oldest first.
-        # LangChain LLM will process the entire context.
+        window_start = start or period_start(period)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    row_limit = None if start else period_row_limit(period)
+    formatter = _history_formatter(fmt)
 
-        # AlphaVantage returns latest date first, so reverse the dictionary for consistent consumption
-        # Or simply, the LLM will be given all data and should infer.
-        # For this specific case, let's reverse to match AV behavior if needed by LLM directly.
-        # No, let's keep it simple. The LLM can handle unordered context.
-        # Re-creating a dict to maintain key order if needed for specific use cases.
-        ordered_time_series = dict(sorted(time_series_data.items(), reverse=True))
+    errors = ohlcv_store.sync_many(symbols, window_start, _fetch_history_rows)
+    payloads = {}
+    for symbol in symbols:
+        if symbol in errors:
+            continue
+        rows = ohlcv_store.read(symbol, window_start, end)
+        if row_limit is not None and rows is not None:
+            rows = rows[-row_limit:]
+        if rows is None or len(rows) == 0:
+            errors[symbol] = f"No historical data found for {symbol} for period {period}."
+            continue
+        payloads[symbol] = formatter(rows)
+    return payloads, errors
 
+def get_yfinance_daily_adjusted(symbol: str, period: str = "6mo", start: Optional[date] = None, end: Optional[date] = None, fmt: str = "columnar") -> dict:
+    """Returns daily adjusted history for a symbol.
 
-        return {"Time Series (Daily)": ordered_time_series} # Wrap in "Time Series (Daily)" to match previous structure
+    Args:
+        symbol (str): The stock ticker symbol.
+        period (str): Valid periods: "1d", "5d", "1mo", "3mo", "6mo", "1y", "2y", "5y", "10y", "ytd", "max".
+                      "6mo" by default to get a good range for analysis. Ignored when `start` is given.
+        start, end (date): Optional explicit date range (inclusive).
+        fmt (str): "columnar" for parallel numeric arrays, or "alphavantage" for the legacy
+                   {"Time Series (Daily)": {date: {"4. close": "..."}}} shape.
 
-    except yf.TickerError as e:
-        raise HTTPException(status_code=404, detail=f"Invalid stock symbol {symbol}: {e}")
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error fetching historical data for {symbol}: {e}")
+    Served from the history cache when fresh, otherwise from the local OHLCV store, which only
+    goes to yfinance for bars it does not have yet.
+    """
+    symbol = symbol.upper()
+    _history_formatter(fmt)
+
+    def load():
+        try:
+            payloads, errors = _load_daily_adjusted([symbol], period, start, end, fmt)
+        except HTTPException:
+            raise
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Error fetching historical data for {symbol}: {e}")
+        if symbol in errors:
+            raise HTTPException(status_code=404, detail=errors[symbol])
+        return payloads[symbol]
 
+    return history_cache.get_or_load((symbol, period, start, end, fmt), load)
 
+# Endpoints are plain `def` so FastAPI runs the blocking yfinance calls in its threadpool,
+# which also lets concurrent requests for the same symbol share one upstream fetch.
 @api_app.get("/api/stock_quote/{symbol}")
-async def get_stock_quote_endpoint(symbol: str):
+def get_stock_quote_endpoint(symbol: str):
     """Endpoint to get real-time stock quote using yfinance."""
     return get_yfinance_quote(symbol)
 
 @api_app.get("/api/daily_adjusted/{symbol}")
-async def get_daily_adjusted_endpoint(symbol: str):
-    """Endpoint to get daily adjusted historical data using yfinance."""
-    # We can pass the period if we want to expose it in the API, or keep it fixed
-    return get_yfinance_daily_adjusted(symbol, period="6mo") # Default to 6 months of data
+def get_daily_adjusted_endpoint(symbol: str, period: str = "6mo", start: Optional[date] = None, end: Optional[date] = None, format: str = "columnar"):
+    """Endpoint to get daily adjusted historical data, by period (default 6 months) or start/end dates.
+
+    `format=alphavantage` returns the legacy AlphaVantage-shaped payload.
+    """
+    return get_yfinance_daily_adjusted(symbol, period=period, start=start, end=end, fmt=format)
+
+def get_yfinance_quotes(symbols: List[str]) -> dict:
+    """Fetches quotes for many symbols, with a single bulk yfinance download for the cache misses.
+
+    Returns per-symbol "Global Quote" payloads under "quotes" and per-symbol error messages under "errors".
+    """
+    def load(missing: List[str]):
+        values, errors = {}, {}
+        # A few days of unadjusted bars gives both the latest price and the previous close
+        histories = _download_histories(missing, auto_adjust=False, period="5d")
+        for symbol in missing:
+            hist = histories.get(symbol)
+            if hist is None:
+                errors[symbol] = f"No real-time quote data found for {symbol}."
+                continue
+            try:
+                values[symbol] = _quote_from_history(symbol, hist)
+            except Exception as e:
+                errors[symbol] = f"Error building quote for {symbol}: {e}"
+        return values, errors
+
+    try:
+        quotes, errors = quote_cache.get_many_or_load(symbols, load)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error fetching quotes for {', '.join(symbols)}: {e}")
+    return {"quotes": quotes, "errors": errors}
+
+def get_yfinance_daily_adjusted_batch(symbols: List[str], period: str = "6mo", start: Optional[date] = None, end: Optional[date] = None, fmt: str = "columnar") -> dict:
+    """Fetches daily adjusted history for many symbols; cache misses are synced with one bulk yfinance download.
+
+    Returns per-symbol history payloads (in `fmt`) under "data" and per-symbol error messages under "errors".
+    """
+    _history_formatter(fmt)
+
+    def load(missing_keys: List[tuple]):
+        payloads, errors = _load_daily_adjusted([key[0] for key in missing_keys], period, start, end, fmt)
+        return (
+            {key: payloads[key[0]] for key in missing_keys if key[0] in payloads},
+            {key: errors[key[0]] for key in missing_keys if key[0] in errors}
+        )
+
+    try:
+        data, errors = history_cache.get_many_or_load([(symbol, period, start, end, fmt) for symbol in symbols], load)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error fetching historical data for {', '.join(symbols)}: {e}")
+    return {
+        "data": {key[0]: payload for key, payload in data.items()},
+        "errors": {key[0]: detail for key, detail in errors.items()}
+    }
+
+@api_app.get("/api/stock_quotes")
+def get_stock_quotes_endpoint(symbols: str):
+    """Endpoint to get real-time quotes for comma-separated symbols in one bulk request."""
+    return get_yfinance_quotes(_parse_symbols(symbols))
+
+@api_app.get("/api/daily_adjusted_batch")
+def get_daily_adjusted_batch_endpoint(symbols: str, period: str = "6mo", start: Optional[date] = None, end: Optional[date] = None, format: str = "columnar"):
+    """Endpoint to get daily adjusted historical data for comma-separated symbols in one bulk request."""
+    return get_yfinance_daily_adjusted_batch(_parse_symbols(symbols), period=period, start=start, end=end, fmt=format)
+
+@api_app.get("/api/cache/stats")
+async def get_cache_stats_endpoint():
+    """Endpoint to inspect hit/miss/eviction counters of the quote and history caches."""
+    return {"quotes": quote_cache.stats(), "daily_adjusted": history_cache.stats()}
+
+@api_app.post("/api/cache/invalidate")
+async def invalidate_cache_endpoint(symbols: Optional[str] = None, cache: str = "all"):
+    """Endpoint to drop cached entries for comma-separated symbols (or everything if omitted).
+
+    `cache` selects "quotes", "daily_adjusted" or "all".
+    """
+    if cache not in ("quotes", "daily_adjusted", "all"):
+        raise HTTPException(status_code=400, detail="cache must be one of 'quotes', 'daily_adjusted' or 'all'.")
+    targets = {"quotes": quote_cache, "daily_adjusted": history_cache}
+    if cache != "all":
+        targets = {cache: targets[cache]}
+
+    removed = {}
+    if symbols:
+        symbol_set = set(_parse_symbols(symbols))
+        if "quotes" in targets:
+            removed["quotes"] = quote_cache.invalidate_where(lambda key: key in symbol_set)
+        if "daily_adjusted" in targets:
+            removed["daily_adjusted"] = history_cache.invalidate_where(lambda key: key[0] in symbol_set)
+    else:
+        removed = {name: target.clear() for name, target in targets.items()}
+    return {"status": "success", "removed": removed}
 
 if __name__ == "__main__":
     uvicorn.run(api_app, host="0.0.0.0", port=settings.API_AGENT_PORT)
\ No newline at end of file
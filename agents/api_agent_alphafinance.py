@@ -4,15 +4,18 @@ import requests
 import uvicorn
 from datetime import datetime
 import json
+from utils.tracing import install_tracing, traced
 
 # Initialize FastAPI app
 api_app = FastAPI()
+install_tracing(api_app)
 
 class AlphaVantageLoader:
     def __init__(self, api_key: str):
         self.api_key = api_key
         self.base_url = "https://www.alphavantage.co/query"
 
+    @traced("upstream:alphavantage")
     def get_quote_endpoint(self, symbol: str) -> dict: # Added symbol parameter
         """Fetches real-time quote for a given stock symbol."""
         params = {
@@ -50,6 +53,7 @@ class AlphaVantageLoader:
         except requests.exceptions.RequestException as e:
             raise HTTPException(status_code=503, detail=f"Error contacting AlphaVantage API: {e}")
 
+    @traced("upstream:alphavantage")
     def get_daily_adjusted(self, symbol: str) -> dict: # Added symbol parameter
         """Fetches daily adjusted historical data for a given stock symbol."""
         params = {
@@ -6,18 +6,28 @@ from langgraph.graph import StateGraph, END
 from typing import TypedDict, Annotated, List, Dict, Any
 from langchain_core.messages import BaseMessage, HumanMessage
 import operator
-import requests
+import asyncio
+import httpx
 from config.settings import settings
+from utils.context_builder import build_brief_context
+from utils.llm_cache import LLMCallTimer, install_llm_cache, llm_cache_ttl
+from utils.ticker_resolver import TickerResolver
+from utils.sse import SSE_HEADERS, SSE_MEDIA_TYPE, format_sse
+from utils.agent_client import agent_client
+from utils.tracing import install_tracing, traced
+from utils.timeseries import to_columnar
+from data_ingestion.news_loader import NewsLoader
 import json
 from fastapi import FastAPI, HTTPException
-from datetime import datetime, timedelta
+from fastapi.responses import StreamingResponse
 import uvicorn
 
 # Import the new models
 from orchestrator.models import LanguageAgentRequest, TickerExtraction
 
 # Initialize LLM
-llm = ChatGoogleGenerativeAI(model="gemini-2.0-flash", google_api_key=settings.GOOGLE_API_KEY, temperature=0.7)
+llm = ChatGoogleGenerativeAI(model="gemini-2.0-flash", google_api_key=settings.GOOGLE_API_KEY, temperature=0.7, callbacks=[LLMCallTimer()])
+llm_cache = install_llm_cache()
 
 # LangChain structured output for ticker extraction
 ticker_extractor_llm = llm.with_structured_output(TickerExtraction)
@@ -26,6 +36,8 @@ ticker_extraction_prompt = ChatPromptTemplate.from_messages([
     ("human", "{question}")
 ])
 ticker_extraction_chain = ticker_extraction_prompt | ticker_extractor_llm
+ticker_resolver = TickerResolver.from_file(settings.TICKER_SYMBOLS_PATH)
+news_loader = NewsLoader(resolver=ticker_resolver)
 
 # Define State for Langgraph
 class AgentState(TypedDict):
@@ -38,69 +50,61 @@ class AgentState(TypedDict):
     recent_news: List[Dict[str, Any]]
     retrieved_context: List[str]
     final_brief: str
+    context_usage: Dict[str, Any]
     error: str
 
-# --- Helper for News API ---
-def fetch_financial_news(query: str, api_key: str, num_articles: int = 3) -> List[Dict[str, Any]]:
-    """
-    Fetches recent financial news articles using NewsAPI.org.
-    Prioritizes English articles from the last 7 days.
-    """
-    if not api_key:
-        print("NEWS_API_KEY is not set. Skipping news retrieval.")
-        return []
-
-    base_url = "https://newsapi.org/v2/everything"
-    from_date = (datetime.now() - timedelta(days=7)).isoformat(timespec='minutes')
-
-    params = {
-        "q": query,
-        "language": "en",
-        "sortBy": "relevancy",
-        "from": from_date,
-        "apiKey": api_key,
-        "pageSize": num_articles
-    }
+# --- Langgraph Nodes ---
 
-    try:
-        response = requests.get(base_url, params=params)
-        response.raise_for_status()
-        data = response.json()
-        articles = data.get("articles", [])
-        
-        filtered_articles = []
-        for article in articles:
-            if article.get("title") and article.get("description"):
-                filtered_articles.append({
-                    "source": article.get("source", {}).get("name", "N/A"),
-                    "title": article.get("title"),
-                    "description": article.get("description"),
-                    "url": article.get("url")
-                })
-        return filtered_articles
-    except requests.exceptions.RequestException as e:
-        print(f"Error fetching news from NewsAPI: {e}")
+async def _quotable(symbols: List[str]) -> List[str]:
+    """The symbols the API Agent can quote, checked in one batch call; a hallucinated ticker would
+    otherwise fail the whole brief in retrieve_data."""
+    if not symbols:
         return []
-    except Exception as e:
-        print(f"Unexpected error in news fetching: {e}")
+    try:
+        result = await agent_client.get_json("api", "/api/stock_quotes", {"symbols": ",".join(symbols)})
+    except httpx.HTTPError as e:
+        print(f"Could not verify tickers {symbols} with the API Agent ({e}); dropping them")
         return []
+    rejected = set((result.get("errors") or {}).keys())
+    return [s for s in symbols if s not in rejected]
 
-# --- Langgraph Nodes ---
+async def extract_tickers(state: AgentState):
+    """Extracts stock tickers from the user's question.
 
-def extract_tickers(state: AgentState):
-    """Extracts stock tickers from the user's question using the LLM."""
+    Explicit symbols and known company names are resolved locally from the symbol file; the LLM is
+    only asked when that pass finds nothing or something ambiguous. The symbol file is a small
+    curated list, not the market, so symbol-shaped LLM tickers missing from it are checked with one
+    batch quote call and kept only if the API Agent can quote them.
+    """
     print("---EXTRACTING TICKERS---")
     question = state["question"]
+    resolution = ticker_resolver.resolve(question)
+    if resolution.is_confident:
+        print(f"Extracted Tickers (local): {resolution.tickers}")
+        return {"extracted_tickers": resolution.tickers}
+
     try:
-        extraction_result: TickerExtraction = ticker_extraction_chain.invoke({"question": question})
-        tickers = extraction_result.tickers
+        # The extracted tickers depend only on the question, so they can be cached far longer than briefs
+        with llm_cache_ttl(settings.LLM_CACHE_TICKER_TTL_SECONDS):
+            extraction_result: TickerExtraction = await ticker_extraction_chain.ainvoke({"question": question})
+        known, unknown = ticker_resolver.validate(extraction_result.tickers)
+        listed = await _quotable([s for s in unknown if TickerResolver.looks_like_symbol(s)])
+        if unknown:
+            print(f"Tickers not in the symbol file kept after a quote check: {listed}; "
+                  f"dropped: {[s for s in unknown if s not in listed]}")
+        keep = set(known) | set(listed)
+        tickers = [s for s in dict.fromkeys(TickerResolver.normalize(t) for t in extraction_result.tickers if t and t.strip()) if s in keep]
         print(f"Extracted Tickers: {tickers}")
         return {"extracted_tickers": tickers}
     except Exception as e:
         print(f"Error extracting tickers: {e}")
+        local_tickers = resolution.tickers + resolution.ambiguous
+        if local_tickers:
+            print(f"Falling back to locally resolved tickers: {local_tickers}")
+            return {"extracted_tickers": local_tickers}
         return {"error": f"Error extracting tickers: {e}"}
 
-def retrieve_data(state: AgentState):
+async def retrieve_data(state: AgentState):
     print("---RETRIEVING DATA---")
     extracted_tickers = state["extracted_tickers"]
     stock_quotes = {}
@@ -109,29 +113,44 @@ def retrieve_data(state: AgentState):
 
     if not extracted_tickers:
         print("No specific tickers extracted. Proceeding without specific stock data.")
-        return state
-
-    for ticker in extracted_tickers:
-        try:
-            quote_response = requests.get(f"http://localhost:{settings.API_AGENT_PORT}/api/stock_quote/{ticker}")
-            quote_response.raise_for_status()
-            stock_quotes[ticker] = quote_response.json()
-            print(f"Retrieved quote for {ticker}: {stock_quotes[ticker]}")
-
-            daily_response = requests.get(f"http://localhost:{settings.API_AGENT_PORT}/api/daily_adjusted/{ticker}")
-            daily_response.raise_for_status()
-            daily_adjusted_data[ticker] = daily_response.json()
-            print(f"Retrieved daily adjusted data for {ticker}")
-
-        except requests.exceptions.RequestException as e:
-            errors.append(f"Could not retrieve data for {ticker}: {e}")
-            print(f"Error retrieving data for {ticker}: {e}")
-        except HTTPException as e:
-            errors.append(f"API Agent error for {ticker}: {e.detail}")
-            print(f"API Agent error for {ticker}: {e.detail}")
-        except Exception as e:
-            errors.append(f"Unexpected error for {ticker}: {e}")
-            print(f"Unexpected error for {ticker}: {e}")
+        # Only return keys this node owns; retrieve_news writes to the state in the same step.
+        return {}
+
+    # Fetch quotes and history through the API Agent's batch endpoints, one bulk request per
+    # chunk of tickers. Chunks are fanned out concurrently, capped by API_FETCH_CONCURRENCY,
+    # so wall-clock time tracks the slowest call rather than the number of tickers.
+    batch_size = max(1, settings.API_BATCH_SIZE)
+    ticker_batches = [extracted_tickers[i:i + batch_size] for i in range(0, len(extracted_tickers), batch_size)]
+    semaphore = asyncio.Semaphore(max(1, settings.API_FETCH_CONCURRENCY))
+
+    async def fetch(path: str, params: Dict[str, Any]):
+        async with semaphore:
+            return await agent_client.get_json("api", path, params)
+
+    requests_made = []
+    for batch in ticker_batches:
+        params = {"symbols": ",".join(batch), "period": settings.HISTORY_PERIOD}
+        requests_made.append((batch, "quotes", fetch("/api/stock_quotes", params)))
+        requests_made.append((batch, "data", fetch("/api/daily_adjusted_batch", {**params, "format": "columnar"})))
+    results = await asyncio.gather(*(call for _, _, call in requests_made), return_exceptions=True)
+
+    for (batch, result_key, _), result in zip(requests_made, results):
+        target = stock_quotes if result_key == "quotes" else daily_adjusted_data
+        if isinstance(result, httpx.HTTPError):
+            errors.extend(f"Could not retrieve data for {ticker}: {result}" for ticker in batch)
+            print(f"Error retrieving data for {', '.join(batch)}: {result}")
+            continue
+        if isinstance(result, Exception):
+            errors.extend(f"Unexpected error for {ticker}: {result}" for ticker in batch)
+            print(f"Unexpected error for {', '.join(batch)}: {result}")
+            continue
+
+        target.update(result.get(result_key, {}))
+        for ticker, detail in result.get("errors", {}).items():
+            errors.append(f"API Agent error for {ticker}: {detail}")
+            print(f"API Agent error for {ticker}: {detail}")
+
+    print(f"Retrieved quotes for {list(stock_quotes)} and daily adjusted data for {list(daily_adjusted_data)}")
 
     # No hardcoded earnings surprises here
     earnings_surprises = []
@@ -145,38 +164,30 @@ def retrieve_data(state: AgentState):
         "error": error_message
     }
 
-def retrieve_news(state: AgentState):
+async def retrieve_news(state: AgentState):
     print("---RETRIEVING NEWS---")
     question = state["question"]
     extracted_tickers = state["extracted_tickers"]
-    recent_news = []
 
     news_queries = []
     if extracted_tickers:
-        news_queries.extend([f"{ticker} stock news" for ticker in extracted_tickers])
+        news_queries.extend([NewsLoader.ticker_query(ticker) for ticker in extracted_tickers])
     
     if not news_queries or len(extracted_tickers) < 2:
         news_queries.append(question)
 
-    unique_queries = list(set(news_queries))[:2]
+    unique_queries = list(dict.fromkeys(news_queries))[:2]
 
     for q in unique_queries:
         print(f"Fetching news for query: '{q}'")
-        articles = fetch_financial_news(q, settings.NEWS_API_KEY)
-        recent_news.extend(articles)
-    
-    seen = set()
-    deduped_news = []
-    for news_item in recent_news:
-        identifier = (news_item.get("title"), news_item.get("url"))
-        if identifier not in seen:
-            deduped_news.append(news_item)
-            seen.add(identifier)
+    # Queries run concurrently and are served from the news cache when fresh; syndicated copies of
+    # one story are collapsed so the prompt carries distinct articles.
+    deduped_news = await news_loader.search(unique_queries, tickers=extracted_tickers, max_articles=settings.NEWS_MAX_ARTICLES)
 
     print(f"Retrieved {len(deduped_news)} news articles.")
     return {"recent_news": deduped_news}
 
-def analyze_data(state: AgentState):
+async def analyze_data(state: AgentState):
     print("---ANALYZING DATA---")
     question = state["question"]
     portfolio_data = state["portfolio_data"]
@@ -196,16 +207,11 @@ def analyze_data(state: AgentState):
 
     retrieved_context = []
     try:
-        analysis_response = requests.post(
-            f"http://localhost:{settings.ANALYSIS_AGENT_PORT}/analysis/analyze_brief_data/",
-            json=analysis_input
-        )
-        analysis_response.raise_for_status()
-        analysis_result = analysis_response.json()
+        analysis_result = await agent_client.post_json("analysis", "/analysis/analyze_brief_data/", analysis_input)
 
         retrieved_context.append(f"Analysis insights: {analysis_result.get('summary', 'No specific summary provided.')}")
 
-    except requests.exceptions.RequestException as e:
+    except httpx.HTTPError as e:
         print(f"Error contacting analysis agent: {e}")
         retrieved_context.append(f"Error contacting analysis agent: {e}")
     except Exception as e:
@@ -240,35 +246,27 @@ def analyze_data(state: AgentState):
              retrieved_context.append(f"Real-time quote for {ticker}: Data not fully available.")
     
     if daily_adjusted_data:
-        for ticker, av_wrapped_daily_data in daily_adjusted_data.items():
-            daily_data = av_wrapped_daily_data.get("Time Series (Daily)", {})
-            if daily_data:
-                dates = sorted(daily_data.keys())
+        for ticker, history_payload in daily_adjusted_data.items():
+            history = to_columnar(history_payload)
+            if history:
+                dates = history["dates"]
                 if len(dates) >= 2:
                     oldest_date = dates[0]
                     latest_date = dates[-1]
-                    
-                    oldest_close = daily_data[oldest_date].get('4. close', 'N/A')
-                    latest_close = daily_data[latest_date].get('4. close', 'N/A')
-
-                    try:
-                        oldest_close_f = float(oldest_close) if oldest_close != 'N/A' else None
-                        latest_close_f = float(latest_close) if latest_close != 'N/A' else None
-
-                        if oldest_close_f is not None and latest_close_f is not None and oldest_close_f != 0:
-                            price_change_over_period = ((latest_close_f - oldest_close_f) / oldest_close_f) * 100
-                            retrieved_context.append(
-                                f"Historical trend for {ticker} ({oldest_date} to {latest_date}): "
-                                f"Price changed from {oldest_close_f:.2f} to {latest_close_f:.2f} ({price_change_over_period:.2f}%)."
-                            )
-                        else:
-                            retrieved_context.append(f"Historical trend for {ticker}: Data incomplete for trend analysis.")
-                    except ValueError:
-                        retrieved_context.append(f"Historical trend for {ticker}: Raw data for {oldest_date} close={oldest_close}, {latest_date} close={latest_close}.")
+
+                    oldest_close_f = history["close"][0]
+                    latest_close_f = history["close"][-1]
+
+                    if oldest_close_f is not None and latest_close_f is not None and oldest_close_f != 0:
+                        price_change_over_period = ((latest_close_f - oldest_close_f) / oldest_close_f) * 100
+                        retrieved_context.append(
+                            f"Historical trend for {ticker} ({oldest_date} to {latest_date}): "
+                            f"Price changed from {oldest_close_f:.2f} to {latest_close_f:.2f} ({price_change_over_period:.2f}%)."
+                        )
+                    else:
+                        retrieved_context.append(f"Historical trend for {ticker}: Data incomplete for trend analysis.")
                 elif len(dates) == 1:
                     retrieved_context.append(f"Historical data for {ticker} available only for {dates[0]}.")
-                else:
-                    retrieved_context.append(f"No sufficient historical data for {ticker}.")
 
     if portfolio_data:
         retrieved_context.append(f"Portfolio initial data: {portfolio_data}")
@@ -276,7 +274,7 @@ def analyze_data(state: AgentState):
     return {"retrieved_context": retrieved_context}
 
 
-def synthesize_narrative(state: AgentState):
+async def synthesize_narrative(state: AgentState):
     print("---SYNTHESIZING NARRATIVE---")
     question = state["question"]
     portfolio_data = state["portfolio_data"]
@@ -286,6 +284,21 @@ def synthesize_narrative(state: AgentState):
     daily_adjusted_data = state["daily_adjusted_data"]
     recent_news = state["recent_news"]
 
+    # Rank and compact every data section so the prompt stays within SYNTHESIS_TOKEN_BUDGET
+    # regardless of portfolio size.
+    context_sections, context_usage = build_brief_context(
+        question=question,
+        portfolio_data=portfolio_data,
+        stock_quotes=stock_quotes,
+        daily_adjusted_data=daily_adjusted_data,
+        earnings_surprises=earnings_surprises,
+        recent_news=recent_news,
+        retrieved_context=retrieved_context,
+        token_budget=settings.SYNTHESIS_TOKEN_BUDGET,
+        history_points=settings.SYNTHESIS_HISTORY_POINTS,
+    )
+    print(f"Synthesis context tokens by section: { {name: u['tokens'] for name, u in context_usage.items()} }")
+
     # Create a comprehensive prompt for the LLM
     prompt_template = ChatPromptTemplate.from_messages(
         [
@@ -301,7 +314,7 @@ def synthesize_narrative(state: AgentState):
                 "\n\nUser Question: {question}"
                 "\n\nPortfolio Data: {portfolio_data}"
                 "\n\nReal-time Stock Quotes: {stock_quotes}"
-                "\n\nHistorical Daily Adjusted Data: {daily_adjusted_data}"
+                "\n\nHistorical Performance (summary statistics and downsampled daily closes): {daily_adjusted_data}"
                 "\n\nEarnings Surprises: {earnings_surprises}"
                 "\n\nRecent Financial News: {recent_news}"
                 "\n\nFinancial Analysis/Context from Analysis Agent: {retrieved_context}"
@@ -312,18 +325,10 @@ def synthesize_narrative(state: AgentState):
 
     chain = prompt_template | llm | StrOutputParser()
     try:
-        brief = chain.invoke({
-            "question": question,
-            "portfolio_data": portfolio_data,
-            "stock_quotes": stock_quotes,
-            "daily_adjusted_data": daily_adjusted_data,
-            "earnings_surprises": earnings_surprises,
-            "recent_news": recent_news,
-            "retrieved_context": "\n".join(retrieved_context)
-        })
+        brief = await chain.ainvoke({"question": question, **context_sections})
         print(f"DEBUG: Brief generated. Type: {type(brief)}, Length: {len(brief) if isinstance(brief, str) else 'N/A'}")
         print(f"DEBUG: First 200 chars of brief:\n{brief[:200]}")
-        return {"final_brief": brief}
+        return {"final_brief": brief, "context_usage": context_usage}
     except Exception as e:
         print(f"Error during narrative synthesis: {e}")
         return {"error": f"Error during narrative synthesis: {e}"}
@@ -332,18 +337,16 @@ def synthesize_narrative(state: AgentState):
 # Define the Langgraph workflow
 workflow = StateGraph(AgentState)
 
-# Add nodes
-workflow.add_node("extract_tickers", extract_tickers)
-workflow.add_node("retrieve_data", retrieve_data)
-workflow.add_node("retrieve_news", retrieve_news)
-workflow.add_node("analyze_data", analyze_data)
-workflow.add_node("synthesize_narrative", synthesize_narrative)
+# Add nodes; each runs as a "stage:<node>" span of the request's trace
+for node in (extract_tickers, retrieve_data, retrieve_news, analyze_data, synthesize_narrative):
+    workflow.add_node(node.__name__, traced(f"stage:{node.__name__}")(node))
 
 # Define the graph flow
+# Stock data and news retrieval run as parallel branches and join before analysis.
 workflow.set_entry_point("extract_tickers")
 workflow.add_edge("extract_tickers", "retrieve_data")
-workflow.add_edge("retrieve_data", "retrieve_news")
-workflow.add_edge("retrieve_news", "analyze_data")
+workflow.add_edge("extract_tickers", "retrieve_news")
+workflow.add_edge(["retrieve_data", "retrieve_news"], "analyze_data")
 workflow.add_edge("analyze_data", "synthesize_narrative")
 workflow.add_edge("synthesize_narrative", END)
 
@@ -352,24 +355,32 @@ app_graph = workflow.compile()
 
 # FastAPI integration for the language agent
 lang_app = FastAPI()
+install_tracing(lang_app, stats={
+    "llm_cache": lambda: llm_cache.stats() if llm_cache else {"enabled": False},
+    "news": lambda: news_loader.stats(),
+})
+
+def _initial_state(request: LanguageAgentRequest) -> AgentState:
+    return AgentState(
+        question=request.question,
+        portfolio_data=request.portfolio_initial_data,
+        extracted_tickers=[],
+        stock_quotes={},
+        daily_adjusted_data={},
+        earnings_surprises=[],
+        recent_news=[],
+        retrieved_context=[],
+        final_brief="",
+        context_usage={},
+        error=""
+    )
 
 @lang_app.post("/language/generate_brief/")
 async def generate_brief_endpoint(request: LanguageAgentRequest):
     try:
-        initial_state = AgentState(
-            question=request.question,
-            portfolio_data=request.portfolio_initial_data,
-            extracted_tickers=[],
-            stock_quotes={},
-            daily_adjusted_data={},
-            earnings_surprises=[],
-            recent_news=[],
-            retrieved_context=[],
-            final_brief="",
-            error=""
-        )
+        initial_state = _initial_state(request)
         
-        result = app_graph.invoke(initial_state)
+        result = await app_graph.ainvoke(initial_state)
 
         if result.get("error"):
             raise HTTPException(status_code=500, detail=result["error"])
@@ -378,12 +389,76 @@ async def generate_brief_endpoint(request: LanguageAgentRequest):
         if not final_brief:
             return {"brief": "Could not generate a comprehensive brief. Please try rephrasing your query or provide more context."}
 
-        return {"brief": final_brief}
+        return {"brief": final_brief, "context_usage": result.get("context_usage", {})}
     except HTTPException as he:
         raise he
     except Exception as e:
         print(f"Unhandled error in generate_brief_endpoint: {e}")
         raise HTTPException(status_code=500, detail=f"Internal Server Error: {e}")
 
+def _stage_event(node: str, update: Dict[str, Any]) -> Dict[str, Any] | None:
+    """Summarizes a graph node's state update as a progress event for the client."""
+    if node == "extract_tickers":
+        return {"stage": "tickers_extracted", "tickers": update.get("extracted_tickers", [])}
+    if node == "retrieve_data":
+        return {"stage": "data_fetched", "symbols": sorted(update.get("stock_quotes", {}))}
+    if node == "retrieve_news":
+        return {"stage": "news_fetched", "articles": len(update.get("recent_news", []))}
+    if node == "analyze_data":
+        return {"stage": "analysis_done"}
+    return None
+
+async def _stream_brief_events(initial_state: AgentState):
+    """Runs the graph and yields SSE events: one per completed stage, then synthesis tokens.
+
+    Node updates and LLM message chunks come from the same LangGraph stream, so only chunks
+    produced inside synthesize_narrative are forwarded as tokens.
+    """
+    streamed_tokens = False
+    try:
+        async for mode, chunk in app_graph.astream(initial_state, stream_mode=["updates", "messages"]):
+            if mode == "messages":
+                message, metadata = chunk
+                if metadata.get("langgraph_node") == "synthesize_narrative" and message.content:
+                    streamed_tokens = True
+                    yield format_sse("token", {"text": message.content})
+                continue
+
+            for node, update in chunk.items():
+                update = update or {}
+                if update.get("error"):
+                    yield format_sse("error", {"detail": update["error"]})
+                    return
+                if node == "synthesize_narrative":
+                    final_brief = update.get("final_brief") or ""
+                    if not streamed_tokens and final_brief:
+                        yield format_sse("token", {"text": final_brief})
+                    yield format_sse("done", {"brief": final_brief, "context_usage": update.get("context_usage", {})})
+                    return
+                event = _stage_event(node, update)
+                if event:
+                    yield format_sse("stage", event)
+    except Exception as e:
+        print(f"Unhandled error while streaming brief: {e}")
+        yield format_sse("error", {"detail": f"Internal Server Error: {e}"})
+
+@lang_app.post("/language/generate_brief/stream")
+async def stream_brief_endpoint(request: LanguageAgentRequest):
+    """Streams the brief as Server-Sent Events: `stage` progress, `token` text, then `done` or `error`."""
+    return StreamingResponse(_stream_brief_events(_initial_state(request)), media_type=SSE_MEDIA_TYPE, headers=SSE_HEADERS)
+
+@lang_app.on_event("shutdown")
+async def close_agent_client():
+    await agent_client.aclose()
+    await news_loader.aclose()
+
+@lang_app.get("/language/llm_cache/stats")
+async def llm_cache_stats():
+    return llm_cache.stats() if llm_cache else {"enabled": False}
+
+@lang_app.get("/language/news/stats")
+async def news_stats():
+    return news_loader.stats()
+
 if __name__ == "__main__":
     uvicorn.run(lang_app, host="0.0.0.0", port=settings.LANGUAGE_AGENT_PORT)
\ No newline at end of file
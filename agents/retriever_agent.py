@@ -1,46 +1,114 @@
-from fastapi import FastAPI, HTTPException
-from langchain_community.vectorstores import FAISS
-from langchain_google_genai import GoogleGenerativeAIEmbeddings
+from datetime import date
+from typing import List, Optional, Union
+from fastapi import FastAPI, HTTPException, Query
 from langchain_core.documents import Document
+from pydantic import BaseModel, Field
 from config.settings import settings
+from data_ingestion.vector_replica import open_vector_store
+from utils.embeddings import CachedEmbeddings, create_embeddings
+from utils.tracing import install_tracing
 import uvicorn
 import os
 
 app = FastAPI()
-embeddings = GoogleGenerativeAIEmbeddings(model="models/embedding-001", google_api_key=settings.GOOGLE_API_KEY)
+# Chunks and queries seen before are served from the on-disk embedding cache
+embeddings = CachedEmbeddings(create_embeddings(), model=f"{settings.EMBEDDING_BACKEND}:{settings.EMBEDDING_MODEL}")
 vector_db_path = settings.VECTOR_DB_PATH
 
-# Load or create FAISS index
-def get_vector_store():
-    if os.path.exists(vector_db_path):
-        return FAISS.load_local(vector_db_path, embeddings, allow_dangerous_deserialization=True)
-    return None
+# With several uvicorn workers exactly one becomes the writer (it replays the log, applies inserts
+# and compacts); the rest memory-map the snapshot read-only and hot-reload new generations.
+vector_store = open_vector_store(vector_db_path, embeddings)
+install_tracing(app, stats={"vector_store": vector_store.stats, "embeddings": embeddings.stats})
 
-vector_store = get_vector_store()
+@app.on_event("startup")
+async def start_vector_store():
+    vector_store.start_background_tasks()
+
+@app.on_event("shutdown")
+async def stop_vector_store():
+    vector_store.stop_background_tasks()
 
 @app.post("/retriever/add_documents/")
 async def add_documents(documents: list[dict]):
-    global vector_store
     langchain_docs = [Document(page_content=d["page_content"], metadata=d.get("metadata", {})) for d in documents]
-    if vector_store:
-        vector_store.add_documents(langchain_docs)
-    else:
-        vector_store = FAISS.from_documents(langchain_docs, embeddings)
-    vector_store.save_local(vector_db_path)
+    # The writer appends to its write-ahead log; a reader embeds and spools the batch to the writer
+    await vector_store.aadd_documents(langchain_docs)
+    if vector_store.role == "reader":
+        return {"status": "success", "message": f"Queued {len(documents)} documents for the index writer."}
     return {"status": "success", "message": f"Added {len(documents)} documents."}
 
+@app.get("/retriever/stats/")
+async def retriever_stats():
+    return {**vector_store.stats(), "embeddings": embeddings.stats()}
+
+class RetrievalFilter(BaseModel):
+    tickers: Optional[List[str]] = None
+    filing_types: Optional[List[str]] = None # e.g. "10-K", "10-Q"
+    date_from: Optional[date] = None # inclusive bounds on the chunk's filing_date
+    date_to: Optional[date] = None
+
+class RetrievalQuery(BaseModel):
+    query: str
+    filter: Optional[RetrievalFilter] = None # overrides the request-level filter for this query
+
+class RetrievalRequest(BaseModel):
+    queries: List[Union[str, RetrievalQuery]] = Field(..., min_length=1)
+    top_k: int = Field(settings.RETRIEVAL_TOP_K, ge=1, le=100)
+    filter: Optional[RetrievalFilter] = None
+    min_score: float = settings.RETRIEVAL_CONFIDENCE_THRESHOLD
+
+def _chunk(doc: Document, score: float) -> dict:
+    return {"page_content": doc.page_content, "metadata": doc.metadata, "score": score}
+
+async def _search(queries: List[str], filters: List[Optional[RetrievalFilter]], top_k: int, min_score: Optional[float]) -> List[dict]:
+    # Queries sharing a filter go to FAISS as one batch
+    groups: dict = {}
+    for i, f in enumerate(filters):
+        key = f.model_dump_json() if f else ""
+        groups.setdefault(key, (f, []))[1].append(i)
+    results: List[Optional[dict]] = [None] * len(queries)
+    for f, indices in groups.values():
+        hits = await vector_store.asearch([queries[i] for i in indices], k=top_k, filters=f.model_dump(exclude_none=True) if f else None)
+        for i, row in zip(indices, hits):
+            kept = [_chunk(doc, score) for doc, score in row if min_score is None or score >= min_score]
+            results[i] = {"query": queries[i], "chunks": kept, "dropped_low_score": len(row) - len(kept)}
+    return results
+
+@app.post("/retriever/search/")
+async def search(request: RetrievalRequest):
+    """Batched retrieval with metadata pre-filtering; hits scoring below min_score are dropped."""
+    if not len(vector_store):
+        raise HTTPException(status_code=404, detail="Vector store not initialized. Add documents first.")
+    queries = [q if isinstance(q, str) else q.query for q in request.queries]
+    filters = [request.filter if isinstance(q, str) or q.filter is None else q.filter for q in request.queries]
+    try:
+        return {"results": await _search(queries, filters, request.top_k, request.min_score)}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.get("/retriever/retrieve_chunks/")
-async def retrieve_chunks(query: str, top_k: int = settings.RETRIEVAL_TOP_K):
-    if not vector_store:
+async def retrieve_chunks(
+    query: str,
+    top_k: int = settings.RETRIEVAL_TOP_K,
+    ticker: Optional[List[str]] = Query(None),
+    filing_type: Optional[List[str]] = Query(None),
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    min_score: Optional[float] = None,
+):
+    if not len(vector_store):
         raise HTTPException(status_code=404, detail="Vector store not initialized. Add documents first.")
+    f = RetrievalFilter(tickers=ticker, filing_types=filing_type, date_from=date_from, date_to=date_to)
+    has_filter = any(v is not None for v in f.model_dump().values())
     try:
-        docs = vector_store.similarity_search(query, k=top_k)
-        return {"query": query, "chunks": [{"page_content": doc.page_content, "metadata": doc.metadata} for doc in docs]}
+        result = (await _search([query], [f if has_filter else None], top_k, min_score))[0]
+        return {"query": query, "chunks": result["chunks"]}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 if __name__ == "__main__":
     # To run this agent: uvicorn agents.retriever_agent:app --host 0.0.0.0 --port 8003 --reload
+    # To scale retrieval across cores: uvicorn agents.retriever_agent:app --host 0.0.0.0 --port 8003 --workers 4
     # Create data directory if it doesn't exist
     os.makedirs(os.path.dirname(settings.VECTOR_DB_PATH), exist_ok=True)
     uvicorn.run(app, host="0.0.0.0", port=settings.RETRIEVER_AGENT_PORT)
\ No newline at end of file
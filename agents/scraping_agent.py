@@ -1,22 +1,62 @@
-from fastapi import FastAPI, HTTPException
+from typing import List
+from fastapi import FastAPI, HTTPException, Query
+from data_ingestion.sec_client import edgar_client
 from data_ingestion.sec_filings_scraper import SECFilingsScraper
 from config.settings import settings
+from utils.tracing import install_tracing
 import uvicorn
 
 app = FastAPI()
 sec_scraper = SECFilingsScraper()
+install_tracing(app, stats={"edgar": edgar_client.stats, "filing_cache": lambda: sec_scraper.cache.stats()})
+
+@app.on_event("shutdown")
+async def close_edgar_client():
+    await edgar_client.aclose()
+
+def _parse_tickers(raw: List[str]) -> List[str]:
+    tickers = list(dict.fromkeys(t.strip().upper() for part in raw for t in part.split(",") if t.strip()))
+    if not tickers:
+        raise HTTPException(status_code=400, detail="No tickers given.")
+    if len(tickers) > settings.SEC_BATCH_MAX_TICKERS:
+        raise HTTPException(status_code=400, detail=f"At most {settings.SEC_BATCH_MAX_TICKERS} tickers per request.")
+    return tickers
+
+async def _earnings_reports(tickers: List[str]) -> dict:
+    try:
+        reports, errors = await sec_scraper.get_recent_earnings_reports(tickers)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    return {"reports": reports, "errors": errors}
+
+@app.get("/scrape/earnings_reports")
+async def scrape_earnings_reports(tickers: List[str] = Query(...)):
+    """Latest 10-Q/10-K text for several tickers (?tickers=AAPL&tickers=MSFT or ?tickers=AAPL,MSFT), fetched concurrently."""
+    return await _earnings_reports(_parse_tickers(tickers))
 
 @app.get("/scrape/earnings_report/{ticker}")
-async def scrape_earnings_report(ticker: str):
+async def scrape_earnings_report(ticker: str, include_sections: bool = False):
+    """Latest 10-Q/10-K text; include_sections adds the Item sections (MD&A, risk factors, ...) as separate chunks."""
+    # A comma-separated path ("AAPL,MSFT,NVDA") is fetched as a batch
+    tickers = _parse_tickers([ticker])
+    if len(tickers) > 1:
+        return await _earnings_reports(tickers)
     try:
-        report_text = sec_scraper.get_recent_earnings_report_text(ticker)
-        if report_text:
-            return {"ticker": ticker, "earnings_report_text": report_text}
-        else:
-            raise HTTPException(status_code=404, detail=f"No earnings report found for {ticker}")
+        report = await sec_scraper.get_recent_earnings_report(ticker)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    if not report or not report[0]:
+        raise HTTPException(status_code=404, detail=f"No earnings report found for {ticker}")
+    report_text, sections = report
+    response = {"ticker": ticker, "earnings_report_text": report_text}
+    if include_sections:
+        response["sections"] = sections
+    return response
+
+@app.get("/scrape/stats")
+async def scrape_stats():
+    return {**edgar_client.stats(), "filing_cache": sec_scraper.cache.stats()}
 
 if __name__ == "__main__":
     # To run this agent: uvicorn agents.scraping_agent:app --host 0.0.0.0 --port 8002 --reload
-    uvicorn.run(app, host="0.0.0.0", port=settings.SCRAPING_AGENT_PORT)
\ No newline at end of file
+    uvicorn.run(app, host="0.0.0.0", port=settings.SCRAPING_AGENT_PORT)
@@ -1,16 +1,36 @@
 # agents/voice_agent.py
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
 from config.settings import settings
+from utils.audio import decode_audio, read_audio_upload, resample, speech_segments, to_pcm16
+from utils.speech_engines import EngineBusyError, EngineRunner, SpeechEngineError
+from utils.tracing import install_tracing, span
+from utils.tts import SpeechSynthesizer
 import uvicorn
-import speech_recognition as sr
-from gtts import gTTS
-import io
+import asyncio
 import base64
-from pydub import AudioSegment
 
 voice_app = FastAPI()
+stt_engine = EngineRunner("stt", settings.STT_ENGINE)
+speech_synthesizer = SpeechSynthesizer(EngineRunner("tts", settings.TTS_ENGINE))
+install_tracing(voice_app, stats={"stt": stt_engine.stats, "tts": speech_synthesizer.stats})
+
+@voice_app.on_event("startup")
+async def start_engines():
+    # Local engines load their models in every pool process before the first request arrives
+    await stt_engine.start()
+    await speech_synthesizer.engine.start()
+
+@voice_app.on_event("shutdown")
+async def stop_engines():
+    stt_engine.shutdown()
+    speech_synthesizer.engine.shutdown()
+
+def _busy(e: EngineBusyError) -> HTTPException:
+    print(f"---VOICE AGENT: {e}")
+    return HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
 
 # --- Pydantic Models for Request/Response ---
 class TranscribeRequest(BaseModel):
@@ -18,6 +38,7 @@ class TranscribeRequest(BaseModel):
 
 class TranscribeResponse(BaseModel):
     transcribed_text: str
+    chunks: int = 1 # Speech segments recognized separately
 
 class SynthesizeSpeechRequest(BaseModel):
     text: str
@@ -25,67 +46,128 @@ class SynthesizeSpeechRequest(BaseModel):
 class SynthesizeSpeechResponse(BaseModel):
     audio_file_base64: str
 
-# --- Speech-to-Text Endpoint ---
+# --- Speech-to-Text ---
+def _prepare_chunks(audio_bytes: bytes) -> List[bytes]:
+    """Decodes and resamples in-process, then splits the recording into speech chunks at pauses."""
+    samples, rate = decode_audio(audio_bytes)
+    samples = resample(samples, rate, settings.VOICE_STT_SAMPLE_RATE)
+    return [to_pcm16(samples[start:end]) for start, end in speech_segments(samples, settings.VOICE_STT_SAMPLE_RATE)]
+
+async def _transcribe(audio_bytes: bytes) -> Dict[str, Any]:
+    try:
+        with span("stage:decode_audio"):
+            chunks = await asyncio.to_thread(_prepare_chunks, audio_bytes)
+    except Exception as e:
+        print(f"---VOICE AGENT: Could not decode audio: {e}")
+        raise HTTPException(status_code=400, detail=f"Could not decode audio: {e}")
+
+    # Chunks are independent recognizer calls, so a long recording takes about as long as its longest chunk
+    semaphore = asyncio.Semaphore(settings.VOICE_STT_CONCURRENCY)
+
+    async def recognize(pcm: bytes) -> str:
+        async with semaphore:
+            return await stt_engine.transcribe(pcm, settings.VOICE_STT_SAMPLE_RATE)
+
+    try:
+        texts = await asyncio.gather(*(recognize(pcm) for pcm in chunks))
+    except EngineBusyError as e:
+        raise _busy(e)
+    except SpeechEngineError as e:
+        print(f"---VOICE AGENT: Speech recognition engine failed; {e}")
+        raise HTTPException(status_code=500, detail=f"Speech Recognition service error: {e}. Check your internet connection.")
+
+    transcribed_text = " ".join(text.strip() for text in texts if text.strip())
+    if not transcribed_text:
+        print("---VOICE AGENT: Google Speech Recognition could not understand audio")
+        raise HTTPException(status_code=400, detail="Speech Recognition could not understand audio. Please speak clearly.")
+    print(f"---VOICE AGENT: Transcribed {len(chunks)} chunk(s): '{transcribed_text}'")
+    return {"transcribed_text": transcribed_text, "chunks": len(chunks)}
+
+@voice_app.post("/voice/transcribe/upload", response_model=TranscribeResponse)
+async def transcribe_upload(request: Request):
+    """
+    Transcribes an audio file sent as binary: a multipart form with a "file" field, or the raw
+    bytes as the request body (Content-Type audio/*). WAV, FLAC, OGG and MP3 decode without ffmpeg.
+    """
+    print("---VOICE AGENT: Receiving audio upload for transcription---")
+    try:
+        audio_bytes, _ = await read_audio_upload(request)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return await _transcribe(audio_bytes)
+
 @voice_app.post("/voice/transcribe/", response_model=TranscribeResponse)
 async def transcribe_audio(request: TranscribeRequest):
     """
     Transcribes base64 encoded audio data to text.
-    Expects audio_file_base64 in the request body.
+    Expects audio_file_base64 in the request body. Prefer /voice/transcribe/upload, which avoids
+    the base64 overhead.
     """
     print("---VOICE AGENT: Receiving audio for transcription---")
     try:
         audio_bytes = base64.b64decode(request.audio_file_base64)
-        audio_file_io = io.BytesIO(audio_bytes)
-        
-        # Pydub can usually infer format, but if issues persist, ensure frontend sends a common format like WAV or MP3
-        # For 'webm' from some web recorders, you might need: audio = AudioSegment.from_file(audio_file_io, format="webm")
-        audio = AudioSegment.from_file(audio_file_io)
-
-        # Convert to WAV in-memory for SpeechRecognition, as it often prefers WAV
-        wav_file_io = io.BytesIO()
-        audio.export(wav_file_io, format="wav")
-        wav_file_io.seek(0) # Rewind to the beginning for SpeechRecognition to read
-
-        r = sr.Recognizer()
-        with sr.AudioFile(wav_file_io) as source:
-            audio_data = r.record(source)
-        
-        # Using Google Web Speech API for transcription (requires internet connection)
-        transcribed_text = r.recognize_google(audio_data)
-        
-        print(f"---VOICE AGENT: Transcribed: '{transcribed_text}'")
-        return {"transcribed_text": transcribed_text}
-
-    except sr.UnknownValueError:
-        print("---VOICE AGENT: Google Speech Recognition could not understand audio")
-        raise HTTPException(status_code=400, detail="Speech Recognition could not understand audio. Please speak clearly.")
-    except sr.RequestError as e:
-        print(f"---VOICE AGENT: Could not request results from Google Speech Recognition service; {e}")
-        raise HTTPException(status_code=500, detail=f"Speech Recognition service error: {e}. Check your internet connection.")
-    except Exception as e:
-        print(f"---VOICE AGENT: Error during transcription: {e}")
-        raise HTTPException(status_code=500, detail=f"Transcription failed: {e}")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid base64 audio: {e}")
+    return await _transcribe(audio_bytes)
 
-# --- Text-to-Speech Endpoint ---
+# --- Text-to-Speech Endpoints ---
 @voice_app.post("/voice/synthesize_speech/", response_model=SynthesizeSpeechResponse)
 async def synthesize_speech(request: SynthesizeSpeechRequest):
     """
     Synthesizes text to speech and returns base64 encoded audio.
+    Sentences are synthesized concurrently and served from the speech cache when seen before.
     """
     print(f"---VOICE AGENT: Synthesizing speech for text: '{request.text[:50]}...'")
     try:
-        tts = gTTS(text=request.text, lang='en', slow=False)
-        audio_fp = io.BytesIO()
-        tts.save(audio_fp)
-        audio_fp.seek(0) # Rewind the buffer to read its content
-        
-        audio_base64 = base64.b64encode(audio_fp.read()).decode('utf-8')
-        
+        audio = await speech_synthesizer.synthesize(request.text)
+        audio_base64 = base64.b64encode(audio).decode('utf-8')
+
         print(f"---VOICE AGENT: Speech synthesis complete for '{request.text[:50]}...'")
         return {"audio_file_base64": audio_base64}
+    except EngineBusyError as e:
+        raise _busy(e)
     except Exception as e:
         print(f"---VOICE AGENT: Error during speech synthesis: {e}")
         raise HTTPException(status_code=500, detail=f"Speech synthesis failed: {e}")
 
+@voice_app.post("/voice/synthesize_speech/stream")
+async def synthesize_speech_stream(request: SynthesizeSpeechRequest):
+    """
+    Streams the speech as binary audio (audio/mpeg for gTTS), sentence by sentence, so playback
+    can start as soon as the first sentence is synthesized.
+    """
+    print(f"---VOICE AGENT: Streaming speech for text: '{request.text[:50]}...'")
+    stream = speech_synthesizer.stream(request.text)
+    try:
+        first = await anext(stream, b"") # surface engine errors before streaming starts
+    except EngineBusyError as e:
+        raise _busy(e)
+    except Exception as e:
+        print(f"---VOICE AGENT: Error during speech synthesis: {e}")
+        raise HTTPException(status_code=500, detail=f"Speech synthesis failed: {e}")
+
+    async def body():
+        try:
+            yield first
+            async for chunk in stream:
+                yield chunk
+        except Exception as e:
+            # Re-raised so the server aborts the response: the client sees a broken transfer
+            # rather than a complete-looking 200 with the remaining sentences missing
+            print(f"---VOICE AGENT: Speech stream interrupted: {e}")
+            raise
+        finally:
+            await stream.aclose() # stops synthesizing sentences nobody will receive
+
+    return StreamingResponse(body(), media_type=speech_synthesizer.media_type)
+
+@voice_app.get("/voice/tts/stats")
+async def tts_stats():
+    return speech_synthesizer.stats()
+
+@voice_app.get("/voice/stt/stats")
+async def stt_stats():
+    return stt_engine.stats()
+
 if __name__ == "__main__":
     uvicorn.run(voice_app, host="0.0.0.0", port=settings.VOICE_AGENT_PORT)
\ No newline at end of file
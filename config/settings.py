@@ -18,12 +18,162 @@ class Settings:
     VOICE_AGENT_PORT: int = 8006
     ORCHESTRATOR_PORT: int = 8000
 
+    # Inter-agent HTTP client (connection pool shared by all calls from one process)
+    AGENT_HOST: str = os.getenv("AGENT_HOST", "localhost")
+    AGENT_CONNECT_TIMEOUT_SECONDS: float = 5.0
+    AGENT_DEFAULT_TIMEOUT_SECONDS: float = 60.0
+    AGENT_TIMEOUT_SECONDS: dict = { # Per-call read timeout by agent; LLM-backed agents need longer
+        "orchestrator": 300.0,
+        "api": 30.0,
+        "retriever": 120.0, # bulk add_documents embeds a whole batch
+        "analysis": 120.0,
+        "language": 300.0,
+        "voice": 120.0,
+    }
+    AGENT_MAX_CONNECTIONS: int = int(os.getenv("AGENT_MAX_CONNECTIONS", "100"))
+    AGENT_MAX_KEEPALIVE_CONNECTIONS: int = 20
+    AGENT_MAX_RETRIES: int = int(os.getenv("AGENT_MAX_RETRIES", "2"))
+    AGENT_RETRY_BACKOFF_SECONDS: float = 0.25
+
+    # Orchestrator brief job queue
+    JOB_WORKERS: int = int(os.getenv("JOB_WORKERS", "8")) # Briefs generated concurrently per orchestrator process
+    JOB_QUEUE_MAX_SIZE: int = int(os.getenv("JOB_QUEUE_MAX_SIZE", "100")) # Queued briefs beyond this are rejected with 429
+    JOB_RESULT_TTL_SECONDS: float = 900.0 # How long finished jobs stay available for polling
+
+    # Tracing and metrics: every agent serves GET /metrics (latency percentiles and histograms per
+    # request route, brief stage and upstream call) and GET /traces/{trace_id} from recent traces.
+    METRICS_SAMPLE_WINDOW: int = int(os.getenv("METRICS_SAMPLE_WINDOW", "1000")) # Latest samples per span behind the percentiles
+    TRACE_MAX_TRACES: int = int(os.getenv("TRACE_MAX_TRACES", "500")) # Recent traces whose spans are kept per process
+
+    # Concurrency
+    API_FETCH_CONCURRENCY: int = int(os.getenv("API_FETCH_CONCURRENCY", "8")) # Max in-flight API Agent calls per brief
+    API_BATCH_SIZE: int = int(os.getenv("API_BATCH_SIZE", "25")) # Symbols per batch request from the Language Agent
+    API_BATCH_MAX_SYMBOLS: int = 100 # Upper bound accepted by the API Agent batch endpoints
+
+    # SEC EDGAR fair-access policy: at most 10 requests/second per client and a User-Agent that
+    # identifies the requester with a contact address. Search results change when new filings are
+    # posted; filing index pages never do.
+    SEC_USER_AGENT: str = os.getenv("SEC_USER_AGENT", "FinancialAssistant admin@example.com")
+    SEC_MAX_REQUESTS_PER_SECOND: float = float(os.getenv("SEC_MAX_REQUESTS_PER_SECOND", "10"))
+    SEC_MAX_CONCURRENCY: int = int(os.getenv("SEC_MAX_CONCURRENCY", "8"))
+    SEC_MAX_RETRIES: int = 3
+    SEC_TIMEOUT_SECONDS: float = 30.0
+    SEC_SEARCH_CACHE_TTL_SECONDS: float = float(os.getenv("SEC_SEARCH_CACHE_TTL_SECONDS", "900"))
+    SEC_INDEX_CACHE_TTL_SECONDS: float = 86400.0
+    SEC_RESPONSE_CACHE_MAX_ENTRIES: int = 2000
+    SEC_BATCH_MAX_TICKERS: int = 100 # Upper bound for one multi-ticker scrape request
+
+    # API Agent caches
+    QUOTE_CACHE_TTL_SECONDS: float = float(os.getenv("QUOTE_CACHE_TTL_SECONDS", "15"))
+    QUOTE_CACHE_MAX_ENTRIES: int = 2000
+    HISTORY_CACHE_TTL_SECONDS: float = float(os.getenv("HISTORY_CACHE_TTL_SECONDS", "900"))
+    HISTORY_CACHE_MAX_ENTRIES: int = 500
+
+    # Voice Agent speech-to-text. Recordings are decoded in-process, resampled to the recognizer's
+    # rate and split at pauses (energy-based VAD) into chunks that are transcribed concurrently.
+    VOICE_STT_SAMPLE_RATE: int = 16000
+    VOICE_VAD_FRAME_MS: int = 30
+    VOICE_VAD_MIN_SILENCE_MS: int = 400 # Shorter pauses do not end a chunk
+    VOICE_CHUNK_MAX_SECONDS: float = float(os.getenv("VOICE_CHUNK_MAX_SECONDS", "15"))
+    VOICE_STT_CONCURRENCY: int = int(os.getenv("VOICE_STT_CONCURRENCY", "4")) # Chunks recognized at once per request
+    VOICE_MAX_UPLOAD_BYTES: int = 25 * 1024 * 1024
+
+    # Voice Agent speech engines. Network engines ("google", "gtts") run on threads; local engines
+    # ("vosk", "whisper", "pyttsx3") run in a process pool with one warm model per process.
+    STT_ENGINE: str = os.getenv("STT_ENGINE", "google") # "google", "vosk", "whisper" or "module:Class"
+    STT_MODEL_PATH: str = os.getenv("STT_MODEL_PATH", "") # Vosk model directory or Whisper model size/path
+    TTS_ENGINE: str = os.getenv("TTS_ENGINE", "gtts") # "gtts", "pyttsx3" or "module:Class"
+    SPEECH_ENGINE_PROCESSES: int = int(os.getenv("SPEECH_ENGINE_PROCESSES", str(os.cpu_count() or 2)))
+    SPEECH_ENGINE_THREADS: int = int(os.getenv("SPEECH_ENGINE_THREADS", "8")) # Concurrent calls to a network engine
+    SPEECH_ENGINE_MAX_QUEUE: int = int(os.getenv("SPEECH_ENGINE_MAX_QUEUE", "64")) # Calls waiting beyond the workers before 503s
+
+    # Text-to-speech: sentences are synthesized concurrently and cached on disk by a hash of
+    # voice parameters and text.
+    TTS_LANGUAGE: str = "en"
+    TTS_CONCURRENCY: int = int(os.getenv("TTS_CONCURRENCY", "4"))
+    TTS_MIN_SEGMENT_CHARS: int = 40 # Shorter sentences are synthesized together with the next one
+    TTS_CACHE_PATH: str = "data/tts_cache.sqlite"
+    TTS_CACHE_MAX_BYTES: int = int(os.getenv("TTS_CACHE_MAX_BYTES", str(256 * 1024**2)))
+
+    # News (NewsAPI). Results are cached per query; syndicated copies of a story are collapsed when
+    # their headlines match or the SimHash fingerprints of headline and description differ in at
+    # most NEWS_NEAR_DUPLICATE_MAX_DISTANCE of 64 bits (unrelated short texts differ in ~25+).
+    NEWS_CACHE_TTL_SECONDS: float = float(os.getenv("NEWS_CACHE_TTL_SECONDS", "600"))
+    NEWS_CACHE_MAX_ENTRIES: int = 1000
+    NEWS_MAX_CONCURRENCY: int = 4
+    NEWS_TIMEOUT_SECONDS: float = 10.0
+    NEWS_PAGE_SIZE: int = 10 # Articles requested per query, before near-duplicates are collapsed
+    NEWS_MAX_ARTICLES: int = int(os.getenv("NEWS_MAX_ARTICLES", "6")) # Distinct articles passed on per brief
+    NEWS_NEAR_DUPLICATE_MAX_DISTANCE: int = 8
+    NEWS_WARM_MAX_TICKERS: int = 5 # Tickers from a general-market query whose news is prefetched
+
     # Paths
     VECTOR_DB_PATH: str = "data/faiss_index"
     SEC_FILINGS_CACHE_PATH: str = "data/sec_filings_cache"
+    SEC_FILINGS_CACHE_MAX_BYTES: int = int(os.getenv("SEC_FILINGS_CACHE_MAX_BYTES", str(2 * 1024**3))) # LRU-evicted beyond this
+    SEC_FILINGS_CACHE_COMPRESSION_LEVEL: int = 6 # gzip level for cached filings
+    OHLCV_STORE_PATH: str = "data/ohlcv_store"
+    TICKER_SYMBOLS_PATH: str = "data/symbols.csv" # symbol,name,aliases used to resolve tickers without the LLM
+
+    # Retriever embeddings. The backend ("google", "hashing" for offline runs, or
+    # "sentence-transformers") fixes the vector dimension, so keep one VECTOR_DB_PATH per backend.
+    EMBEDDING_BACKEND: str = os.getenv("EMBEDDING_BACKEND", "google")
+    EMBEDDING_MODEL: str = os.getenv("EMBEDDING_MODEL", "models/embedding-001")
+    EMBEDDING_CACHE_PATH: str = "data/embedding_cache.sqlite"
+    EMBEDDING_CACHE_MAX_MEMORY_ENTRIES: int = 20000
+    EMBEDDING_BATCH_SIZE: int = int(os.getenv("EMBEDDING_BATCH_SIZE", "100")) # Uncached texts per backend call
+    EMBEDDING_CONCURRENCY: int = 4 # Backend calls in flight per ingestion request
+
+    # Retriever vector store: inserts go to an append-only log that a background task folds into
+    # the FAISS snapshot once enough vectors are pending or the interval elapses.
+    VECTOR_COMPACT_MIN_VECTORS: int = int(os.getenv("VECTOR_COMPACT_MIN_VECTORS", "2000"))
+    VECTOR_COMPACT_INTERVAL_SECONDS: float = float(os.getenv("VECTOR_COMPACT_INTERVAL_SECONDS", "300"))
+    VECTOR_WAL_FSYNC: bool = os.getenv("VECTOR_WAL_FSYNC", "true").lower() == "true"
+    # Index layout, applied when compaction writes a snapshot: "flat" (exact), "ivf" (clustered,
+    # trained once the corpus reaches VECTOR_IVF_MIN_VECTORS) or "hnsw" (graph, no training).
+    VECTOR_INDEX_TYPE: str = os.getenv("VECTOR_INDEX_TYPE", "flat")
+    VECTOR_IVF_NLIST: int = int(os.getenv("VECTOR_IVF_NLIST", "1024"))
+    VECTOR_IVF_NPROBE: int = int(os.getenv("VECTOR_IVF_NPROBE", "16")) # Clusters scanned per query
+    VECTOR_IVF_MIN_VECTORS: int = 50000
+    VECTOR_HNSW_M: int = 32
+    VECTOR_HNSW_EF_SEARCH: int = int(os.getenv("VECTOR_HNSW_EF_SEARCH", "64"))
+    # Filtered searches matching at most this many chunks score them exactly instead of via the index
+    VECTOR_EXACT_FILTER_MAX: int = 20000
+    # Multi-worker retriever: one process (the first to take the store's lock when "auto") owns the
+    # index and applies every insert; the others serve queries from the memory-mapped snapshot.
+    RETRIEVER_ROLE: str = os.getenv("RETRIEVER_ROLE", "auto") # "auto", "writer" or "reader"
+    VECTOR_REPLICA_RELOAD_SECONDS: float = float(os.getenv("VECTOR_REPLICA_RELOAD_SECONDS", "2"))
+    VECTOR_INBOX_POLL_SECONDS: float = 1.0 # How often the writer applies batches spooled by readers
+
+    # Filing ingestion pipeline (scraper -> retriever). A nightly run only fetches filings whose
+    # accession numbers are not yet recorded in the state DB; the first run per ticker is bounded.
+    FILING_PIPELINE_STATE_PATH: str = "data/filing_pipeline.sqlite"
+    FILING_PIPELINE_FORMS: tuple = ("10-K", "10-Q")
+    FILING_PIPELINE_MAX_FILINGS_PER_TICKER: int = int(os.getenv("FILING_PIPELINE_MAX_FILINGS_PER_TICKER", "4"))
+    FILING_PIPELINE_CONCURRENCY: int = int(os.getenv("FILING_PIPELINE_CONCURRENCY", "4")) # Tickers fetched at once
+    FILING_PIPELINE_BATCH_SIZE: int = int(os.getenv("FILING_PIPELINE_BATCH_SIZE", "256")) # Chunks per add_documents call
+    FILING_CHUNK_CHARS: int = 2000
+    FILING_CHUNK_OVERLAP_CHARS: int = 200
+
+    # Local OHLCV store: how long a synced symbol is served purely from disk before
+    # the trailing bars are re-fetched from upstream.
+    OHLCV_STORE_REFRESH_SECONDS: float = float(os.getenv("OHLCV_STORE_REFRESH_SECONDS", "3600"))
+
+    # Language Agent
+    HISTORY_PERIOD: str = os.getenv("HISTORY_PERIOD", "1y") # Daily history requested per ticker; a year feeds the 52-week indicators
+    SYNTHESIS_TOKEN_BUDGET: int = int(os.getenv("SYNTHESIS_TOKEN_BUDGET", "6000")) # Approximate token cap for the data sections of the synthesis prompt
+    SYNTHESIS_HISTORY_POINTS: int = 12 # Downsampled closes per ticker included in the synthesis prompt
+
+    # LLM response cache shared by the Analysis and Language Agents. Prompts embed live quotes,
+    # so the default TTL follows quote freshness; ticker extraction does not depend on market data.
+    LLM_CACHE_ENABLED: bool = os.getenv("LLM_CACHE_ENABLED", "true").lower() == "true"
+    LLM_CACHE_PATH: str = "data/llm_cache.sqlite"
+    LLM_CACHE_TTL_SECONDS: float = float(os.getenv("LLM_CACHE_TTL_SECONDS", "60"))
+    LLM_CACHE_TICKER_TTL_SECONDS: float = float(os.getenv("LLM_CACHE_TICKER_TTL_SECONDS", "86400"))
+    LLM_CACHE_MAX_ENTRIES: int = 1000
 
     # RAG settings
     RETRIEVAL_TOP_K: int = 5
-    RETRIEVAL_CONFIDENCE_THRESHOLD: float = 0.6 # Example threshold
+    RETRIEVAL_CONFIDENCE_THRESHOLD: float = float(os.getenv("RETRIEVAL_CONFIDENCE_THRESHOLD", "0.6")) # Minimum similarity score (1 - squared L2 / 2, i.e. cosine for unit vectors) a chunk needs to be returned
 
 settings = Settings()
\ No newline at end of file
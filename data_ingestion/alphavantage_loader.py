@@ -1,10 +1,21 @@
+import os
+from datetime import date, timedelta
+from typing import Dict, List, Optional
+
+import numpy as np
 import requests
 from config.settings import settings
+from data_ingestion.ohlcv_store import OHLCV_DTYPE, OHLCVStore
+
+# "compact" responses carry the latest 100 trading days, roughly 145 calendar days
+COMPACT_WINDOW_DAYS = 140
 
 class AlphaVantageLoader:
-    def __init__(self):
+    def __init__(self, store: Optional[OHLCVStore] = None):
         self.api_key = settings.ALPHA_VANTAGE_API_KEY
         self.base_url = "https://www.alphavantage.co/query"
+        # AlphaVantage bars use their own adjustment basis, so keep them apart from yfinance's
+        self.store = store or OHLCVStore(os.path.join(settings.OHLCV_STORE_PATH, "alphavantage"))
 
     def get_quote_endpoint(self, symbol: str) -> dict:
         """Retrieves real-time quote for a given stock symbol."""
@@ -17,20 +28,71 @@ class AlphaVantageLoader:
         response.raise_for_status()
         return response.json()
 
-    def get_daily_adjusted(self, symbol: str) -> dict:
-        """Retrieves daily adjusted historical data."""
+    def _fetch_daily_adjusted(self, symbol: str, outputsize: str) -> dict:
         params = {
             "function": "TIME_SERIES_DAILY_ADJUSTED",
             "symbol": symbol,
-            "outputsize": "compact", # "full" for all available data
+            "outputsize": outputsize, # "compact" for the last 100 days, "full" for all available data
             "apikey": self.api_key
         }
         response = requests.get(self.base_url, params=params)
         response.raise_for_status()
         return response.json()
 
+    @staticmethod
+    def _rows_from_time_series(time_series: Dict[str, dict]) -> np.ndarray:
+        dates = sorted(time_series)
+        rows = np.empty(len(dates), dtype=OHLCV_DTYPE)
+        rows["date"] = np.array(dates, dtype="datetime64[D]").astype(np.int64)
+        for field, key in (("open", "1. open"), ("high", "2. high"), ("low", "3. low"),
+                           ("close", "4. close"), ("adj_close", "5. adjusted close"), ("volume", "6. volume")):
+            rows[field] = [float(time_series[d][key]) for d in dates]
+        return rows
+
+    def get_daily_adjusted(self, symbol: str) -> dict:
+        """Retrieves daily adjusted historical data (latest 100 trading days).
+
+        Bars are kept in the local OHLCV store; a "compact" request is only made for the missing
+        trailing days, and "full" only when the gap is larger than a compact response covers.
+        """
+        symbol = symbol.upper()
+        window_start = date.today() - timedelta(days=COMPACT_WINDOW_DAYS)
+        upstream_errors = {}
+
+        def fetch_many(symbols: List[str], fetch_from: Optional[date]) -> Dict[str, np.ndarray]:
+            fetched = {}
+            for sym in symbols:
+                compact = fetch_from is not None and (date.today() - fetch_from).days <= COMPACT_WINDOW_DAYS
+                data = self._fetch_daily_adjusted(sym, "compact" if compact else "full")
+                if "Time Series (Daily)" in data:
+                    fetched[sym] = self._rows_from_time_series(data["Time Series (Daily)"])
+                else:
+                    upstream_errors[sym] = data
+            return fetched
+
+        self.store.sync_many([symbol], window_start, fetch_many)
+        rows = self.store.read(symbol)
+        if rows is None or len(rows) == 0:
+            # Surface AlphaVantage's own error/rate-limit payload as before
+            return upstream_errors.get(symbol, {})
+
+        rows = rows[-100:]
+        date_strs = rows["date"].astype("datetime64[D]").astype(str)
+        time_series = {
+            date_strs[i]: {
+                "1. open": f"{rows['open'][i]:.4f}",
+                "2. high": f"{rows['high'][i]:.4f}",
+                "3. low": f"{rows['low'][i]:.4f}",
+                "4. close": f"{rows['close'][i]:.4f}",
+                "5. adjusted close": f"{rows['adj_close'][i]:.4f}",
+                "6. volume": f"{int(rows['volume'][i])}",
+            }
+            for i in range(len(rows) - 1, -1, -1)
+        }
+        return {"Meta Data": {"2. Symbol": symbol, "3. Last Refreshed": date_strs[-1]}, "Time Series (Daily)": time_series}
+
 # Example Usage:
 if __name__ == "__main__":
     loader = AlphaVantageLoader()
     # print(loader.get_quote_endpoint("AAPL"))
-    # print(loader.get_daily_adjusted("MSFT"))
\ No newline at end of file
+    # print(loader.get_daily_adjusted("MSFT"))
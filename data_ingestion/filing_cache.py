@@ -0,0 +1,268 @@
+import gzip
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Dict, List, Optional, Tuple
+
+from config.settings import settings
+from data_ingestion.filing_text import derived_paths, extract_filing
+from utils.sqlite_store import ThreadLocalConnection, evict_lru
+
+INDEX_NAME = "index.sqlite"
+BLOB_DIR = "blobs"
+_COPY_CHUNK_BYTES = 1 << 20
+# Lookups only rewrite a blob's last_access once it is older than this; LRU order needs no finer grain
+_ACCESS_RESOLUTION_SECONDS = 60.0
+# Hit/miss counts are kept in memory and written to the index in batches of this many lookups
+_COUNTER_FLUSH_EVERY = 100
+# /Archives/edgar/data/<CIK>/<accession number without dashes>/<document>
+_ACCESSION_RE = re.compile(r"/Archives/edgar/data/\d+/(\d{10})(\d{2})(\d{6})/")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS blobs (
+    sha TEXT PRIMARY KEY,
+    raw_bytes INTEGER NOT NULL,
+    blob_bytes INTEGER NOT NULL,
+    stored_bytes INTEGER NOT NULL, -- compressed blob plus extracted text/sections
+    last_access REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS entries (
+    ticker TEXT NOT NULL,
+    accession TEXT NOT NULL,
+    doc_type TEXT NOT NULL,
+    url TEXT,
+    sha TEXT NOT NULL REFERENCES blobs(sha),
+    created_at REAL NOT NULL,
+    PRIMARY KEY (ticker, accession, doc_type)
+);
+CREATE INDEX IF NOT EXISTS entries_sha ON entries(sha);
+CREATE INDEX IF NOT EXISTS blobs_lru ON blobs(last_access);
+CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL);
+"""
+
+
+def accession_from_url(url: str) -> str:
+    """EDGAR accession number (0000320193-24-000123) of a document URL, or its file name as a fallback."""
+    match = _ACCESSION_RE.search(url)
+    return "-".join(match.groups()) if match else os.path.basename(url)
+
+
+class FilingCache:
+    """Size-capped, content-addressed store of downloaded filings, shared by scraper processes.
+
+    Documents are gzip-compressed into `blobs/<sha[:2]>/<sha>.html.gz`, keyed by the SHA-256 of
+    the raw HTML, so the same document fetched for several tickers or types is stored once. A
+    SQLite index (WAL mode, safe for concurrent processes) maps (ticker, accession, doc type) to a
+    blob and records each blob's last access; when the stored bytes exceed `max_bytes` the least
+    recently used blobs are evicted together with their extracted text. Blobs are written to a
+    temporary file and renamed into place, so readers never see a partial file. Lookups are plain
+    reads; last-access times and hit/miss counters are written lazily and best-effort, so cache
+    hits from many processes do not queue up on the index's write lock.
+    """
+
+    def __init__(self, root: str = settings.SEC_FILINGS_CACHE_PATH, max_bytes: int = settings.SEC_FILINGS_CACHE_MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._connection = ThreadLocalConnection(os.path.join(root, INDEX_NAME), timeout=30.0, isolation_level=None)
+        self._pending_counts: Dict[str, int] = {}
+        self._counts_lock = threading.Lock()
+        os.makedirs(os.path.join(root, BLOB_DIR), exist_ok=True)
+        self._connection().executescript(_SCHEMA)
+
+    # --- SQLite ---
+
+    def _transaction(self):
+        return _Transaction(self._connection())
+
+    @staticmethod
+    def _count(conn: sqlite3.Connection, name: str, amount: int = 1):
+        conn.execute(
+            "INSERT INTO counters (name, value) VALUES (?, ?) ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+            (name, amount),
+        )
+
+    def _tally(self, name: str):
+        with self._counts_lock:
+            self._pending_counts[name] = self._pending_counts.get(name, 0) + 1
+            due = sum(self._pending_counts.values()) >= _COUNTER_FLUSH_EVERY
+        if due:
+            self._write_behind()
+
+    def _write_behind(self, touch: Optional[str] = None):
+        """Best-effort write of buffered counters (and a blob's last access); a failure only loses precision."""
+        with self._counts_lock:
+            counts, self._pending_counts = self._pending_counts, {}
+        try:
+            with self._transaction() as conn:
+                for name, amount in counts.items():
+                    self._count(conn, name, amount)
+                if touch is not None:
+                    conn.execute("UPDATE blobs SET last_access = ? WHERE sha = ?", (time.time(), touch))
+        except sqlite3.Error as e:
+            print(f"Filing cache: deferred index update failed: {e}")
+            with self._counts_lock:
+                for name, amount in counts.items():
+                    self._pending_counts[name] = self._pending_counts.get(name, 0) + amount
+
+    def blob_path(self, sha: str) -> str:
+        return os.path.join(self.root, BLOB_DIR, sha[:2], f"{sha}.html.gz")
+
+    # --- Reads ---
+
+    def lookup(self, ticker: str, accession: str, doc_type: str) -> Optional[str]:
+        """Path of the cached blob for this filing document (marking it recently used), or None."""
+        conn = self._connection()
+        row = conn.execute(
+            "SELECT e.sha, b.last_access FROM entries e JOIN blobs b ON b.sha = e.sha "
+            "WHERE e.ticker = ? AND e.accession = ? AND e.doc_type = ?", (ticker, accession, doc_type)
+        ).fetchone()
+        if row is None:
+            # The same document may already be cached under another ticker (e.g. share classes)
+            alias = conn.execute(
+                "SELECT e.sha, e.url, b.last_access FROM entries e JOIN blobs b ON b.sha = e.sha "
+                "WHERE e.accession = ? AND e.doc_type = ? LIMIT 1", (accession, doc_type)
+            ).fetchone()
+            if alias is not None:
+                with self._transaction() as wconn:
+                    wconn.execute(
+                        "INSERT OR IGNORE INTO entries (ticker, accession, doc_type, url, sha, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+                        (ticker, accession, doc_type, alias[1], alias[0], time.time()),
+                    )
+                row = (alias[0], alias[2])
+        if row is None or not os.path.exists(self.blob_path(row[0])):
+            self._tally("misses")
+            return None
+        sha, last_access = row
+        self._tally("hits")
+        if time.time() - last_access > _ACCESS_RESOLUTION_SECONDS:
+            self._write_behind(touch=sha)
+        return self.blob_path(sha)
+
+    def extract(self, blob_path: str) -> Tuple[str, List[Dict[str, Any]]]:
+        """Text and sections of a cached filing; the first extraction is charged to the blob's size."""
+        text_path, _ = derived_paths(blob_path)
+        first_time = not os.path.exists(text_path)
+        result = extract_filing(blob_path)
+        if first_time:
+            derived = sum(os.path.getsize(p) for p in derived_paths(blob_path) if os.path.exists(p))
+            sha = os.path.basename(blob_path).split(".")[0]
+            with self._transaction() as conn:
+                conn.execute("UPDATE blobs SET stored_bytes = stored_bytes + ? WHERE sha = ?", (derived, sha))
+            self._evict(keep=sha)
+        return result
+
+    # --- Writes ---
+
+    def _compress(self, raw_path: str) -> Tuple[str, int, int]:
+        """Compresses raw_path into its content-addressed blob. Returns (sha, raw bytes, blob bytes)."""
+        digest, raw_bytes = hashlib.sha256(), 0
+        tmp_path = os.path.join(self.root, BLOB_DIR, f".{uuid.uuid4().hex}.tmp")
+        try:
+            with open(raw_path, "rb") as src, gzip.open(tmp_path, "wb", compresslevel=settings.SEC_FILINGS_CACHE_COMPRESSION_LEVEL) as dst:
+                while chunk := src.read(_COPY_CHUNK_BYTES):
+                    digest.update(chunk)
+                    dst.write(chunk)
+                    raw_bytes += len(chunk)
+            sha = digest.hexdigest()
+            final_path = self.blob_path(sha)
+            os.makedirs(os.path.dirname(final_path), exist_ok=True)
+            if os.path.exists(final_path):
+                os.remove(tmp_path) # identical content already cached (possibly by another process)
+            else:
+                os.replace(tmp_path, final_path)
+            return sha, raw_bytes, os.path.getsize(final_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def put_file(self, ticker: str, accession: str, doc_type: str, raw_path: str, url: Optional[str] = None) -> str:
+        """Moves a downloaded HTML file into the cache and returns its blob path."""
+        sha, raw_bytes, blob_bytes = self._compress(raw_path)
+        now = time.time()
+        with self._transaction() as conn:
+            conn.execute(
+                "INSERT INTO blobs (sha, raw_bytes, blob_bytes, stored_bytes, last_access) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT(sha) DO UPDATE SET last_access = excluded.last_access",
+                (sha, raw_bytes, blob_bytes, blob_bytes, now),
+            )
+            conn.execute(
+                "INSERT OR REPLACE INTO entries (ticker, accession, doc_type, url, sha, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (ticker, accession, doc_type, url, sha, now),
+            )
+        os.remove(raw_path)
+        self._evict(keep=sha)
+        return self.blob_path(sha)
+
+    def _evict(self, keep: Optional[str] = None):
+        """Drops least recently used blobs until the cache fits in max_bytes."""
+        with self._transaction() as conn:
+            removed = evict_lru(conn, "blobs", "sha", "stored_bytes", self.max_bytes, keep=keep)
+            if not removed:
+                return
+            conn.executemany("DELETE FROM entries WHERE sha = ?", ((sha,) for sha in removed))
+            self._count(conn, "evictions", len(removed))
+        # Files go after the commit; a process already reading one keeps its open handle
+        for sha in removed:
+            blob_path = self.blob_path(sha)
+            for path in (blob_path, *derived_paths(blob_path)):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+
+    def import_legacy(self, legacy_path: str, ticker: str, accession: str, doc_type: str) -> Optional[str]:
+        """Moves a file from the old uncompressed `{ticker}_{doc_type}_{name}.html` layout into the cache."""
+        if not os.path.exists(legacy_path):
+            return None
+        for path in derived_paths(legacy_path):
+            if os.path.exists(path):
+                os.remove(path)
+        try:
+            return self.put_file(ticker, accession, doc_type, legacy_path)
+        except FileNotFoundError:
+            return None # another process imported it first
+
+    def stats(self) -> Dict[str, Any]:
+        conn = self._connection()
+        counters = dict(conn.execute("SELECT name, value FROM counters").fetchall())
+        with self._counts_lock:
+            for name, amount in self._pending_counts.items(): # this process's not yet written lookups
+                counters[name] = counters.get(name, 0) + amount
+        blobs, stored, compressed, raw = conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(stored_bytes), 0), COALESCE(SUM(blob_bytes), 0), COALESCE(SUM(raw_bytes), 0) FROM blobs"
+        ).fetchone()
+        # What the uncompressed one-file-per-entry layout would use for the same entries
+        logical = conn.execute("SELECT COALESCE(SUM(b.raw_bytes), 0) FROM entries e JOIN blobs b ON b.sha = e.sha").fetchone()[0]
+        entries = conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        hits, misses = counters.get("hits", 0), counters.get("misses", 0)
+        return {
+            "entries": entries,
+            "blobs": blobs,
+            "stored_bytes": stored,
+            "raw_bytes": raw,
+            "max_bytes": self.max_bytes,
+            "bytes_saved": logical - stored,
+            "compression_ratio": round(raw / compressed, 2) if compressed else None,
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": round(hits / (hits + misses), 4) if hits + misses else 0.0,
+            "evictions": counters.get("evictions", 0),
+        }
+
+
+class _Transaction:
+    """BEGIN IMMEDIATE ... COMMIT, so concurrent processes serialize their index updates."""
+
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+
+    def __enter__(self) -> sqlite3.Connection:
+        self.conn.execute("BEGIN IMMEDIATE")
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        self.conn.execute("ROLLBACK" if exc_type else "COMMIT")
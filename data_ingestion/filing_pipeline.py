@@ -0,0 +1,257 @@
+import argparse
+import asyncio
+import hashlib
+import os
+import time
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+
+from config.settings import settings
+from data_ingestion.sec_filings_scraper import SECFilingsScraper
+from utils.agent_client import AgentClient, agent_client
+from utils.sqlite_store import ThreadLocalConnection
+from utils.tracing import current_trace_id, use_trace
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS filings (
+    ticker TEXT NOT NULL,
+    accession TEXT NOT NULL,
+    form TEXT NOT NULL,
+    filing_date TEXT,
+    chunks INTEGER,
+    ingested_at REAL,
+    PRIMARY KEY (ticker, accession)
+);
+CREATE TABLE IF NOT EXISTS chunks (hash TEXT PRIMARY KEY);
+"""
+
+
+def _line_tail(line: str, max_chars: int) -> str:
+    """The last max_chars or fewer characters of line, without a leading partial word."""
+    if max_chars <= 0:
+        return ""
+    start = len(line) - max_chars
+    tail = line[start:]
+    if start > 0 and not line[start - 1].isspace():
+        space = tail.find(" ")
+        if space >= 0:
+            tail = tail[space + 1:]
+    return tail.strip()
+
+
+def chunk_text(text: str, chunk_chars: int = settings.FILING_CHUNK_CHARS,
+               overlap_chars: int = settings.FILING_CHUNK_OVERLAP_CHARS) -> Iterator[str]:
+    """Splits text on line boundaries into ~chunk_chars pieces, each repeating the trailing
+    ~overlap_chars of the previous one so facts spanning a boundary stay retrievable."""
+    lines: List[str] = []
+    size = 0
+    for line in text.split("\n"):
+        # A single overlong line (a flattened table) is cut hard, with the same overlap
+        pieces = [line[i:i + chunk_chars] for i in range(0, max(len(line) - overlap_chars, 1), chunk_chars - overlap_chars)]
+        for piece in pieces:
+            if size + len(piece) > chunk_chars and lines:
+                yield "\n".join(lines)
+                carried: List[str] = []
+                carried_size = 0
+                for previous in reversed(lines):
+                    if carried_size + len(previous) > overlap_chars:
+                        # Filings run one paragraph per line, usually longer than the overlap:
+                        # carry the paragraph's tail instead, starting at a word boundary
+                        tail = _line_tail(previous, overlap_chars - carried_size)
+                        if tail:
+                            carried.insert(0, tail)
+                            carried_size += len(tail) + 1
+                        break
+                    carried.insert(0, previous)
+                    carried_size += len(previous) + 1
+                lines, size = carried, carried_size
+                while lines and size + len(piece) > chunk_chars:
+                    size -= len(lines.pop(0)) + 1
+            lines.append(piece)
+            size += len(piece) + 1
+    if "".join(lines).strip():
+        yield "\n".join(lines)
+
+
+def filing_chunks(ticker: str, filing: Dict[str, Any], text: str, sections: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Retriever documents for one filing: chunks of each Item section, or of the whole text if
+    no sections were recognized, with the metadata the retriever filters on."""
+    base = {
+        "ticker": ticker,
+        "filing_type": filing["form"],
+        "filing_date": filing["filing_date"],
+        "period": filing.get("report_date"),
+        "accession": filing["accession"],
+        "source": filing["url"],
+    }
+    parts = [(s["section"], s["text"]) for s in sections] or [(None, text)]
+    documents = []
+    for section, part in parts:
+        for index, chunk in enumerate(chunk_text(part)):
+            metadata = {**base, "section": section, "chunk": index}
+            documents.append({"page_content": chunk, "metadata": metadata})
+    return documents
+
+
+def chunk_hash(ticker: str, text: str) -> str:
+    # Per ticker, so boilerplate repeated across a company's filings is stored once
+    return hashlib.sha256(f"{ticker}\x00{text}".encode("utf-8")).hexdigest()
+
+
+class PipelineState:
+    """Progress of the ingestion pipeline in SQLite: which filings are fully ingested and the
+    hashes of every chunk already pushed. A run interrupted mid-filing resumes by re-chunking the
+    filing and skipping chunks that made it to the retriever."""
+
+    def __init__(self, path: str = settings.FILING_PIPELINE_STATE_PATH):
+        self.path = path
+        self._connection = ThreadLocalConnection(path, timeout=30.0, synchronous=None)
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._connection().executescript(_SCHEMA)
+
+    def ingested_accessions(self, ticker: str) -> set:
+        rows = self._connection().execute(
+            "SELECT accession FROM filings WHERE ticker = ? AND ingested_at IS NOT NULL", (ticker,)
+        ).fetchall()
+        return {row[0] for row in rows}
+
+    def new_chunks(self, documents: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """The documents whose chunk text was not pushed before (also de-duplicated within the list)."""
+        conn = self._connection()
+        fresh, seen = [], set()
+        for doc in documents:
+            key = chunk_hash(doc["metadata"]["ticker"], doc["page_content"])
+            if key in seen or conn.execute("SELECT 1 FROM chunks WHERE hash = ?", (key,)).fetchone():
+                continue
+            seen.add(key)
+            fresh.append(doc)
+        return fresh
+
+    def mark_chunks(self, documents: List[Dict[str, Any]]):
+        with self._connection() as conn:
+            conn.executemany(
+                "INSERT OR IGNORE INTO chunks (hash) VALUES (?)",
+                [(chunk_hash(doc["metadata"]["ticker"], doc["page_content"]),) for doc in documents],
+            )
+
+    def mark_filing(self, ticker: str, filing: Dict[str, Any], chunks: int):
+        with self._connection() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO filings (ticker, accession, form, filing_date, chunks, ingested_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (ticker, filing["accession"], filing["form"], filing["filing_date"], chunks, time.time()),
+            )
+
+
+class FilingPipeline:
+    """Incremental EDGAR -> retriever ingestion.
+
+    For each ticker, filings are discovered by accession number and only those not yet ingested
+    are fetched (through the scraper's rate limit and filing cache), split into overlapping chunks
+    per Item section and de-duplicated against everything pushed before. Tickers are processed
+    concurrently and feed a queue that a single pusher drains into `/retriever/add_documents/` in
+    batches, so fetching and embedding overlap. A filing is recorded as ingested only after all
+    of its chunks were accepted, which makes every run resumable.
+    """
+
+    def __init__(
+        self,
+        scraper: Optional[SECFilingsScraper] = None,
+        state: Optional[PipelineState] = None,
+        client: Optional[AgentClient] = None,
+        forms: Sequence[str] = settings.FILING_PIPELINE_FORMS,
+        max_filings_per_ticker: int = settings.FILING_PIPELINE_MAX_FILINGS_PER_TICKER,
+        batch_size: int = settings.FILING_PIPELINE_BATCH_SIZE,
+        concurrency: int = settings.FILING_PIPELINE_CONCURRENCY,
+    ):
+        self.scraper = scraper or SECFilingsScraper()
+        self.state = state or PipelineState()
+        self.client = client or agent_client
+        self.forms = tuple(forms)
+        self.max_filings_per_ticker = max_filings_per_ticker
+        self.batch_size = max(1, batch_size)
+        self.concurrency = max(1, concurrency)
+        self.counters = {"filings_seen": 0, "filings_ingested": 0, "chunks_pushed": 0, "chunks_skipped": 0, "errors": 0}
+
+    async def _push(self, documents: List[Dict[str, Any]]):
+        for i in range(0, len(documents), self.batch_size):
+            batch = documents[i:i + self.batch_size]
+            await self.client.post_json("retriever", "/retriever/add_documents/", json=batch)
+            await asyncio.to_thread(self.state.mark_chunks, batch)
+            self.counters["chunks_pushed"] += len(batch)
+
+    async def _pusher(self, queue: asyncio.Queue):
+        # One consumer keeps the retriever's write path sequential while producers keep fetching
+        while True:
+            item = await queue.get()
+            try:
+                if item is None:
+                    return
+                ticker, filing, documents, done = item
+                try:
+                    await self._push(documents)
+                    await asyncio.to_thread(self.state.mark_filing, ticker, filing, len(documents))
+                    self.counters["filings_ingested"] += 1
+                    done.set_result(None)
+                except Exception as e:
+                    done.set_exception(e)
+            finally:
+                queue.task_done()
+
+    async def _ingest_ticker(self, ticker: str, queue: asyncio.Queue, semaphore: asyncio.Semaphore):
+        async with semaphore:
+            try:
+                filings = await self.scraper.list_filings(ticker, self.forms)
+            except Exception as e:
+                print(f"Filing pipeline: could not list filings for {ticker}: {e}")
+                self.counters["errors"] += 1
+                return
+            done_accessions = await asyncio.to_thread(self.state.ingested_accessions, ticker)
+            new_filings = [f for f in filings[:self.max_filings_per_ticker] if f["accession"] not in done_accessions]
+            self.counters["filings_seen"] += len(filings[:self.max_filings_per_ticker])
+            # Oldest first, so an interrupted run leaves a contiguous history behind
+            for filing in reversed(new_filings):
+                try:
+                    text, sections = await self.scraper.download_and_extract(filing["url"], ticker, filing["form"])
+                    documents = filing_chunks(ticker, filing, text, sections)
+                    fresh = await asyncio.to_thread(self.state.new_chunks, documents)
+                    self.counters["chunks_skipped"] += len(documents) - len(fresh)
+                    done = asyncio.get_running_loop().create_future()
+                    await queue.put((ticker, filing, fresh, done))
+                    await done
+                    print(f"Filing pipeline: {ticker} {filing['form']} {filing['accession']}: {len(fresh)} new of {len(documents)} chunks.")
+                except Exception as e:
+                    print(f"Filing pipeline: {ticker} {filing['accession']} failed: {e}")
+                    self.counters["errors"] += 1
+
+    async def run(self, tickers: Sequence[str]) -> Dict[str, int]:
+        """Ingests everything new for the given tickers and returns the run's counters."""
+        started = time.time()
+        # One trace per run, so the retriever's spans for its batches can be looked up together
+        with use_trace(current_trace_id()) as trace_id:
+            # Bounded, so fetching cannot run arbitrarily far ahead of the retriever
+            queue: asyncio.Queue = asyncio.Queue(maxsize=self.concurrency * 2)
+            pusher = asyncio.create_task(self._pusher(queue))
+            semaphore = asyncio.Semaphore(self.concurrency)
+            try:
+                await asyncio.gather(*(self._ingest_ticker(t.upper(), queue, semaphore) for t in dict.fromkeys(tickers)))
+            finally:
+                await queue.put(None)
+                await pusher
+        print(f"Filing pipeline: finished {len(tickers)} tickers in {time.time() - started:.1f}s (trace {trace_id}): {self.counters}")
+        return dict(self.counters)
+
+
+def _read_universe(path: str) -> List[str]:
+    with open(path) as f:
+        return [line.split(",")[0].strip() for line in f if line.strip() and not line.startswith(("#", "symbol"))]
+
+
+if __name__ == "__main__":
+    # Nightly: python -m data_ingestion.filing_pipeline --universe data/symbols.csv
+    parser = argparse.ArgumentParser(description="Ingest new SEC filings into the retriever.")
+    parser.add_argument("tickers", nargs="*", help="Tickers to ingest")
+    parser.add_argument("--universe", help="File with one ticker per line (first CSV column)")
+    args = parser.parse_args()
+    tickers = args.tickers + (_read_universe(args.universe) if args.universe else [])
+    if not tickers:
+        parser.error("Give tickers or --universe.")
+    asyncio.run(FilingPipeline().run(tickers))
@@ -0,0 +1,175 @@
+import gzip
+import json
+import os
+import re
+import threading
+from html.parser import HTMLParser
+from typing import Any, Dict, List, Optional, Tuple
+
+# Bump when extraction output changes so cached text/sections are rebuilt
+EXTRACTOR_VERSION = 1
+_READ_CHUNK_CHARS = 1 << 16 # HTMLParser re-slices its buffer per tag, so small feeds are faster
+
+# Content that is never shown: scripts, styles and the hidden inline-XBRL header of modern filings
+_SKIP_TAGS = {"script", "style", "head", "title", "ix:header"}
+_BLOCK_TAGS = {
+    "p", "div", "br", "tr", "li", "ul", "ol", "table", "section", "article", "blockquote", "pre", "hr",
+    "h1", "h2", "h3", "h4", "h5", "h6", "center", "dt", "dd",
+}
+_CELL_TAGS = {"td", "th"}
+
+# Item headings of 10-K and 10-Q filings, keyed by the section name returned to callers.
+# 10-K and 10-Q number the same sections differently (e.g. MD&A is Item 7 vs. Item 2).
+SECTION_PATTERNS = {
+    "business": r"item\s*1\s*[.:\-]?\s*business\b",
+    "risk_factors": r"item\s*1a\s*[.:\-]?\s*risk\s+factors",
+    "legal_proceedings": r"item\s*[13]\s*[.:\-]?\s*legal\s+proceedings",
+    "mdna": r"item\s*[27]\s*[.:\-]?\s*management.s\s+discussion",
+    "market_risk": r"item\s*(?:3|7a)\s*[.:\-]?\s*quantitative\s+and\s+qualitative",
+    "financial_statements": r"item\s*[18]\s*[.:\-]?\s*(?:consolidated\s+)?financial\s+statements",
+    "controls": r"item\s*(?:4|9a)\s*[.:\-]?\s*controls\s+and\s+procedures",
+}
+_SECTION_RES = {name: re.compile(pattern, re.IGNORECASE) for name, pattern in SECTION_PATTERNS.items()}
+_ITEM_HEADING_RE = re.compile(r"^(?:part\s+[iv]+\s*[.,\-]?\s*)?item\s*\d+[a-c]?\b", re.IGNORECASE)
+_MAX_HEADING_CHARS = 200
+
+
+class _TextExtractor(HTMLParser):
+    """Event-driven HTML-to-text: keeps only the text, one line per block element, no DOM."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.lines: List[str] = []
+        self._current: List[str] = []
+        self._skip_depth = 0
+
+    def _break(self):
+        if self._current:
+            line = " ".join("".join(self._current).split())
+            if line:
+                self.lines.append(line)
+            self._current = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag in _SKIP_TAGS:
+            self._skip_depth += 1
+        elif tag in _BLOCK_TAGS:
+            self._break()
+        elif tag in _CELL_TAGS:
+            self._current.append(" ")
+
+    def handle_startendtag(self, tag, attrs):
+        if tag in _BLOCK_TAGS:
+            self._break()
+
+    def handle_endtag(self, tag):
+        if tag in _SKIP_TAGS:
+            self._skip_depth = max(0, self._skip_depth - 1)
+        elif tag in _BLOCK_TAGS:
+            self._break()
+
+    def handle_data(self, data):
+        if not self._skip_depth:
+            self._current.append(data)
+
+    def close(self):
+        super().close()
+        self._break()
+
+
+def extract_lines(html_path: str) -> List[str]:
+    """Streams an HTML file (optionally gzip-compressed, *.gz) through the parser in 64 KB pieces
+    and returns its text lines."""
+    parser = _TextExtractor()
+    opener = gzip.open if html_path.endswith(".gz") else open
+    with opener(html_path, "rt", encoding="utf-8", errors="replace") as f:
+        while True:
+            chunk = f.read(_READ_CHUNK_CHARS)
+            if not chunk:
+                break
+            parser.feed(chunk)
+    parser.close()
+    return parser.lines
+
+
+def extract_sections(lines: List[str]) -> List[Dict[str, Any]]:
+    """Splits filing text into the standard Item sections.
+
+    Every short line that starts with "Item N" bounds a section. A heading usually appears twice,
+    first in the table of contents, so each section keeps the occurrence with the longest body.
+    Returns [{"section", "title", "start", "end", "text"}] in document order; start/end delimit
+    the section body within the newline-joined text.
+    """
+    offsets, position = [], 0
+    for line in lines:
+        offsets.append(position)
+        position += len(line) + 1
+    headings = [i for i, line in enumerate(lines) if len(line) <= _MAX_HEADING_CHARS and _ITEM_HEADING_RE.match(line)]
+
+    best: Dict[str, Tuple[int, int, int]] = {} # section -> (body length, heading line, end line)
+    for n, start in enumerate(headings):
+        end = headings[n + 1] if n + 1 < len(headings) else len(lines)
+        name = next((name for name, pattern in _SECTION_RES.items() if pattern.search(lines[start])), None)
+        if name is None:
+            continue
+        length = sum(len(line) for line in lines[start + 1:end])
+        if length > best.get(name, (-1, 0, 0))[0]:
+            best[name] = (length, start, end)
+
+    sections = [
+        {"section": name, "title": lines[start], "start": offsets[start + 1], "end": offsets[end - 1] + len(lines[end - 1]),
+         "text": "\n".join(lines[start + 1:end])}
+        for name, (length, start, end) in best.items() if length
+    ]
+    return sorted(sections, key=lambda section: section["start"])
+
+
+def derived_paths(html_path: str) -> Tuple[str, str]:
+    """Where the extracted text and sections of an HTML file are cached (next to it).
+    The text of a compressed filing is stored compressed as well."""
+    if html_path.endswith(".gz"):
+        base = html_path[:-len(".gz")]
+        return base + ".txt.gz", base + ".sections.json"
+    return html_path + ".txt", html_path + ".sections.json"
+
+
+def _open_text(path: str, mode: str, compressed: bool):
+    return gzip.open(path, mode + "t", encoding="utf-8") if compressed else open(path, mode, encoding="utf-8")
+
+
+def _write_atomic(path: str, content: str):
+    tmp_path = f"{path}.{os.getpid()}-{threading.get_ident()}.tmp" # concurrent extractions of one filing must not collide
+    with _open_text(tmp_path, "w", compressed=path.endswith(".gz")) as f:
+        f.write(content)
+    os.replace(tmp_path, path)
+
+
+def load_extracted(html_path: str) -> Optional[Tuple[str, List[Dict[str, Any]]]]:
+    """The cached (text, sections) for an HTML file, or None if missing or from an older extractor."""
+    text_path, sections_path = derived_paths(html_path)
+    try:
+        with open(sections_path, encoding="utf-8") as f:
+            cached = json.load(f)
+        if cached.get("version") != EXTRACTOR_VERSION:
+            return None
+        with _open_text(text_path, "r", compressed=text_path.endswith(".gz")) as f:
+            text = f.read()
+        # Sections are stored as offsets into the text rather than a second copy of it
+        return text, [{**section, "text": text[section["start"]:section["end"]]} for section in cached["sections"]]
+    except (FileNotFoundError, json.JSONDecodeError, KeyError):
+        return None
+
+
+def extract_filing(html_path: str) -> Tuple[str, List[Dict[str, Any]]]:
+    """Text and Item sections of a filing, extracted once and cached next to the HTML."""
+    cached = load_extracted(html_path)
+    if cached is not None:
+        return cached
+    lines = extract_lines(html_path)
+    text, sections = "\n".join(lines), extract_sections(lines)
+    text_path, sections_path = derived_paths(html_path)
+    _write_atomic(text_path, text)
+    # Written last: its presence with the current version marks the cache entry complete
+    spans = [{key: value for key, value in section.items() if key != "text"} for section in sections]
+    _write_atomic(sections_path, json.dumps({"version": EXTRACTOR_VERSION, "sections": spans}))
+    return text, sections
@@ -0,0 +1,241 @@
+import asyncio
+import hashlib
+import re
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Sequence
+
+import httpx
+
+from config.settings import settings
+from utils.agent_client import LoopBoundClient
+from utils.tracing import span
+from utils.ttl_cache import TTLCache
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+# Syndicated copies often differ only by a trailing " - Reuters" / " | Yahoo Finance"
+_SOURCE_SUFFIX_RE = re.compile(r"\s+[-|–—]\s+[^-|–—]{2,40}$")
+
+
+def simhash(text: str, bits: int = 64) -> int:
+    """64-bit SimHash over word unigrams and bigrams: texts sharing most of their words get
+    fingerprints that differ in only a few bits."""
+    words = _WORD_RE.findall(text.lower())
+    features = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+    weights = [0] * bits
+    for feature in features:
+        h = int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "big")
+        for bit in range(bits):
+            weights[bit] += 1 if h >> bit & 1 else -1
+    return sum(1 << bit for bit in range(bits) if weights[bit] > 0)
+
+
+def _title_key(article: Dict[str, Any]) -> str:
+    return " ".join(_WORD_RE.findall(_SOURCE_SUFFIX_RE.sub("", article.get("title") or "").lower()))
+
+
+def _article_text(article: Dict[str, Any]) -> str:
+    return f"{_title_key(article)} {article.get('description') or ''}"
+
+
+def collapse_near_duplicates(articles: List[Dict[str, Any]],
+                             max_distance: int = settings.NEWS_NEAR_DUPLICATE_MAX_DISTANCE) -> List[Dict[str, Any]]:
+    """Keeps the first of each group of syndicated copies (same headline, or SimHash of headline
+    and description within max_distance bits), listing the dropped copies' sources under
+    "also_reported_by"."""
+    kept: List[Dict[str, Any]] = []
+    fingerprints: List[int] = []
+    titles: Dict[str, int] = {}
+    for article in articles:
+        title, fingerprint = _title_key(article), simhash(_article_text(article))
+        match = titles.get(title) if title else None
+        if match is None:
+            match = next((i for i, other in enumerate(fingerprints) if bin(fingerprint ^ other).count("1") <= max_distance), None)
+        if match is None:
+            titles.setdefault(title, len(kept))
+            # The list is copied too: articles come from the cache and must not pick up other queries' sources
+            kept.append({**article, "also_reported_by": list(article.get("also_reported_by", []))})
+            fingerprints.append(fingerprint)
+        elif article.get("source") and article["source"] != kept[match].get("source"):
+            also = kept[match]["also_reported_by"]
+            if article["source"] not in also:
+                also.append(article["source"])
+    return kept
+
+
+class NewsLoader:
+    """Cached, concurrent NewsAPI client.
+
+    Results are cached per normalized query for NEWS_CACHE_TTL_SECONDS, and concurrent misses for
+    the same query share one upstream call. Articles returned for general-market queries are
+    indexed under the tickers they mention (via the ticker resolver), and those tickers' own
+    queries are fetched in the background, so a follow-up question about one of them costs no
+    upstream call.
+    """
+
+    def __init__(
+        self,
+        api_key: str = settings.NEWS_API_KEY,
+        resolver: Any = None,
+        ttl_seconds: float = settings.NEWS_CACHE_TTL_SECONDS,
+        concurrency: int = settings.NEWS_MAX_CONCURRENCY,
+        page_size: int = settings.NEWS_PAGE_SIZE,
+    ):
+        self.api_key = api_key
+        self.base_url = "https://newsapi.org/v2/everything"
+        self.resolver = resolver
+        self.page_size = page_size
+        self.concurrency = max(1, concurrency)
+        self.cache = TTLCache(ttl_seconds, settings.NEWS_CACHE_MAX_ENTRIES, name="news")
+        # ticker -> {url: (indexed_at, article)} from general-market results
+        self._ticker_index: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._flights: Dict[str, asyncio.Future] = {}
+        self._warming: Dict[str, asyncio.Task] = {} # strong references to background fetches
+        self._counters = {"upstream_calls": 0, "upstream_errors": 0, "coalesced": 0, "warmed": 0, "collapsed": 0}
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._client = LoopBoundClient(
+            lambda: httpx.AsyncClient(timeout=httpx.Timeout(settings.NEWS_TIMEOUT_SECONDS, connect=5.0)),
+            on_new_loop=self._reset_loop_state,
+        )
+
+    def _reset_loop_state(self):
+        # The semaphore and in-flight futures belong to the event loop that created them
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        self._flights = {}
+
+    def _http(self):
+        return self._client.get(), self._semaphore
+
+    @staticmethod
+    def ticker_query(ticker: str) -> str:
+        return f"{ticker.upper()} stock news"
+
+    @staticmethod
+    def _key(query: str) -> str:
+        return " ".join(query.lower().split())
+
+    # --- Upstream ---
+
+    async def _fetch(self, query: str) -> List[Dict[str, Any]]:
+        """One NewsAPI call: English articles from the last 7 days, most relevant first."""
+        client, semaphore = self._http()
+        params = {
+            "q": query,
+            "language": "en",
+            "sortBy": "relevancy",
+            "from": (datetime.now() - timedelta(days=7)).isoformat(timespec="minutes"),
+            "apiKey": self.api_key,
+            "pageSize": self.page_size,
+        }
+        async with semaphore:
+            self._counters["upstream_calls"] += 1
+            with span("upstream:newsapi"):
+                response = await client.get(self.base_url, params=params)
+                response.raise_for_status()
+        return [
+            {
+                "source": article.get("source", {}).get("name", "N/A"),
+                "title": article.get("title"),
+                "description": article.get("description"),
+                "url": article.get("url"),
+                "published_at": article.get("publishedAt"),
+            }
+            for article in response.json().get("articles", [])
+            if article.get("title") and article.get("description")
+        ]
+
+    async def fetch(self, query: str) -> List[Dict[str, Any]]:
+        """Articles for a query, from the cache when fresh. Failures return [] and are not cached."""
+        if not self.api_key:
+            print("NEWS_API_KEY is not set. Skipping news retrieval.")
+            return []
+        key = self._key(query)
+        found, articles = self.cache.get(key)
+        if found:
+            return articles
+        self._http()
+        flight = self._flights.get(key)
+        if flight is not None:
+            self._counters["coalesced"] += 1
+            return await asyncio.shield(flight)
+
+        flight = self._flights[key] = asyncio.get_running_loop().create_future()
+        articles: List[Dict[str, Any]] = []
+        try:
+            articles = collapse_near_duplicates(await self._fetch(query))
+            self.cache.set(key, articles)
+        except Exception as e:
+            print(f"Error fetching news from NewsAPI for '{query}': {e}")
+            self._counters["upstream_errors"] += 1
+        finally:
+            # Also on cancellation, so callers waiting on this flight never hang
+            self._flights.pop(key, None)
+            flight.set_result(articles)
+        return articles
+
+    # --- Per-ticker index and background warming ---
+
+    def _index_by_ticker(self, articles: List[Dict[str, Any]]) -> List[str]:
+        """Files general-market articles under the tickers they mention; returns those tickers."""
+        if self.resolver is None:
+            return []
+        now, mentioned = time.monotonic(), []
+        for article in articles:
+            text = f"{article.get('title') or ''} {article.get('description') or ''}"
+            for ticker in self.resolver.resolve(text).tickers:
+                entries = self._ticker_index.setdefault(ticker, {})
+                entries[article["url"]] = (now, article)
+                self._ticker_index.move_to_end(ticker)
+                mentioned.append(ticker)
+        while len(self._ticker_index) > settings.NEWS_CACHE_MAX_ENTRIES:
+            self._ticker_index.popitem(last=False)
+        return list(dict.fromkeys(mentioned))
+
+    def indexed_articles(self, ticker: str) -> List[Dict[str, Any]]:
+        """Fresh general-market articles that mention ticker."""
+        entries = self._ticker_index.get(ticker.upper(), {})
+        cutoff = time.monotonic() - self.cache.ttl_seconds
+        for url in [url for url, (indexed_at, _) in entries.items() if indexed_at < cutoff]:
+            del entries[url]
+        return [article for _, article in entries.values()]
+
+    def _warm(self, tickers: Sequence[str]):
+        for ticker in tickers[:settings.NEWS_WARM_MAX_TICKERS]:
+            key = self._key(self.ticker_query(ticker))
+            if key in self._warming or self.cache.get(key)[0]:
+                continue
+            task = self._warming[key] = asyncio.create_task(self.fetch(self.ticker_query(ticker)))
+            task.add_done_callback(lambda _, key=key: self._warming.pop(key, None))
+            self._counters["warmed"] += 1
+
+    # --- Public API ---
+
+    async def search(self, queries: Sequence[str], tickers: Sequence[str] = (),
+                     max_articles: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Runs the queries concurrently and merges their articles with the per-ticker index,
+        collapsing syndicated copies. Queries are general-market unless they are a ticker query."""
+        queries = list(dict.fromkeys(queries))
+        results = await asyncio.gather(*(self.fetch(q) for q in queries))
+        ticker_queries = {self._key(self.ticker_query(t)) for t in tickers}
+        articles: List[Dict[str, Any]] = []
+        for query, found in zip(queries, results):
+            articles.extend(found)
+            if self._key(query) not in ticker_queries:
+                self._warm(self._index_by_ticker(found))
+        for ticker in tickers:
+            articles.extend(self.indexed_articles(ticker))
+        merged = collapse_near_duplicates(articles)
+        self._counters["collapsed"] += len(articles) - len(merged)
+        return merged[:max_articles] if max_articles else merged
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self._counters,
+            "warming": len(self._warming),
+            "indexed_tickers": len(self._ticker_index),
+            "cache": self.cache.stats(),
+        }
+
+    async def aclose(self):
+        await self._client.aclose()
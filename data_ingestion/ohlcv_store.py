@@ -0,0 +1,272 @@
+import json
+import os
+import re
+import threading
+import time
+from datetime import date, timedelta
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from config.settings import settings
+
+# One record per trading day. Dates are stored as days since the Unix epoch so that range
+# lookups are a binary search over a sorted int64 column.
+OHLCV_DTYPE = np.dtype([
+    ("date", "<i8"),
+    ("open", "<f8"),
+    ("high", "<f8"),
+    ("low", "<f8"),
+    ("close", "<f8"),
+    ("adj_close", "<f8"),
+    ("volume", "<f8"),
+])
+
+_EPOCH = date(1970, 1, 1)
+_PERIOD_RE = re.compile(r"^(\d+)(d|wk|mo|y)$")
+
+# Relative tolerance when checking that re-fetched overlapping bars still match the stored ones.
+# A larger difference means upstream re-adjusted history (dividend or split), so the stored
+# series has to be re-fetched rather than appended to.
+_ADJUSTMENT_TOLERANCE = 1e-6
+
+
+def to_epoch_days(d: date) -> int:
+    return (d - _EPOCH).days
+
+
+def from_epoch_days(days: int) -> date:
+    return _EPOCH + timedelta(days=int(days))
+
+
+def period_start(period: str, today: Optional[date] = None) -> Optional[date]:
+    """Translates a yfinance-style period ("5d", "6mo", "1y", "ytd", "max") into a start date.
+
+    Returns None for "max". Day periods count trading days upstream, so the calendar window is
+    padded here and callers trim the result with period_row_limit().
+    """
+    today = today or date.today()
+    if period == "max":
+        return None
+    if period == "ytd":
+        return date(today.year, 1, 1)
+    match = _PERIOD_RE.match(period)
+    if not match:
+        raise ValueError(f"Unsupported period '{period}'. Use e.g. '5d', '1mo', '6mo', '1y', 'ytd' or 'max'.")
+    amount, unit = int(match.group(1)), match.group(2)
+    if unit == "d":
+        return today - timedelta(days=amount * 2 + 7)
+    if unit == "wk":
+        return today - timedelta(weeks=amount)
+    if unit == "mo":
+        month_index = today.year * 12 + (today.month - 1) - amount
+        year, month = divmod(month_index, 12)
+        month += 1
+    else:
+        year, month = today.year - amount, today.month
+    # Clamp the day for shorter months (e.g. 31 March minus one month)
+    for day in (today.day, 30, 29, 28):
+        try:
+            return date(year, month, day)
+        except ValueError:
+            continue
+
+
+def period_row_limit(period: str) -> Optional[int]:
+    """Number of trailing rows a day-based period ("5d") should be trimmed to, else None."""
+    match = _PERIOD_RE.match(period)
+    if match and match.group(2) == "d":
+        return int(match.group(1))
+    return None
+
+
+class OHLCVStore:
+    """Per-symbol daily OHLCV history persisted as memory-mapped NumPy arrays under data/.
+
+    Each symbol is one sorted structured .npy file plus a small JSON sidecar recording which
+    date range was requested from upstream and when it was last synced. Files are replaced
+    atomically, so readers in other threads or processes never see a partial write.
+    """
+
+    def __init__(self, root: str = settings.OHLCV_STORE_PATH, refresh_seconds: float = settings.OHLCV_STORE_REFRESH_SECONDS):
+        self.root = root
+        self.refresh_seconds = refresh_seconds
+        self._locks: Dict[str, threading.Lock] = {}
+        self._locks_guard = threading.Lock()
+        os.makedirs(self.root, exist_ok=True)
+
+    # --- Paths and metadata ---
+
+    def _data_path(self, symbol: str) -> str:
+        return os.path.join(self.root, f"{symbol.upper()}.npy")
+
+    def _meta_path(self, symbol: str) -> str:
+        return os.path.join(self.root, f"{symbol.upper()}.json")
+
+    def _lock(self, symbol: str) -> threading.Lock:
+        with self._locks_guard:
+            return self._locks.setdefault(symbol.upper(), threading.Lock())
+
+    def meta(self, symbol: str) -> Optional[dict]:
+        try:
+            with open(self._meta_path(symbol), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def symbols(self) -> List[str]:
+        return sorted(name[:-4] for name in os.listdir(self.root) if name.endswith(".npy"))
+
+    # --- Reads ---
+
+    def read(self, symbol: str, start: Optional[date] = None, end: Optional[date] = None) -> Optional[np.ndarray]:
+        """Returns the stored rows for symbol within [start, end] as a read-only memory-mapped view."""
+        try:
+            rows = np.load(self._data_path(symbol), mmap_mode="r")
+        except FileNotFoundError:
+            return None
+        lo = np.searchsorted(rows["date"], to_epoch_days(start), side="left") if start else 0
+        hi = np.searchsorted(rows["date"], to_epoch_days(end), side="right") if end else len(rows)
+        return rows[lo:hi]
+
+    def plan_sync(self, symbol: str, start: Optional[date]) -> Tuple[bool, Optional[date]]:
+        """Decides whether a read from `start` (None = full history) needs an upstream fetch.
+
+        Returns (needs_fetch, fetch_from) where fetch_from=None means the full history.
+        Known symbols that were synced recently are served locally without any fetch.
+        """
+        meta = self.meta(symbol)
+        rows = self.read(symbol)
+        if meta is None or rows is None or len(rows) == 0:
+            return True, start
+
+        covered_from = date.fromisoformat(meta["covered_from"]) if meta.get("covered_from") else None
+        if covered_from is not None and (start is None or start < covered_from):
+            # The request reaches further back than anything fetched so far
+            return True, start
+        if time.time() - meta.get("synced_at", 0) < self.refresh_seconds:
+            return False, None
+        # Re-fetch from the second-to-last stored bar: the last one may have been a partial intraday
+        # bar and gets overwritten, while the completed bar before it lets merge() detect upstream
+        # re-adjustments.
+        return True, from_epoch_days(rows["date"][-2 if len(rows) > 1 else -1])
+
+    # --- Writes ---
+
+    def _write(self, symbol: str, rows: np.ndarray, covered_from: Optional[date]):
+        data_path, meta_path = self._data_path(symbol), self._meta_path(symbol)
+        tmp_suffix = f".tmp-{os.getpid()}-{threading.get_ident()}"
+        with open(data_path + tmp_suffix, "wb") as f:
+            np.save(f, np.ascontiguousarray(rows, dtype=OHLCV_DTYPE))
+        os.replace(data_path + tmp_suffix, data_path)
+        meta = {
+            "symbol": symbol.upper(),
+            "covered_from": covered_from.isoformat() if covered_from else None,
+            "synced_at": time.time(),
+            "rows": int(len(rows)),
+        }
+        with open(meta_path + tmp_suffix, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(meta_path + tmp_suffix, meta_path)
+
+    def merge(self, symbol: str, rows: np.ndarray, fetched_from: Optional[date]) -> bool:
+        """Merges freshly fetched rows into the stored series.
+
+        Fetched rows win for dates present in both. Returns False (and leaves the store untouched)
+        if an overlapping completed bar disagrees, meaning the stored history must be re-fetched in full.
+        """
+        with self._lock(symbol):
+            stored = self.read(symbol)
+            meta = self.meta(symbol) or {}
+            if stored is None or len(stored) == 0:
+                self._write(symbol, np.sort(rows, order="date"), fetched_from)
+                return True
+
+            stored = np.array(stored)  # detach from the memory map before replacing the file
+            shared, stored_idx, fetched_idx = np.intersect1d(stored["date"], rows["date"], return_indices=True)
+            # The last stored bar may have been partial when it was synced, so only completed bars
+            # count as evidence of a re-adjustment; fetched values still overwrite it below.
+            completed = stored_idx < len(stored) - 1
+            if completed.any():
+                first = int(np.argmax(completed))
+                old, new = stored["adj_close"][stored_idx[first]], rows["adj_close"][fetched_idx[first]]
+                if old and abs(new / old - 1.0) > _ADJUSTMENT_TOLERANCE:
+                    return False
+
+            kept = stored[~np.isin(stored["date"], rows["date"])]
+            merged = np.concatenate([kept, rows])
+            merged.sort(order="date")
+
+            previous_cover = date.fromisoformat(meta["covered_from"]) if meta.get("covered_from") else None
+            if not meta:
+                covered_from = fetched_from
+            elif previous_cover is None or fetched_from is None:
+                covered_from = None  # full history has been fetched at some point
+            else:
+                covered_from = min(previous_cover, fetched_from)
+            self._write(symbol, merged, covered_from)
+            return True
+
+    def replace(self, symbol: str, rows: np.ndarray, fetched_from: Optional[date]):
+        with self._lock(symbol):
+            self._write(symbol, np.sort(rows, order="date"), fetched_from)
+
+    def touch(self, symbol: str):
+        """Marks a stored symbol as freshly synced when upstream had no new bars for it."""
+        with self._lock(symbol):
+            meta = self.meta(symbol)
+            if meta is None:
+                return
+            meta["synced_at"] = time.time()
+            tmp_path = self._meta_path(symbol) + f".tmp-{os.getpid()}-{threading.get_ident()}"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(meta, f)
+            os.replace(tmp_path, self._meta_path(symbol))
+
+    # --- Sync helpers ---
+
+    def sync_many(
+        self,
+        symbols: Iterable[str],
+        start: Optional[date],
+        fetch_many: Callable[[List[str], Optional[date]], Dict[str, np.ndarray]],
+    ) -> Dict[str, str]:
+        """Brings every symbol up to date for reads from `start`, fetching only what is missing.
+
+        fetch_many(symbols, fetch_from) performs one bulk upstream request and returns rows per
+        symbol (fetch_from=None means full history). Symbols sharing a fetch_from are fetched
+        together. Returns per-symbol error messages for symbols upstream returned nothing for.
+        """
+        groups: Dict[Optional[date], List[str]] = {}
+        for symbol in symbols:
+            needs_fetch, fetch_from = self.plan_sync(symbol, start)
+            if needs_fetch:
+                groups.setdefault(fetch_from, []).append(symbol)
+
+        errors: Dict[str, str] = {}
+        rebase: Dict[Optional[date], List[str]] = {}
+        for fetch_from, group in groups.items():
+            fetched = fetch_many(group, fetch_from)
+            for symbol in group:
+                rows = fetched.get(symbol)
+                if rows is None or len(rows) == 0:
+                    if self.read(symbol) is None:
+                        errors[symbol] = f"No historical data found for {symbol}."
+                    else:
+                        self.touch(symbol)
+                    continue
+                if not self.merge(symbol, rows, fetch_from):
+                    meta = self.meta(symbol) or {}
+                    covered_from = date.fromisoformat(meta["covered_from"]) if meta.get("covered_from") else None
+                    if start is not None and (covered_from is None or start < covered_from):
+                        covered_from = start
+                    rebase.setdefault(covered_from, []).append(symbol)
+
+        for fetch_from, group in rebase.items():
+            print(f"---OHLCV STORE: Upstream re-adjusted history for {group}, re-fetching from {fetch_from or 'inception'}")
+            fetched = fetch_many(group, fetch_from)
+            for symbol in group:
+                rows = fetched.get(symbol)
+                if rows is not None and len(rows):
+                    self.replace(symbol, rows, fetch_from)
+        return errors
@@ -0,0 +1,182 @@
+import asyncio
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import nullcontext
+from typing import Any, Dict, Optional
+
+import httpx
+
+from config.settings import settings
+from utils.agent_client import LoopBoundClient
+from utils.rate_limiter import AsyncTokenBucket
+from utils.tracing import span
+
+# Besides 429/503, EDGAR answers 403 with this text once a client exceeds the fair-access rate
+_RATE_LIMITED_TEXT = "Request Rate Threshold Exceeded"
+
+
+class _CachedResponse:
+    def __init__(self, text: str, etag: Optional[str], last_modified: Optional[str], ttl_seconds: float):
+        self.text = text
+        self.etag = etag
+        self.last_modified = last_modified
+        self.ttl_seconds = ttl_seconds
+        self.fetched_at = time.monotonic()
+
+    @property
+    def is_fresh(self) -> bool:
+        return time.monotonic() - self.fetched_at < self.ttl_seconds
+
+
+class EdgarClient:
+    """Async HTTP client for SEC EDGAR that stays within SEC's fair-access policy.
+
+    Every request in the process takes a token from one shared bucket (SEC_MAX_REQUESTS_PER_SECOND)
+    and at most SEC_MAX_CONCURRENCY are in flight, so fetches for many tickers overlap without
+    tripping EDGAR's rate block. Pages fetched with a TTL are cached in memory: within the TTL they
+    are served without a request, afterwards they are revalidated with If-None-Match /
+    If-Modified-Since and a 304 reuses the cached body.
+    """
+
+    def __init__(
+        self,
+        user_agent: str = settings.SEC_USER_AGENT,
+        requests_per_second: float = settings.SEC_MAX_REQUESTS_PER_SECOND,
+        concurrency: int = settings.SEC_MAX_CONCURRENCY,
+        max_cache_entries: int = settings.SEC_RESPONSE_CACHE_MAX_ENTRIES,
+        max_retries: int = settings.SEC_MAX_RETRIES,
+    ):
+        self.user_agent = user_agent
+        # No burst allowance: requests are paced evenly so no one-second window exceeds the limit
+        self.rate_limiter = AsyncTokenBucket(requests_per_second, burst=1, name="sec_edgar")
+        self.concurrency = max(1, concurrency)
+        self.max_cache_entries = max_cache_entries
+        self.max_retries = max_retries
+        self._responses: "OrderedDict[str, _CachedResponse]" = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self._counters = {"requests": 0, "cache_hits": 0, "not_modified": 0, "retries": 0}
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._client = LoopBoundClient(
+            lambda: httpx.AsyncClient(
+                headers={"User-Agent": self.user_agent, "Accept-Encoding": "gzip, deflate"},
+                timeout=httpx.Timeout(settings.SEC_TIMEOUT_SECONDS, connect=10.0),
+                follow_redirects=True,
+            ),
+            on_new_loop=self._reset_loop_state,
+        )
+
+    def _reset_loop_state(self):
+        # The semaphore belongs to the event loop that created it
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+
+    def _http(self):
+        return self._client.get(), self._semaphore
+
+    # --- Response cache ---
+
+    def _cached(self, key: str) -> Optional[_CachedResponse]:
+        with self._cache_lock:
+            entry = self._responses.get(key)
+            if entry is not None:
+                self._responses.move_to_end(key)
+            return entry
+
+    def _store(self, key: str, entry: _CachedResponse):
+        with self._cache_lock:
+            self._responses[key] = entry
+            self._responses.move_to_end(key)
+            while len(self._responses) > self.max_cache_entries:
+                self._responses.popitem(last=False)
+
+    # --- Requests ---
+
+    @staticmethod
+    def _is_rate_limited(response: httpx.Response) -> bool:
+        if response.status_code in (429, 503):
+            return True
+        return response.status_code == 403 and _RATE_LIMITED_TEXT in response.text
+
+    async def _get(self, url: str, headers: Dict[str, str], stream: bool = False, slot_held: bool = False) -> httpx.Response:
+        """slot_held: the caller already holds a concurrency slot (streamed bodies are read under it)."""
+        client, semaphore = self._http()
+        attempt = 0
+        while True:
+            await self.rate_limiter.acquire()
+            async with nullcontext() if slot_held else semaphore:
+                with span("upstream:sec"):
+                    response = await client.send(client.build_request("GET", url, headers=headers), stream=stream)
+            self._counters["requests"] += 1
+            if stream and not response.is_success:
+                await response.aread() # error bodies are small, and the rate-limit check needs the text
+            if not self._is_rate_limited(response) or attempt >= self.max_retries:
+                return response
+            await response.aclose()
+            try:
+                delay = min(float(response.headers.get("Retry-After")), 60.0)
+            except (TypeError, ValueError):
+                delay = 2.0 * (2 ** attempt)
+            print(f"SEC EDGAR rate-limited {url} ({response.status_code}); retrying in {delay:.1f}s")
+            self._counters["retries"] += 1
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    async def get_text(self, url: str, params: Optional[Dict[str, Any]] = None,
+                       ttl_seconds: Optional[float] = None) -> str:
+        """GETs a page. With ttl_seconds the body is cached and later revalidated conditionally."""
+        key = str(httpx.URL(url, params=params))
+        cached = self._cached(key) if ttl_seconds else None
+        if cached is not None and cached.is_fresh:
+            self._counters["cache_hits"] += 1
+            return cached.text
+
+        headers = {}
+        if cached is not None:
+            if cached.etag:
+                headers["If-None-Match"] = cached.etag
+            if cached.last_modified:
+                headers["If-Modified-Since"] = cached.last_modified
+        response = await self._get(key, headers)
+        if response.status_code == 304 and cached is not None:
+            self._counters["not_modified"] += 1
+            cached.fetched_at = time.monotonic()
+            return cached.text
+        response.raise_for_status()
+        if ttl_seconds:
+            self._store(key, _CachedResponse(
+                response.text, response.headers.get("ETag"), response.headers.get("Last-Modified"), ttl_seconds
+            ))
+        return response.text
+
+    async def download(self, url: str, path: str) -> int:
+        """Streams a (potentially very large) document straight to `path`. Returns the bytes written."""
+        _, semaphore = self._http()
+        # The slot is held until the body has been read, so SEC_MAX_CONCURRENCY bounds downloads too
+        async with semaphore:
+            response = await self._get(url, {}, stream=True, slot_held=True)
+            tmp_path = f"{path}.{id(response)}.tmp"
+            written = 0
+            try:
+                response.raise_for_status()
+                with open(tmp_path, "wb") as f:
+                    async for chunk in response.aiter_bytes():
+                        f.write(chunk)
+                        written += len(chunk)
+                os.replace(tmp_path, path)
+            finally:
+                await response.aclose()
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+        return written
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cache_lock:
+            cached = len(self._responses)
+        return {"cached_pages": cached, **self._counters, "rate_limiter": self.rate_limiter.stats()}
+
+    async def aclose(self):
+        await self._client.aclose()
+
+
+edgar_client = EdgarClient()
@@ -1,17 +1,32 @@
-import requests
+import asyncio
 from bs4 import BeautifulSoup
+import json
 import os
-import time
+import uuid
+from typing import Any, Dict, List, Optional, Sequence, Tuple
 from config.settings import settings
+from data_ingestion.filing_cache import FilingCache, accession_from_url
+from data_ingestion.sec_client import EdgarClient, edgar_client
 
 class SECFilingsScraper:
-    def __init__(self, cache_dir: str = settings.SEC_FILINGS_CACHE_PATH):
+    """Fetches filings from SEC EDGAR through the shared, rate-limited EdgarClient.
+
+    All methods are coroutines, so filings for many tickers are fetched concurrently; the client
+    keeps the process under SEC's request-rate limit and caches search and index pages.
+    """
+
+    def __init__(self, cache_dir: str = settings.SEC_FILINGS_CACHE_PATH, client: Optional[EdgarClient] = None,
+                 cache: Optional[FilingCache] = None):
         self.base_url = "https://www.sec.gov"
         self.search_url = "https://www.sec.gov/cgi-bin/browse-edgar"
+        self.tickers_url = "https://www.sec.gov/files/company_tickers.json"
+        self.submissions_url = "https://data.sec.gov/submissions/CIK{cik:010d}.json"
         self.cache_dir = cache_dir
+        self.client = client or edgar_client
         os.makedirs(self.cache_dir, exist_ok=True)
+        self.cache = cache or FilingCache(cache_dir)
 
-    def search_filings(self, ticker: str, doc_type: str = "10-K", count: int = 1) -> list:
+    async def search_filings(self, ticker: str, doc_type: str = "10-K", count: int = 1) -> list:
         """Searches for recent filings of a given type for a ticker."""
         params = {
             "action": "getcompany",
@@ -19,20 +34,53 @@ class SECFilingsScraper:
             "type": doc_type,
             "count": count
         }
-        response = requests.get(self.search_url, params=params)
-        response.raise_for_status()
-        soup = BeautifulSoup(response.text, 'html.parser')
+        html = await self.client.get_text(self.search_url, params=params, ttl_seconds=settings.SEC_SEARCH_CACHE_TTL_SECONDS)
+        soup = BeautifulSoup(html, 'html.parser')
         filing_links = []
         for a_tag in soup.find_all('a', id='documentsbutton'):
             link = self.base_url + a_tag['href']
             filing_links.append(link)
         return filing_links
 
-    def get_filing_document_link(self, filing_page_url: str) -> str | None:
+    async def get_cik(self, ticker: str) -> int | None:
+        """SEC Central Index Key for a ticker, from EDGAR's ticker map (cached for a day)."""
+        mapping = json.loads(await self.client.get_text(self.tickers_url, ttl_seconds=settings.SEC_INDEX_CACHE_TTL_SECONDS))
+        ticker = ticker.upper().replace(".", "-")
+        return next((int(row["cik_str"]) for row in mapping.values() if row["ticker"] == ticker), None)
+
+    async def list_filings(self, ticker: str, forms: Sequence[str] = ("10-K", "10-Q")) -> List[Dict[str, Any]]:
+        """Recent filings of the given forms, newest first, identified by accession number.
+
+        Each item has accession, form, filing_date, report_date (the period covered) and the URL of
+        the primary document.
+        """
+        cik = await self.get_cik(ticker)
+        if cik is None:
+            return []
+        submissions = json.loads(await self.client.get_text(
+            self.submissions_url.format(cik=cik), ttl_seconds=settings.SEC_SEARCH_CACHE_TTL_SECONDS
+        ))
+        recent = submissions.get("filings", {}).get("recent", {})
+        filings = []
+        for accession, form, filing_date, report_date, document in zip(
+            recent.get("accessionNumber", []), recent.get("form", []), recent.get("filingDate", []),
+            recent.get("reportDate", []), recent.get("primaryDocument", []),
+        ):
+            if form in forms and document:
+                filings.append({
+                    "accession": accession,
+                    "form": form,
+                    "filing_date": filing_date,
+                    "report_date": report_date or None,
+                    "url": f"{self.base_url}/Archives/edgar/data/{cik}/{accession.replace('-', '')}/{document}",
+                })
+        return filings
+
+    async def get_filing_document_link(self, filing_page_url: str) -> str | None:
         """From a filing summary page, find the link to the actual HTML document."""
-        response = requests.get(filing_page_url)
-        response.raise_for_status()
-        soup = BeautifulSoup(response.text, 'html.parser')
+        # A filing's index page never changes once posted
+        html = await self.client.get_text(filing_page_url, ttl_seconds=settings.SEC_INDEX_CACHE_TTL_SECONDS)
+        soup = BeautifulSoup(html, 'html.parser')
         # Look for the link to the HTML document, typically ending with .htm or .html
         for a_tag in soup.find_all('a', href=True):
             href = a_tag['href']
@@ -40,42 +88,75 @@ class SECFilingsScraper:
                 return self.base_url + href
         return None
 
-    def download_and_extract_text(self, url: str, ticker: str, doc_type: str) -> str:
+    def _legacy_path(self, url: str, ticker: str, doc_type: str) -> str:
+        # Where filings were stored before the content-addressed cache
+        return os.path.join(self.cache_dir, f"{ticker}_{doc_type}_{os.path.basename(url)}.html")
+
+    async def _cached_filing(self, url: str, ticker: str, doc_type: str) -> str:
+        """Blob path of the filing document, downloading it into the cache on a miss."""
+        accession = accession_from_url(url)
+        blob_path = await asyncio.to_thread(self.cache.lookup, ticker, accession, doc_type)
+        if blob_path is None:
+            blob_path = await asyncio.to_thread(self.cache.import_legacy, self._legacy_path(url, ticker, doc_type), ticker, accession, doc_type)
+        if blob_path is None:
+            # Pacing is handled by the client's rate limiter rather than a fixed sleep
+            download_path = os.path.join(self.cache_dir, f".download-{uuid.uuid4().hex}.html")
+            await self.client.download(url, download_path)
+            blob_path = await asyncio.to_thread(self.cache.put_file, ticker, accession, doc_type, download_path, url)
+        return blob_path
+
+    async def download_and_extract(self, url: str, ticker: str, doc_type: str) -> Tuple[str, List[Dict[str, Any]]]:
+        """Downloads an HTML filing once and returns its text and Item sections (MD&A, risk factors, ...).
+
+        The HTML is streamed to disk, stored compressed in the filing cache and parsed incrementally
+        without building a DOM; the extracted text and section offsets are cached next to the blob,
+        so repeat calls only read two small files.
+        """
+        try:
+            return await asyncio.to_thread(self.cache.extract, await self._cached_filing(url, ticker, doc_type))
+        except FileNotFoundError:
+            # Evicted by another process between lookup and read; fetch it again
+            return await asyncio.to_thread(self.cache.extract, await self._cached_filing(url, ticker, doc_type))
+
+    async def download_and_extract_text(self, url: str, ticker: str, doc_type: str) -> str:
         """Downloads an HTML filing and extracts its text content."""
-        filename = os.path.join(self.cache_dir, f"{ticker}_{doc_type}_{os.path.basename(url)}.html")
-        if os.path.exists(filename):
-            with open(filename, 'r', encoding='utf-8') as f:
-                html_content = f.read()
-        else:
-            response = requests.get(url)
-            response.raise_for_status()
-            html_content = response.text
-            with open(filename, 'w', encoding='utf-8') as f:
-                f.write(html_content)
-            time.sleep(1) # Be polite to SEC servers
-
-        soup = BeautifulSoup(html_content, 'html.parser')
-        # Remove script and style tags
-        for script_or_style in soup(['script', 'style']):
-            script_or_style.extract()
-        text = soup.get_text(separator=' ', strip=True)
+        text, _ = await self.download_and_extract(url, ticker, doc_type)
         return text
 
-    def get_recent_earnings_report_text(self, ticker: str) -> str | None:
-        """A higher-level function to get the text of the most recent 10-Q or 10-K."""
-        filing_page_links = self.search_filings(ticker, doc_type="10-Q", count=1)
+    async def get_recent_earnings_report(self, ticker: str) -> Tuple[str, List[Dict[str, Any]]] | None:
+        """Text and sections of the most recent 10-Q or 10-K, or None if there is none."""
+        filing_page_links = await self.search_filings(ticker, doc_type="10-Q", count=1)
         if not filing_page_links:
-            filing_page_links = self.search_filings(ticker, doc_type="10-K", count=1)
+            filing_page_links = await self.search_filings(ticker, doc_type="10-K", count=1)
 
         if filing_page_links:
             filing_page_url = filing_page_links[0]
-            doc_link = self.get_filing_document_link(filing_page_url)
+            doc_link = await self.get_filing_document_link(filing_page_url)
             if doc_link:
-                return self.download_and_extract_text(doc_link, ticker, "earnings_report")
+                return await self.download_and_extract(doc_link, ticker, "earnings_report")
         return None
 
+    async def get_recent_earnings_report_text(self, ticker: str) -> str | None:
+        """A higher-level function to get the text of the most recent 10-Q or 10-K."""
+        report = await self.get_recent_earnings_report(ticker)
+        return report[0] if report else None
+
+    async def get_recent_earnings_reports(self, tickers: Sequence[str]) -> Tuple[Dict[str, str], Dict[str, str]]:
+        """Fetches the latest report for several tickers concurrently. Returns (reports, errors) keyed by ticker."""
+        tickers = list(dict.fromkeys(tickers))
+        results = await asyncio.gather(*(self.get_recent_earnings_report_text(t) for t in tickers), return_exceptions=True)
+        reports, errors = {}, {}
+        for ticker, result in zip(tickers, results):
+            if isinstance(result, Exception):
+                errors[ticker] = str(result)
+            elif result:
+                reports[ticker] = result
+            else:
+                errors[ticker] = f"No earnings report found for {ticker}"
+        return reports, errors
+
 # Example Usage:
 if __name__ == "__main__":
     scraper = SECFilingsScraper()
     # For Apple (AAPL), try to get the most recent 10-Q or 10-K
-    # print(scraper.get_recent_earnings_report_text("AAPL")[:1000]) # Print first 1000 chars
\ No newline at end of file
+    # print(asyncio.run(scraper.get_recent_earnings_report_text("AAPL"))[:1000]) # Print first 1000 chars
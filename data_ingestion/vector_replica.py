@@ -0,0 +1,292 @@
+import asyncio
+import fcntl
+import json
+import os
+import pickle
+import threading
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple, Union
+
+import faiss
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+from config.settings import settings
+from data_ingestion.vector_store import (
+    DOCS_SUFFIX,
+    LEGACY_INDEX_NAME,
+    MANIFEST_NAME,
+    WAL_NAME,
+    DocumentTable,
+    MetadataIndex,
+    PersistentFAISSStore,
+    _prepare_index,
+    decode_vectors,
+    read_wal_tail,
+    search_index,
+    similarity_score,
+    spool_embedded,
+)
+
+WRITER_LOCK_NAME = "writer.lock"
+RETRIEVER_ROLES = ("auto", "writer", "reader")
+# Map the vector storage of the snapshot instead of copying it, so every worker shares one page-cache copy
+_MMAP_FLAGS = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP) | faiss.IO_FLAG_READ_ONLY
+# Log tails are loaded as one small segment per reload; beyond this many they are merged into one
+_MAX_DELTA_SEGMENTS = 8
+
+
+def _stamp(path: str) -> Optional[Tuple[int, int, int]]:
+    """Identity of a file version: replaced files get a new inode, appended ones a new size."""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return st.st_ino, st.st_mtime_ns, st.st_size
+
+
+class _Segment:
+    """One searchable piece of a replica: an index, a metadata index over it (or the snapshot's
+    DocumentTable), and position -> Document. Log-tail segments also keep their vectors and
+    documents so they can be merged."""
+
+    def __init__(self, index: faiss.Index, metadata: Union[MetadataIndex, DocumentTable], document: Callable[[int], Document],
+                 vectors: Optional[np.ndarray] = None, documents: Optional[List[Document]] = None):
+        self.index = index
+        self.metadata = metadata
+        self.document = document
+        self.vectors = vectors
+        self.documents = documents
+
+
+class _ReplicaView:
+    """A snapshot generation plus the log records on top of it. Immutable; reloads swap in a new one."""
+
+    def __init__(self, manifest: Dict[str, Any], manifest_stamp, wal_stamp,
+                 base: Optional[_Segment], deltas: List[_Segment], wal_seq: int, wal_offset: int):
+        self.manifest = manifest
+        self.manifest_stamp = manifest_stamp
+        self.wal_stamp = wal_stamp
+        self.base = base
+        self.deltas = deltas
+        self.wal_seq = wal_seq
+        self.wal_offset = wal_offset # bytes of the log already loaded into the deltas
+
+    @property
+    def segments(self) -> List[_Segment]:
+        return ([self.base] if self.base is not None else []) + self.deltas
+
+    def __len__(self) -> int:
+        return sum(s.index.ntotal for s in self.segments)
+
+
+class FAISSReplica:
+    """Read-only view of a PersistentFAISSStore directory for query workers.
+
+    The current snapshot generation is opened memory-mapped, so any number of worker processes
+    share a single copy of the vectors through the page cache; chunks and filter metadata are read
+    per query from the generation's SQLite document table. Log records not yet compacted are
+    held in a small in-memory delta index. A background thread watches the manifest and the log
+    and swaps in a new view when either changes, so compactions and inserts by the writer become
+    visible without a restart and in-flight searches keep the view they started with. Inserts
+    are embedded here and spooled to the writer's inbox.
+    """
+
+    role = "reader"
+
+    def __init__(self, path: str, embeddings: Embeddings,
+                 reload_interval_seconds: float = settings.VECTOR_REPLICA_RELOAD_SECONDS):
+        self.path = path
+        self.embeddings = embeddings
+        self.reload_interval_seconds = reload_interval_seconds
+        self._view: Optional[_ReplicaView] = None
+        self._reloads = 0
+        self._stopping = threading.Event()
+        self._watcher: Optional[threading.Thread] = None
+        os.makedirs(path, exist_ok=True)
+        self.refresh()
+
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    # --- Loading ---
+
+    def _read_manifest(self) -> Dict[str, Any]:
+        try:
+            with open(self._file(MANIFEST_NAME)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            legacy = LEGACY_INDEX_NAME if os.path.exists(self._file(f"{LEGACY_INDEX_NAME}.faiss")) else None
+            return {"generation": 0, "index_name": legacy, "wal_seq": 0}
+
+    def _load_base(self, manifest: Dict[str, Any]) -> Optional[_Segment]:
+        index_name = manifest["index_name"]
+        if not index_name:
+            return None
+        index = _prepare_index(faiss.read_index(self._file(f"{index_name}.faiss"), _MMAP_FLAGS))
+        if os.path.exists(self._file(index_name + DOCS_SUFFIX)):
+            table = DocumentTable(self._file(index_name + DOCS_SUFFIX))
+            return _Segment(index, table, table.document)
+        # Generations written before the document table existed (and the legacy save_local layout)
+        with open(self._file(f"{index_name}.pkl"), "rb") as f:
+            docstore, id_map = pickle.load(f)
+        metadata = MetadataIndex.from_documents(docstore.search(id_map[p]).metadata for p in range(len(id_map)))
+        return _Segment(index, metadata, lambda position: docstore.search(id_map[position]))
+
+    @staticmethod
+    def _delta_segment(vectors: np.ndarray, documents: List[Document]) -> _Segment:
+        index = faiss.IndexFlatL2(vectors.shape[1])
+        index.add(vectors)
+        metadata = MetadataIndex.from_documents(doc.metadata for doc in documents)
+        return _Segment(index, metadata, documents.__getitem__, vectors, documents)
+
+    def _extend_deltas(self, deltas: List[_Segment], records: List[Dict[str, Any]]) -> List[_Segment]:
+        """The deltas plus a segment for newly read log records; only those records are decoded."""
+        if not records:
+            return deltas
+        vectors = np.concatenate([decode_vectors(r) for r in records])
+        documents = [
+            Document(id=doc_id, page_content=text, metadata=metadata)
+            for r in records for doc_id, text, metadata in zip(r["ids"], r["texts"], r["metadatas"])
+        ]
+        deltas = deltas + [self._delta_segment(vectors, documents)]
+        if len(deltas) > _MAX_DELTA_SEGMENTS:
+            # Merging copies decoded vectors, no log parsing; compaction resets the deltas anyway
+            deltas = [self._delta_segment(np.concatenate([d.vectors for d in deltas]), [doc for d in deltas for doc in d.documents])]
+        return deltas
+
+    def refresh(self) -> bool:
+        """Loads a new generation and/or log tail if the writer published one. Returns True on a swap."""
+        manifest_path, wal_path = self._file(MANIFEST_NAME), self._file(WAL_NAME)
+        for _ in range(3):
+            view = self._view
+            manifest_stamp, wal_stamp = _stamp(manifest_path), _stamp(wal_path)
+            if view is not None and (manifest_stamp, wal_stamp) == (view.manifest_stamp, view.wal_stamp):
+                return False
+            try:
+                if view is not None and manifest_stamp == view.manifest_stamp:
+                    manifest, base = view.manifest, view.base
+                else:
+                    manifest = self._read_manifest()
+                    base = self._load_base(manifest)
+            except FileNotFoundError:
+                continue # the writer compacted and removed this generation while we were loading it
+            # Same generation and the same log file, only appended to: read just the new records.
+            # A trimmed log is a new file (new inode), so it is read from the start.
+            appended = (view is not None and base is view.base and wal_stamp is not None and view.wal_stamp is not None
+                        and wal_stamp[0] == view.wal_stamp[0] and wal_stamp[2] >= view.wal_offset)
+            if appended:
+                records, wal_offset = read_wal_tail(wal_path, view.wal_offset)
+                records = [r for r in records if r["seq"] > view.wal_seq]
+                deltas, last_seq = self._extend_deltas(view.deltas, records), view.wal_seq
+            else:
+                records, wal_offset = read_wal_tail(wal_path)
+                records = [r for r in records if r["seq"] > manifest["wal_seq"]]
+                deltas, last_seq = self._extend_deltas([], records), manifest["wal_seq"]
+            # The writer trims the log only after committing a new manifest; if the manifest moved
+            # while we read, records we need may already be gone, so start over.
+            if _stamp(manifest_path) != manifest_stamp:
+                continue
+            wal_seq = records[-1]["seq"] if records else last_seq
+            self._view = _ReplicaView(manifest, manifest_stamp, wal_stamp, base, deltas, wal_seq, wal_offset)
+            self._reloads += 1
+            return True
+        return False
+
+    def _watch_loop(self):
+        while not self._stopping.wait(self.reload_interval_seconds):
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"Vector replica reload failed: {e}")
+
+    def start_background_tasks(self):
+        if self._watcher is None or not self._watcher.is_alive():
+            self._stopping.clear()
+            self._watcher = threading.Thread(target=self._watch_loop, name="faiss-replica-reload", daemon=True)
+            self._watcher.start()
+
+    def stop_background_tasks(self):
+        self._stopping.set()
+        if self._watcher is not None:
+            self._watcher.join()
+            self._watcher = None
+
+    # --- Writes ---
+
+    async def aadd_documents(self, documents: Sequence[Document]) -> List[str]:
+        """Embeds here, then hands the batch to the writer; it becomes searchable once applied."""
+        texts = [doc.page_content for doc in documents]
+        if not texts:
+            return []
+        vectors = await self.embeddings.aembed_documents(texts)
+        return await asyncio.to_thread(spool_embedded, self.path, texts, vectors, [doc.metadata for doc in documents])
+
+    # --- Reads ---
+
+    def __len__(self) -> int:
+        return len(self._view) if self._view is not None else 0
+
+    def search_by_vectors(self, vectors: Sequence[Sequence[float]], k: int = 4,
+                          filters: Optional[Dict[str, Any]] = None) -> List[List[Tuple[Document, float]]]:
+        """Same contract as PersistentFAISSStore.search_by_vectors, merged across snapshot and log tail."""
+        view = self._view # one consistent generation for the whole batch
+        queries = np.asarray(vectors, dtype=np.float32).reshape(len(vectors), -1)
+        rows: List[List[Tuple[float, _Segment, int]]] = [[] for _ in range(len(queries))]
+        for segment in view.segments if view is not None else []:
+            distances, positions = search_index(segment.index, segment.metadata, queries, k, filters)
+            for row, row_d, row_p in zip(rows, distances, positions):
+                row.extend((float(d), segment, int(p)) for d, p in zip(row_d, row_p) if p >= 0)
+        return [
+            [(segment.document(p), similarity_score(d)) for d, segment, p in sorted(row, key=lambda hit: hit[0])[:k]]
+            for row in rows
+        ]
+
+    async def asearch(self, queries: Sequence[str], k: int = 4,
+                      filters: Optional[Dict[str, Any]] = None) -> List[List[Tuple[Document, float]]]:
+        vectors = await asyncio.gather(*(self.embeddings.aembed_query(query) for query in queries))
+        return await asyncio.to_thread(self.search_by_vectors, vectors, k, filters)
+
+    def stats(self) -> Dict[str, Any]:
+        view = self._view
+        return {
+            "role": self.role,
+            "vectors": len(self),
+            "generation": view.manifest["generation"] if view else 0,
+            "wal_seq": view.wal_seq if view else 0,
+            "wal_pending_vectors": sum(d.index.ntotal for d in view.deltas) if view else 0,
+            "delta_segments": len(view.deltas) if view else 0,
+            "reloads": self._reloads,
+        }
+
+
+def _try_writer_lock(path: str):
+    """Non-blocking exclusive lock on the store directory; the open file must stay referenced to keep it."""
+    os.makedirs(path, exist_ok=True)
+    lock_file = open(os.path.join(path, WRITER_LOCK_NAME), "a")
+    try:
+        fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        lock_file.close()
+        return None
+    return lock_file
+
+
+def open_vector_store(path: str, embeddings: Embeddings,
+                      role: str = settings.RETRIEVER_ROLE) -> Union[PersistentFAISSStore, FAISSReplica]:
+    """Opens the store as its single writer or as a read-only replica.
+
+    With role "auto" the first process to take the directory's writer lock becomes the writer and
+    every other worker a replica, so `uvicorn --workers N` needs no extra configuration.
+    """
+    if role not in RETRIEVER_ROLES:
+        raise ValueError(f"Unknown retriever role '{role}'. Use one of {', '.join(RETRIEVER_ROLES)}.")
+    if role != "reader":
+        lock_file = _try_writer_lock(path)
+        if lock_file is not None:
+            store = PersistentFAISSStore(path, embeddings)
+            store.writer_lock_file = lock_file
+            return store
+        if role == "writer":
+            raise RuntimeError(f"Another process already holds the writer lock for {path}.")
+    return FAISSReplica(path, embeddings)
@@ -0,0 +1,661 @@
+import asyncio
+import base64
+import json
+import os
+import pickle
+import sqlite3
+import threading
+import time
+import urllib.request
+import uuid
+from datetime import date
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+
+import faiss
+import numpy as np
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+from config.settings import settings
+
+MANIFEST_NAME = "manifest.json"
+WAL_NAME = "wal.jsonl"
+INBOX_NAME = "inbox" # embedded batches handed from read-only workers to the single writer
+LEGACY_INDEX_NAME = "index" # what FAISS.save_local() wrote before the WAL existed
+DOCS_SUFFIX = ".docs.sqlite" # per-generation chunk table that replicas read lazily instead of the pickle
+
+INDEX_TYPES = ("flat", "ivf", "hnsw")
+# Chunk metadata keys that searches can pre-filter on; filing_date is an ISO date (YYYY-MM-DD)
+FILTER_FIELDS = {"tickers": "ticker", "filing_types": "filing_type"}
+DATE_FIELD = "filing_date"
+
+
+def _fsync_write(path: str, data: bytes):
+    with open(path, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def _date_ordinal(value: Union[str, date, None]) -> int:
+    """Day number of an ISO date (or datetime string), -1 when missing or unparsable."""
+    if isinstance(value, date):
+        return value.toordinal()
+    try:
+        return date.fromisoformat(str(value)[:10]).toordinal()
+    except (TypeError, ValueError):
+        return -1
+
+
+def _index_kind(index: faiss.Index) -> str:
+    if faiss.try_extract_index_ivf(index) is not None:
+        return "ivf"
+    if isinstance(index, faiss.IndexHNSW):
+        return "hnsw"
+    return "flat"
+
+
+def _prepare_index(index: faiss.Index) -> faiss.Index:
+    """Applies the query-time knobs and, for IVF, the direct map that exact filtered scoring needs."""
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        ivf.nprobe = settings.VECTOR_IVF_NPROBE
+        ivf.make_direct_map()
+    elif isinstance(index, faiss.IndexHNSW):
+        index.hnsw.efSearch = settings.VECTOR_HNSW_EF_SEARCH
+    return index
+
+
+def build_index(kind: str, vectors: np.ndarray) -> faiss.Index:
+    """Builds an L2 index of the given type ("flat", "ivf" or "hnsw") holding `vectors` in order."""
+    if kind not in INDEX_TYPES:
+        raise ValueError(f"Unknown index type '{kind}'. Use one of {', '.join(INDEX_TYPES)}.")
+    n, dim = vectors.shape
+    if kind == "ivf":
+        # ~39 training points per centroid is the minimum FAISS accepts without warning
+        spec = f"IVF{max(1, min(settings.VECTOR_IVF_NLIST, n // 39))},Flat"
+    elif kind == "hnsw":
+        spec = f"HNSW{settings.VECTOR_HNSW_M},Flat"
+    else:
+        spec = "Flat"
+    index = faiss.index_factory(dim, spec)
+    if not index.is_trained:
+        index.train(vectors)
+    index.add(vectors)
+    return _prepare_index(index)
+
+
+def read_wal_tail(path: str, offset: int = 0) -> Tuple[List[Dict[str, Any]], int]:
+    """Complete records of a write-ahead log from byte `offset` on, and the offset just past the
+    last of them (where the next read resumes). A torn final append is left for a later read."""
+    if not os.path.exists(path):
+        return [], 0
+    records, valid_bytes = [], offset
+    with open(path, "rb") as f:
+        f.seek(offset)
+        for line in f:
+            try:
+                records.append(json.loads(line))
+            except json.JSONDecodeError:
+                break
+            if not line.endswith(b"\n"):
+                records.pop() # complete JSON but no newline: the append never finished
+                break
+            valid_bytes += len(line)
+    return records, valid_bytes
+
+
+def read_wal(path: str, truncate_torn_tail: bool = False) -> List[Dict[str, Any]]:
+    """Complete records of a write-ahead log; a torn final append is ignored (or cut off, for the writer)."""
+    if not os.path.exists(path):
+        return []
+    records, valid_bytes = read_wal_tail(path)
+    if truncate_torn_tail and valid_bytes < os.path.getsize(path):
+        print(f"Vector store: discarding a torn write at the end of {path}.")
+        with open(path, "r+b") as f:
+            f.truncate(valid_bytes)
+    return records
+
+
+def encode_vectors(vectors: np.ndarray) -> str:
+    return base64.b64encode(np.ascontiguousarray(vectors, dtype="<f4").tobytes()).decode("ascii")
+
+
+def decode_vectors(record: Dict[str, Any]) -> np.ndarray:
+    return np.frombuffer(base64.b64decode(record["vectors"]), dtype="<f4").reshape(len(record["ids"]), record["dim"])
+
+
+def spool_embedded(path: str, texts: Sequence[str], vectors: Sequence[Sequence[float]],
+                   metadatas: Optional[Sequence[dict]] = None) -> List[str]:
+    """Durably queues a pre-embedded batch in the store's inbox for the writer process to apply."""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    ids = [uuid.uuid4().hex for _ in texts]
+    record = {
+        "ids": ids,
+        "texts": list(texts),
+        "metadatas": [dict(m or {}) for m in metadatas] if metadatas else [{} for _ in texts],
+        "dim": int(vectors.shape[1]),
+        "vectors": encode_vectors(vectors),
+    }
+    inbox = os.path.join(path, INBOX_NAME)
+    os.makedirs(inbox, exist_ok=True)
+    name = f"{time.time_ns():020d}-{ids[0]}.json" # sorts in arrival order
+    _fsync_write(os.path.join(inbox, name + ".tmp"), json.dumps(record, separators=(",", ":")).encode("utf-8"))
+    os.replace(os.path.join(inbox, name + ".tmp"), os.path.join(inbox, name))
+    return ids
+
+
+class MetadataIndex:
+    """Inverted index from chunk metadata to index positions, used to pre-filter searches.
+
+    Tickers and filing types map to the positions carrying them; filing dates are kept as one
+    day number per position so a date range is a vectorized comparison.
+    """
+
+    def __init__(self):
+        self._postings: Dict[str, Dict[str, List[int]]] = {field: {} for field in FILTER_FIELDS.values()}
+        self._dates: List[int] = []
+        self._dates_array: Optional[np.ndarray] = None
+
+    @classmethod
+    def from_documents(cls, metadatas) -> "MetadataIndex":
+        index = cls()
+        for metadata in metadatas:
+            index.add(metadata)
+        return index
+
+    def add(self, metadata: Dict[str, Any]):
+        """Indexes the chunk at the next position."""
+        position = len(self._dates)
+        for field, postings in self._postings.items():
+            value = metadata.get(field)
+            if value:
+                postings.setdefault(str(value).upper(), []).append(position)
+        self._dates.append(_date_ordinal(metadata.get(DATE_FIELD)))
+        self._dates_array = None
+
+    def candidates(self, filters: Optional[Dict[str, Any]]) -> Optional[np.ndarray]:
+        """Positions matching every given filter, or None when nothing is filtered on."""
+        filters = filters or {}
+        selected: Optional[np.ndarray] = None
+        for key, field in FILTER_FIELDS.items():
+            values = filters.get(key)
+            if values:
+                postings = self._postings[field]
+                positions = [p for v in values for p in postings.get(str(v).upper(), [])]
+                matches = np.unique(np.asarray(positions, dtype=np.int64))
+                selected = matches if selected is None else np.intersect1d(selected, matches, assume_unique=True)
+        date_from, date_to = filters.get("date_from"), filters.get("date_to")
+        if date_from or date_to:
+            if self._dates_array is None:
+                self._dates_array = np.asarray(self._dates, dtype=np.int64)
+            dates = self._dates_array
+            mask = dates >= 0
+            if date_from:
+                mask &= dates >= _date_ordinal(date_from)
+            if date_to:
+                mask &= dates <= _date_ordinal(date_to)
+            matches = np.flatnonzero(mask).astype(np.int64)
+            selected = matches if selected is None else np.intersect1d(selected, matches, assume_unique=True)
+        return selected
+
+
+class DocumentTable:
+    """A snapshot generation's chunks in a position-keyed SQLite file, written once at compaction.
+
+    Replicas open it read-only and fetch documents per hit, and resolve filters with indexed
+    queries, so worker processes share the file through the page cache instead of each unpickling
+    the docstore and building a MetadataIndex. `candidates()` matches MetadataIndex's contract.
+    """
+
+    def __init__(self, path: str):
+        uri = f"file:{urllib.request.pathname2url(os.path.abspath(path))}?mode=ro&immutable=1"
+        try:
+            self._conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+            self._conn.execute("SELECT 1 FROM docs LIMIT 1")
+        except sqlite3.OperationalError as e:
+            raise FileNotFoundError(path) from e
+        self._lock = threading.Lock() # searches run on worker threads; the generation files never change
+
+    @staticmethod
+    def write(path: str, documents: Sequence[Document]):
+        """Writes `documents` (in index position order) to a new table file at `path`, atomically."""
+        tmp_path = path + ".tmp"
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        conn = sqlite3.connect(tmp_path)
+        try:
+            fields = list(FILTER_FIELDS.values())
+            conn.execute(
+                f"CREATE TABLE docs (position INTEGER PRIMARY KEY, id TEXT, page_content TEXT, metadata TEXT, "
+                f"{', '.join(f'{field} TEXT' for field in fields)}, filing_day INTEGER)"
+            )
+            conn.executemany(
+                f"INSERT INTO docs VALUES (?, ?, ?, ?, {', '.join('?' for _ in fields)}, ?)",
+                (
+                    (position, doc.id, doc.page_content, json.dumps(doc.metadata, default=str),
+                     *[str(doc.metadata[field]).upper() if doc.metadata.get(field) else None for field in fields],
+                     _date_ordinal(doc.metadata.get(DATE_FIELD)))
+                    for position, doc in enumerate(documents)
+                ),
+            )
+            for field in fields + ["filing_day"]:
+                conn.execute(f"CREATE INDEX docs_{field} ON docs ({field})")
+            conn.commit()
+        finally:
+            conn.close()
+        os.replace(tmp_path, path)
+
+    def document(self, position: int) -> Document:
+        with self._lock:
+            doc_id, text, metadata = self._conn.execute(
+                "SELECT id, page_content, metadata FROM docs WHERE position = ?", (int(position),)
+            ).fetchone()
+        return Document(id=doc_id, page_content=text, metadata=json.loads(metadata))
+
+    def candidates(self, filters: Optional[Dict[str, Any]]) -> Optional[np.ndarray]:
+        """Positions matching every given filter, or None when nothing is filtered on."""
+        filters = filters or {}
+        clauses, params = [], []
+        for key, field in FILTER_FIELDS.items():
+            values = filters.get(key)
+            if values:
+                clauses.append(f"{field} IN ({', '.join('?' for _ in values)})")
+                params.extend(str(v).upper() for v in values)
+        date_from, date_to = filters.get("date_from"), filters.get("date_to")
+        if date_from or date_to:
+            clauses.append("filing_day >= ?")
+            params.append(max(0, _date_ordinal(date_from)) if date_from else 0)
+            if date_to:
+                clauses.append("filing_day <= ?")
+                params.append(_date_ordinal(date_to))
+        if not clauses:
+            return None
+        with self._lock:
+            rows = self._conn.execute(f"SELECT position FROM docs WHERE {' AND '.join(clauses)} ORDER BY position", params)
+            return np.fromiter((row[0] for row in rows), dtype=np.int64)
+
+    def close(self):
+        self._conn.close()
+
+
+def _search_params(index: faiss.Index, selector: faiss.IDSelector) -> faiss.SearchParameters:
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        return faiss.SearchParametersIVF(sel=selector, nprobe=ivf.nprobe)
+    if isinstance(index, faiss.IndexHNSW):
+        return faiss.SearchParametersHNSW(sel=selector, efSearch=index.hnsw.efSearch)
+    return faiss.SearchParameters(sel=selector)
+
+
+def _exact_search(index: faiss.Index, queries: np.ndarray, candidates: np.ndarray, k: int):
+    """Brute-force squared L2 over a small candidate set, in the same shape as index.search()."""
+    vectors = index.reconstruct_batch(candidates)
+    distances = (queries ** 2).sum(1)[:, None] + (vectors ** 2).sum(1)[None, :] - 2 * queries @ vectors.T
+    k = min(k, len(candidates))
+    top = np.argpartition(distances, k - 1, axis=1)[:, :k]
+    top_distances = np.take_along_axis(distances, top, axis=1)
+    order = np.argsort(top_distances, axis=1)
+    return np.take_along_axis(top_distances, order, axis=1), candidates[np.take_along_axis(top, order, axis=1)]
+
+
+def search_index(index: faiss.Index, metadata: MetadataIndex, queries: np.ndarray, k: int,
+                 filters: Optional[Dict[str, Any]] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """Filtered top-k search returning (squared L2 distances, positions); position -1 pads short rows."""
+    candidates = metadata.candidates(filters)
+    if candidates is None:
+        return index.search(queries, k)
+    if not len(candidates):
+        return np.empty((len(queries), 0), dtype=np.float32), np.empty((len(queries), 0), dtype=np.int64)
+    if len(candidates) <= settings.VECTOR_EXACT_FILTER_MAX:
+        return _exact_search(index, queries, candidates, k)
+    selector = faiss.IDSelectorBatch(candidates)
+    return index.search(queries, k, params=_search_params(index, selector))
+
+
+def similarity_score(distance: float) -> float:
+    """1 - d/2 for squared L2 distance d: the cosine similarity of unit-normalized embeddings
+    (CachedEmbeddings normalizes the vectors of every backend)."""
+    return round(1.0 - float(distance) / 2.0, 4)
+
+
+class PersistentFAISSStore:
+    """FAISS vector store persisted as an immutable snapshot plus an append-only write-ahead log.
+
+    Each added batch (texts, metadata and their already-computed vectors) is appended to
+    `wal.jsonl` and fsynced before it becomes visible, so an insert costs one small sequential
+    write instead of rewriting the whole index. A background compaction periodically folds the
+    log into a new snapshot generation; `manifest.json` names the current generation and the last
+    log sequence it contains, and replacing it atomically is the commit point. On startup the
+    snapshot is loaded and newer log records are replayed without re-embedding. A batch torn by
+    a crash mid-append is discarded.
+
+    Searches take a batch of query vectors and optional metadata filters (tickers, filing types,
+    a filing date range). Filters are resolved to index positions through an in-memory inverted
+    index and applied inside FAISS with an ID selector, so the top-k only ever contains matching
+    chunks; small candidate sets are scored exactly. Compaction also converts the index to the
+    configured `index_type`.
+    """
+
+    role = "writer"
+
+    def __init__(
+        self,
+        path: str,
+        embeddings: Embeddings,
+        compact_min_vectors: int = settings.VECTOR_COMPACT_MIN_VECTORS,
+        compact_interval_seconds: float = settings.VECTOR_COMPACT_INTERVAL_SECONDS,
+        index_type: str = settings.VECTOR_INDEX_TYPE,
+    ):
+        if index_type not in INDEX_TYPES:
+            raise ValueError(f"Unknown index type '{index_type}'. Use one of {', '.join(INDEX_TYPES)}.")
+        self.path = path
+        self.embeddings = embeddings
+        self.compact_min_vectors = compact_min_vectors
+        self.compact_interval_seconds = compact_interval_seconds
+        self.index_type = index_type
+        self.store: Optional[FAISS] = None
+        self._lock = threading.RLock() # serializes writers; searches read the in-memory index
+        self._compact_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        self._compactor: Optional[threading.Thread] = None
+        self._manifest: Dict[str, Any] = {"generation": 0, "index_name": None, "wal_seq": 0}
+        self._seq = 0
+        self._pending_vectors = 0 # vectors in the log that are not in the snapshot yet
+        self._last_compaction: Optional[float] = None
+        self._metadata = MetadataIndex()
+        self._inbox_thread: Optional[threading.Thread] = None
+        os.makedirs(path, exist_ok=True)
+        self._load()
+
+    # --- Paths ---
+
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    @property
+    def wal_path(self) -> str:
+        return self._file(WAL_NAME)
+
+    # --- Startup ---
+
+    def _load(self):
+        manifest_path = self._file(MANIFEST_NAME)
+        if os.path.exists(manifest_path):
+            with open(manifest_path) as f:
+                self._manifest = json.load(f)
+        elif os.path.exists(self._file(f"{LEGACY_INDEX_NAME}.faiss")):
+            self._manifest["index_name"] = LEGACY_INDEX_NAME
+
+        if self._manifest["index_name"]:
+            self.store = FAISS.load_local(
+                self.path, self.embeddings, index_name=self._manifest["index_name"], allow_dangerous_deserialization=True
+            )
+            _prepare_index(self.store.index)
+            id_map = self.store.index_to_docstore_id
+            self._metadata = MetadataIndex.from_documents(
+                self.store.docstore.search(id_map[position]).metadata for position in range(len(id_map))
+            )
+        self._seq = self._manifest["wal_seq"]
+
+        replayed = 0
+        for record in read_wal(self.wal_path, truncate_torn_tail=True):
+            if record["seq"] <= self._manifest["wal_seq"]:
+                continue # already folded into the snapshot by a compaction that crashed before trimming the log
+            self._apply(record)
+            self._seq = record["seq"]
+            self._pending_vectors += len(record["ids"])
+            replayed += 1
+        if replayed:
+            print(f"Vector store: replayed {replayed} log batch(es), {self._pending_vectors} vectors, on top of generation {self._manifest['generation']}.")
+
+    # --- Writes ---
+
+    def _apply(self, record: Dict[str, Any]):
+        vectors = decode_vectors(record)
+        text_embeddings = list(zip(record["texts"], vectors.tolist()))
+        if self.store is None:
+            self.store = FAISS.from_embeddings(text_embeddings, self.embeddings, metadatas=record["metadatas"], ids=record["ids"])
+        else:
+            self.store.add_embeddings(text_embeddings, metadatas=record["metadatas"], ids=record["ids"])
+        for metadata in record["metadatas"]:
+            self._metadata.add(metadata)
+
+    def add_embedded(self, texts: Sequence[str], vectors: Sequence[Sequence[float]],
+                     metadatas: Optional[Sequence[dict]] = None, ids: Optional[Sequence[str]] = None) -> List[str]:
+        """Durably appends pre-embedded texts and makes them searchable."""
+        if not texts:
+            return []
+        vectors = np.asarray(vectors, dtype=np.float32)
+        ids = list(ids) if ids else [uuid.uuid4().hex for _ in texts]
+        metadatas = [dict(m or {}) for m in metadatas] if metadatas else [{} for _ in texts]
+        with self._lock:
+            record = {
+                "seq": self._seq + 1,
+                "ids": ids,
+                "texts": list(texts),
+                "metadatas": metadatas,
+                "dim": int(vectors.shape[1]),
+                "vectors": encode_vectors(vectors),
+            }
+            line = (json.dumps(record, separators=(",", ":")) + "\n").encode("utf-8")
+            with open(self.wal_path, "ab") as f:
+                f.write(line)
+                f.flush()
+                if settings.VECTOR_WAL_FSYNC:
+                    os.fsync(f.fileno())
+            self._apply(record)
+            self._seq = record["seq"]
+            self._pending_vectors += len(ids)
+            if self._pending_vectors >= self.compact_min_vectors:
+                self._wake.set()
+        return ids
+
+    def add_documents(self, documents: Sequence[Document]) -> List[str]:
+        texts = [doc.page_content for doc in documents]
+        vectors = self.embeddings.embed_documents(texts)
+        return self.add_embedded(texts, vectors, [doc.metadata for doc in documents])
+
+    async def aadd_documents(self, documents: Sequence[Document]) -> List[str]:
+        """Embeds without holding the writer lock, so ingestion is bound by embedding throughput."""
+        texts = [doc.page_content for doc in documents]
+        vectors = await self.embeddings.aembed_documents(texts)
+        return await asyncio.to_thread(self.add_embedded, texts, vectors, [doc.metadata for doc in documents])
+
+    def drain_inbox(self) -> int:
+        """Applies batches spooled by read-only workers, oldest first. Returns the number of vectors added."""
+        inbox = self._file(INBOX_NAME)
+        if not os.path.isdir(inbox):
+            return 0
+        added = 0
+        for name in sorted(n for n in os.listdir(inbox) if n.endswith(".json")):
+            file_path = os.path.join(inbox, name)
+            with open(file_path) as f:
+                record = json.load(f)
+            with self._lock:
+                # A crash after logging but before the unlink leaves the batch behind; don't add it twice
+                if self.store is None or record["ids"][0] not in self.store.docstore._dict:
+                    self.add_embedded(record["texts"], decode_vectors(record), record["metadatas"], record["ids"])
+                    added += len(record["ids"])
+            os.remove(file_path)
+        return added
+
+    def _inbox_loop(self):
+        while not self._stopping.wait(settings.VECTOR_INBOX_POLL_SECONDS):
+            try:
+                self.drain_inbox()
+            except Exception as e:
+                print(f"Vector store inbox drain failed: {e}")
+
+    # --- Compaction ---
+
+    def _target_index_kind(self) -> Optional[str]:
+        """The index type the snapshot should be converted to, or None if it already fits."""
+        current = _index_kind(self.store.index)
+        if current == self.index_type:
+            return None
+        if self.index_type == "ivf" and len(self) < settings.VECTOR_IVF_MIN_VECTORS:
+            return None # too few vectors to train useful clusters; stay exact until then
+        return self.index_type
+
+    def _rebuild_index(self, kind: str):
+        """Rebuilds the index as `kind`. Training and insertion run without the writer lock;
+        vectors added meanwhile are copied over before the swap, so positions stay aligned."""
+        with self._lock:
+            copied = self.store.index.ntotal
+            vectors = self.store.index.reconstruct_n(0, copied)
+        started = time.time()
+        index = build_index(kind, vectors)
+        with self._lock:
+            current = self.store.index
+            if current.ntotal > copied:
+                index.add(current.reconstruct_n(copied, current.ntotal - copied))
+            self.store.index = index
+        print(f"Vector store: rebuilt {copied} vectors as a {kind} index in {time.time() - started:.2f}s.")
+
+    def compact(self) -> bool:
+        """Folds the log into a new snapshot generation. Returns False if there was nothing to do."""
+        with self._compact_lock:
+            rebuilt = False
+            if self.store is not None:
+                kind = self._target_index_kind()
+                if kind:
+                    self._rebuild_index(kind)
+                    rebuilt = True
+            with self._lock:
+                if self.store is None or (self._pending_vectors == 0 and not rebuilt):
+                    return False
+                # Copy the in-memory state under the lock; the slow disk writes happen without it
+                seq, pending = self._seq, self._pending_vectors
+                index_bytes = faiss.serialize_index(self.store.index)
+                docstore = InMemoryDocstore(dict(self.store.docstore._dict))
+                index_to_docstore_id = dict(self.store.index_to_docstore_id)
+            documents = [docstore.search(index_to_docstore_id[p]) for p in range(len(index_to_docstore_id))]
+
+            started = time.time()
+            generation = self._manifest["generation"] + 1
+            index_name = f"index-{generation}"
+            _fsync_write(self._file(f"{index_name}.faiss"), index_bytes.tobytes())
+            _fsync_write(self._file(f"{index_name}.pkl"), pickle.dumps((docstore, index_to_docstore_id)))
+            DocumentTable.write(self._file(index_name + DOCS_SUFFIX), documents)
+
+            previous_index = self._manifest["index_name"]
+            manifest = {"generation": generation, "index_name": index_name, "wal_seq": seq, "compacted_at": time.time()}
+            tmp_path = self._file(MANIFEST_NAME + ".tmp")
+            _fsync_write(tmp_path, json.dumps(manifest).encode("utf-8"))
+            os.replace(tmp_path, self._file(MANIFEST_NAME)) # commit point
+
+            with self._lock:
+                self._manifest = manifest
+                # Keep only batches appended while the snapshot was being written
+                remaining = [r for r in read_wal(self.wal_path) if r["seq"] > seq]
+                tmp_wal = self.wal_path + ".tmp"
+                _fsync_write(tmp_wal, b"".join((json.dumps(r, separators=(",", ":")) + "\n").encode("utf-8") for r in remaining))
+                os.replace(tmp_wal, self.wal_path)
+                self._pending_vectors -= pending
+                self._last_compaction = time.time()
+
+            if previous_index:
+                for suffix in (".faiss", ".pkl", DOCS_SUFFIX):
+                    try:
+                        os.remove(self._file(previous_index + suffix))
+                    except FileNotFoundError:
+                        pass
+            print(f"Vector store: compacted {pending} vectors into generation {generation} in {time.time() - started:.2f}s.")
+            return True
+
+    def _compaction_loop(self):
+        while not self._stopping.is_set():
+            self._wake.wait(self.compact_interval_seconds)
+            self._wake.clear()
+            try:
+                self.compact()
+            except Exception as e:
+                print(f"Vector store compaction failed: {e}")
+
+    def start_background_compaction(self):
+        if self._compactor is None or not self._compactor.is_alive():
+            self._stopping.clear()
+            self._compactor = threading.Thread(target=self._compaction_loop, name="faiss-compactor", daemon=True)
+            self._compactor.start()
+
+    def stop_background_compaction(self, final_compaction: bool = True):
+        self._stopping.set()
+        self._wake.set()
+        if self._compactor is not None:
+            self._compactor.join()
+            self._compactor = None
+        if final_compaction:
+            self.compact()
+
+    def start_background_tasks(self):
+        """Compaction plus draining of batches spooled by read-only workers."""
+        self.drain_inbox()
+        self.start_background_compaction()
+        if self._inbox_thread is None or not self._inbox_thread.is_alive():
+            self._inbox_thread = threading.Thread(target=self._inbox_loop, name="faiss-inbox", daemon=True)
+            self._inbox_thread.start()
+
+    def stop_background_tasks(self):
+        self._stopping.set()
+        if self._inbox_thread is not None:
+            self._inbox_thread.join()
+            self._inbox_thread = None
+        self.drain_inbox()
+        self.stop_background_compaction()
+
+    # --- Reads ---
+
+    def __len__(self) -> int:
+        return self.store.index.ntotal if self.store is not None else 0
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs) -> List[Document]:
+        return self.store.similarity_search(query, k=k, **kwargs) if self.store is not None else []
+
+    async def asimilarity_search(self, query: str, k: int = 4, **kwargs) -> List[Document]:
+        """Embeds the query asynchronously and runs the FAISS search off the event loop."""
+        if self.store is None:
+            return []
+        vector = await self.embeddings.aembed_query(query)
+        return await asyncio.to_thread(self.store.similarity_search_by_vector, vector, k, **kwargs)
+
+    def search_by_vectors(self, vectors: Sequence[Sequence[float]], k: int = 4,
+                          filters: Optional[Dict[str, Any]] = None) -> List[List[Tuple[Document, float]]]:
+        """Top-k chunks and similarity scores for each query vector, restricted to chunks matching `filters`.
+
+        `filters` may hold "tickers" and "filing_types" (lists, case-insensitive) and "date_from" /
+        "date_to" (inclusive ISO dates on the filing_date metadata).
+        """
+        queries = np.asarray(vectors, dtype=np.float32).reshape(len(vectors), -1)
+        if self.store is None or not len(queries):
+            return [[] for _ in range(len(queries))]
+        with self._lock:
+            distances, positions = search_index(self.store.index, self._metadata, queries, k, filters)
+            id_map = self.store.index_to_docstore_id
+            rows = [[(id_map[int(p)], d) for d, p in zip(row_d, row_p) if p >= 0]
+                    for row_d, row_p in zip(distances, positions)]
+        return [[(self.store.docstore.search(doc_id), similarity_score(d)) for doc_id, d in row] for row in rows]
+
+    async def asearch(self, queries: Sequence[str], k: int = 4,
+                      filters: Optional[Dict[str, Any]] = None) -> List[List[Tuple[Document, float]]]:
+        """Embeds a batch of queries concurrently and runs one FAISS search for all of them."""
+        if self.store is None:
+            return [[] for _ in queries]
+        vectors = await asyncio.gather(*(self.embeddings.aembed_query(query) for query in queries))
+        return await asyncio.to_thread(self.search_by_vectors, vectors, k, filters)
+
+    def stats(self) -> Dict[str, Any]:
+        wal_bytes = os.path.getsize(self.wal_path) if os.path.exists(self.wal_path) else 0
+        return {
+            "role": self.role,
+            "vectors": len(self),
+            "index_type": _index_kind(self.store.index) if self.store is not None else None,
+            "generation": self._manifest["generation"],
+            "wal_seq": self._seq,
+            "wal_pending_vectors": self._pending_vectors,
+            "wal_bytes": wal_bytes,
+            "last_compaction": self._last_compaction,
+        }
@@ -0,0 +1,228 @@
+import asyncio
+import itertools
+import math
+import time
+import uuid
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional
+
+from fastapi import HTTPException
+
+from config.settings import settings
+from utils.tracing import current_trace_id, observe, percentile, span, use_trace
+
+# Lower value runs first; interactive requests (a user waiting in the UI) jump ahead of batch ones
+JOB_PRIORITIES = {"interactive": 0, "batch": 1}
+
+# Wait/run-time samples kept for the percentile metrics
+_SAMPLE_WINDOW = 500
+
+
+class QueueFullError(Exception):
+    """Raised when the queue is at capacity; `retry_after` estimates when a slot frees up."""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"Brief queue is full; retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+class StreamSlot:
+    """A live brief stream's claim on queue capacity; release() is idempotent."""
+
+    def __init__(self, queue: "BriefJobQueue"):
+        self._queue = queue
+        self._released = False
+
+    def release(self):
+        if not self._released:
+            self._released = True
+            self._queue._streams -= 1
+
+
+class BriefJob:
+    def __init__(self, payload: Any, priority: str):
+        self.id = uuid.uuid4().hex
+        self.payload = payload
+        self.priority = priority
+        self.trace_id = current_trace_id() # the submitting request's trace; the worker runs the job under it
+        self.status = "queued"
+        self.submitted_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.result: Optional[Dict[str, Any]] = None
+        self.error: Optional[str] = None
+        self.error_status_code: Optional[int] = None
+        self.done = asyncio.Event()
+        self._changed = asyncio.Condition()
+
+    async def _set_status(self, status: str):
+        async with self._changed:
+            self.status = status
+            self._changed.notify_all()
+
+    async def wait_for_change(self, last_status: str, timeout: float) -> str:
+        """Blocks until the status differs from last_status (or timeout) and returns the current status."""
+        async with self._changed:
+            try:
+                await asyncio.wait_for(self._changed.wait_for(lambda: self.status != last_status), timeout)
+            except asyncio.TimeoutError:
+                pass
+            return self.status
+
+    def to_dict(self) -> Dict[str, Any]:
+        now = time.time()
+        started = self.started_at or now
+        data = {
+            "job_id": self.id,
+            "status": self.status,
+            "priority": self.priority,
+            "trace_id": self.trace_id,
+            "submitted_at": self.submitted_at,
+            "wait_seconds": round(started - self.submitted_at, 3),
+        }
+        if self.started_at:
+            data["run_seconds"] = round((self.finished_at or now) - self.started_at, 3)
+        if self.result is not None:
+            data["result"] = self.result
+        if self.error is not None:
+            data["error"] = self.error
+        return data
+
+
+class BriefJobQueue:
+    """Bounded priority queue of brief jobs drained by a fixed pool of asyncio workers.
+
+    Submissions beyond `max_size` queued jobs are rejected immediately with a retry-after estimate
+    instead of piling up. Streamed briefs run outside the workers but hold a stream slot for their
+    whole duration, and queued, running and streamed briefs together are capped at
+    `workers + max_size`. Finished jobs are kept for `result_ttl_seconds` so clients can poll
+    for the result.
+    """
+
+    def __init__(
+        self,
+        runner: Callable[[Any], Awaitable[Dict[str, Any]]],
+        workers: int = settings.JOB_WORKERS,
+        max_size: int = settings.JOB_QUEUE_MAX_SIZE,
+        result_ttl_seconds: float = settings.JOB_RESULT_TTL_SECONDS,
+    ):
+        self.runner = runner
+        self.worker_count = max(1, workers)
+        self.max_size = max_size
+        self.result_ttl_seconds = result_ttl_seconds
+        self.jobs: Dict[str, BriefJob] = {}
+        self._queue: Optional[asyncio.PriorityQueue] = None
+        self._workers: List[asyncio.Task] = []
+        self._sequence = itertools.count() # FIFO order within a priority
+        self._running = 0
+        self._streams = 0
+        self._counters = {"submitted": 0, "rejected": 0, "succeeded": 0, "failed": 0, "streams_started": 0}
+        self._wait_samples: Deque[float] = deque(maxlen=_SAMPLE_WINDOW)
+        self._run_samples: Deque[float] = deque(maxlen=_SAMPLE_WINDOW)
+
+    def start(self):
+        if self._workers:
+            return
+        self._queue = asyncio.PriorityQueue(maxsize=self.max_size)
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.worker_count)]
+
+    async def stop(self):
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    def retry_after_seconds(self) -> int:
+        """Roughly how long until the backlog ahead of a new job has been worked off."""
+        typical_run = (sum(self._run_samples) / len(self._run_samples)) if self._run_samples else 10.0
+        return max(1, min(120, math.ceil(self._load() * typical_run / self.worker_count)))
+
+    def _load(self) -> int:
+        return (self._queue.qsize() if self._queue else 0) + self._running + self._streams
+
+    def _at_capacity(self) -> bool:
+        return self._load() >= self.worker_count + self.max_size
+
+    def submit(self, payload: Any, priority: str = "interactive") -> BriefJob:
+        self.start()
+        self._prune()
+        if priority not in JOB_PRIORITIES:
+            raise ValueError(f"Unknown priority '{priority}'")
+        job = BriefJob(payload, priority)
+        try:
+            if self._at_capacity():
+                raise asyncio.QueueFull
+            self._queue.put_nowait((JOB_PRIORITIES[priority], next(self._sequence), job))
+        except asyncio.QueueFull:
+            self._counters["rejected"] += 1
+            raise QueueFullError(self.retry_after_seconds())
+        self.jobs[job.id] = job
+        self._counters["submitted"] += 1
+        return job
+
+    def acquire_stream_slot(self) -> StreamSlot:
+        """Admits a streamed brief against the same capacity as queued jobs; the caller must
+        release() the slot once the stream ends."""
+        if self._at_capacity():
+            self._counters["rejected"] += 1
+            raise QueueFullError(self.retry_after_seconds())
+        self._streams += 1
+        self._counters["streams_started"] += 1
+        return StreamSlot(self)
+
+    def get(self, job_id: str) -> Optional[BriefJob]:
+        return self.jobs.get(job_id)
+
+    async def _worker(self):
+        while True:
+            _, _, job = await self._queue.get()
+            self._running += 1
+            job.started_at = time.time()
+            self._wait_samples.append(job.started_at - job.submitted_at)
+            await job._set_status("running")
+            try:
+                with use_trace(job.trace_id):
+                    observe("stage:queue_wait", job.started_at - job.submitted_at, started_at=job.submitted_at)
+                    with span("stage:brief"):
+                        job.result = await self.runner(job.payload)
+                status = "succeeded"
+            except HTTPException as he:
+                job.error, job.error_status_code = str(he.detail), he.status_code
+                status = "failed"
+            except Exception as e:
+                job.error, job.error_status_code = f"Orchestration Error: {e}", 500
+                status = "failed"
+            finally:
+                job.finished_at = time.time()
+                self._run_samples.append(job.finished_at - job.started_at)
+                self._running -= 1
+                self._queue.task_done()
+            self._counters[status] += 1
+            await job._set_status(status)
+            job.done.set()
+
+    def _prune(self):
+        cutoff = time.time() - self.result_ttl_seconds
+        expired = [job_id for job_id, job in self.jobs.items() if job.finished_at and job.finished_at < cutoff]
+        for job_id in expired:
+            del self.jobs[job_id]
+
+    def metrics(self) -> Dict[str, Any]:
+        queued = [job for job in self.jobs.values() if job.status == "queued"]
+        now = time.time()
+        waits, runs = list(self._wait_samples), list(self._run_samples)
+        return {
+            "workers": self.worker_count,
+            "running": self._running,
+            "streams": self._streams,
+            "queue_depth": len(queued),
+            "queue_capacity": self.max_size,
+            "queue_depth_by_priority": {p: sum(1 for j in queued if j.priority == p) for p in JOB_PRIORITIES},
+            "oldest_queued_seconds": round(max((now - j.submitted_at for j in queued), default=0.0), 3),
+            **self._counters,
+            "wait_seconds": {"avg": round(sum(waits) / len(waits), 3) if waits else None,
+                             "p50": percentile(waits, 50), "p95": percentile(waits, 95)},
+            "run_seconds": {"avg": round(sum(runs) / len(runs), 3) if runs else None,
+                            "p50": percentile(runs, 50), "p95": percentile(runs, 95)},
+            "retry_after_seconds": self.retry_after_seconds(),
+        }
@@ -1,15 +1,22 @@
 # orchestrator/orchestrator.py
-from fastapi import FastAPI, HTTPException
-import requests
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+import httpx
 from pydantic import BaseModel, Field
-from typing import Optional, Dict, Any
+from typing import Literal, Optional, Dict, Any
 from config.settings import settings
 import uvicorn
 import base64
 import io
 import json # Ensure json is imported
+import asyncio
 
 from orchestrator.models import LanguageAgentRequest # This import is correct
+from utils.sse import SSE_HEADERS, SSE_MEDIA_TYPE, format_sse
+from utils.agent_client import AGENT_PORTS, agent_client
+from utils.audio import read_audio_upload
+from orchestrator.job_queue import BriefJobQueue, QueueFullError
+from utils.tracing import install_tracing, metrics
 
 app = FastAPI()
 
@@ -19,13 +26,55 @@ class UserQuery(BaseModel):
     audio_file_base64: Optional[str] = None # Base64 encoded audio for STT
     portfolio_data: Dict[str, Any] = Field({}, description="Optional portfolio allocation data from the user.")
 
-@app.post("/orchestrate/generate_brief/")
-async def orchestrate_market_brief(query: UserQuery):
+class BriefJobRequest(UserQuery):
+    priority: Literal["interactive", "batch"] = Field("interactive", description="Interactive jobs are scheduled ahead of batch jobs.")
+
+async def _transcribe_audio(audio_bytes: bytes, content_type: str = "application/octet-stream") -> str:
+    """Speech-to-text via the Voice Agent, sending the recording as a binary body."""
+    transcribed_data = (await agent_client.request(
+        "POST", "voice", "/voice/transcribe/upload", content=audio_bytes, headers={"Content-Type": content_type}
+    )).json()
+    question = transcribed_data.get("transcribed_text", "")
+    if not question:
+        raise HTTPException(status_code=400, detail="Voice input could not be transcribed to text.")
+    print(f"---ORCHESTRATOR: Transcribed text: '{question}'")
+    return question
+
+async def _question_from_query(query: UserQuery) -> str:
+    """Returns the question text, transcribing it with the Voice Agent for voice input."""
+    if query.audio_file_base64:
+        print("---ORCHESTRATOR: Processing voice input for transcription---")
+        try:
+            audio_bytes = base64.b64decode(query.audio_file_base64)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=f"Invalid base64 audio: {e}")
+        return await _transcribe_audio(audio_bytes)
+
+    if query.query_text:
+        print("---ORCHESTRATOR: Processing text input---")
+        return query.query_text
+    raise HTTPException(status_code=400, detail="Either 'query_text' or 'audio_file_base64' must be provided.")
+
+def _agent_error(e: httpx.HTTPError) -> HTTPException:
+    """Maps a failed agent call to an HTTPException, surfacing the agent's own error detail."""
+    print(f"---ORCHESTRATOR ERROR: Service unavailable or error contacting agent: {e}")
+    if not isinstance(e, httpx.HTTPStatusError):
+        return HTTPException(status_code=503, detail=f"Service unavailable or error contacting agent: {e}")
+    detail = f"Agent error ({e.response.status_code}): {e.response.text}"
+    try:
+        error_json = e.response.json()
+        if "detail" in error_json:
+            detail = f"Agent error ({e.response.status_code}): {error_json['detail']}"
+    except json.JSONDecodeError:
+        pass
+    return HTTPException(status_code=e.response.status_code, detail=detail)
+
+async def _generate_brief(query: UserQuery) -> Dict[str, Any]:
     """
     Orchestrates the entire process for generating a market brief.
     Handles both text and voice input, and returns voice output for the conclusion.
     """
-    print("---ORCHESTRATOR: Received request to generate brief---")
+    print("---ORCHESTRATOR: Generating brief---")
     
     # Initialize variables for the brief and audio output
     final_brief_text = ""
@@ -33,27 +82,7 @@ async def orchestrate_market_brief(query: UserQuery):
 
     try:
         # --- 1. Handle Input: Text or Voice Transcription ---
-        question_for_language_agent = ""
-        if query.audio_file_base64:
-            print("---ORCHESTRATOR: Processing voice input for transcription---")
-            # Call Voice Agent for Speech-to-Text
-            voice_agent_transcribe_url = f"http://localhost:{settings.VOICE_AGENT_PORT}/voice/transcribe/"
-            transcribe_payload = {"audio_file_base64": query.audio_file_base64} # Send base64 in JSON
-            
-            voice_response = requests.post(voice_agent_transcribe_url, json=transcribe_payload)
-            voice_response.raise_for_status() # Raises HTTPError for bad responses (4xx or 5xx)
-            transcribed_data = voice_response.json()
-            question_for_language_agent = transcribed_data.get("transcribed_text", "")
-            
-            if not question_for_language_agent:
-                raise HTTPException(status_code=400, detail="Voice input could not be transcribed to text.")
-            print(f"---ORCHESTRATOR: Transcribed text: '{question_for_language_agent}'")
-
-        elif query.query_text:
-            print("---ORCHESTRATOR: Processing text input---")
-            question_for_language_agent = query.query_text
-        else:
-            raise HTTPException(status_code=400, detail="Either 'query_text' or 'audio_file_base64' must be provided.")
+        question_for_language_agent = await _question_from_query(query)
 
         # --- 2. Call Language Agent for Analysis and Brief Generation ---
         print("---ORCHESTRATOR: Calling Language Agent for brief generation---")
@@ -62,12 +91,9 @@ async def orchestrate_market_brief(query: UserQuery):
             portfolio_initial_data=query.portfolio_data
         )
 
-        language_response = requests.post(
-            f"http://localhost:{settings.LANGUAGE_AGENT_PORT}/language/generate_brief/",
-            json=lang_agent_request_data.model_dump()
+        language_agent_output = await agent_client.post_json(
+            "language", "/language/generate_brief/", lang_agent_request_data.model_dump()
         )
-        language_response.raise_for_status()
-        language_agent_output = language_response.json()
         final_brief_text = language_agent_output.get("brief", "")
         # Language Agent might also return audio for conclusion directly
         conclusion_audio_base64 = language_agent_output.get("conclusion_audio_base64")
@@ -84,17 +110,8 @@ async def orchestrate_market_brief(query: UserQuery):
 
         return response_data
 
-    except requests.exceptions.RequestException as re:
-        print(f"---ORCHESTRATOR ERROR: Service unavailable or error contacting agent: {re}")
-        detail = f"Service unavailable or error contacting agent: {re}"
-        if re.response is not None:
-            try:
-                error_json = re.response.json()
-                if "detail" in error_json:
-                    detail = f"Agent error ({re.response.status_code}): {error_json['detail']}"
-            except json.JSONDecodeError:
-                detail = f"Agent error ({re.response.status_code}): {re.response.text}"
-        raise HTTPException(status_code=re.response.status_code if re.response else 503, detail=detail)
+    except httpx.HTTPError as e:
+        raise _agent_error(e)
     except HTTPException as he:
         print(f"---ORCHESTRATOR ERROR: HTTP Exception: {he.detail}")
         raise he
@@ -102,5 +119,162 @@ async def orchestrate_market_brief(query: UserQuery):
         print(f"---ORCHESTRATOR ERROR: Unhandled orchestration error: {e}")
         raise HTTPException(status_code=500, detail=f"Orchestration Error: {e}")
 
+job_queue = BriefJobQueue(_generate_brief)
+# Every request gets a trace id (the caller's X-Trace-Id or a new one) that agent_client forwards to
+# the other agents; it is echoed in the response's X-Trace-Id header.
+install_tracing(app, stats={"jobs": job_queue.metrics})
+
+def _queue_full_response(e: QueueFullError) -> JSONResponse:
+    print(f"---ORCHESTRATOR: Rejecting brief, queue full (retry after {e.retry_after}s)---")
+    return JSONResponse(status_code=429, content={"detail": str(e)}, headers={"Retry-After": str(e.retry_after)})
+
+@app.post("/orchestrate/transcribe")
+async def transcribe_voice_query(request: Request):
+    """
+    Transcribes a voice query uploaded as binary (multipart "file" field or raw audio body) and
+    returns {"transcribed_text"}; the client then requests the brief with it as query_text.
+    """
+    try:
+        audio_bytes, content_type = await read_audio_upload(request)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    try:
+        return {"transcribed_text": await _transcribe_audio(audio_bytes, content_type)}
+    except httpx.HTTPError as e:
+        raise _agent_error(e)
+
+@app.post("/orchestrate/generate_brief/")
+async def orchestrate_market_brief(query: UserQuery):
+    """
+    Generates a market brief and returns it in the response.
+    Runs as an interactive job on the brief queue, so it shares admission control with /orchestrate/jobs.
+    The X-Trace-Id response header identifies the brief's trace (see /orchestrate/traces/{trace_id}).
+    """
+    print("---ORCHESTRATOR: Received request to generate brief---")
+    try:
+        job = job_queue.submit(query, priority="interactive")
+    except QueueFullError as e:
+        return _queue_full_response(e)
+    await job.done.wait()
+    if job.error is not None:
+        raise HTTPException(status_code=job.error_status_code or 500, detail=job.error)
+    return job.result
+
+@app.post("/orchestrate/jobs", status_code=202)
+async def submit_brief_job(request: BriefJobRequest):
+    """Queues a brief and returns its job id immediately; poll or subscribe for the result."""
+    query = UserQuery(**request.model_dump(exclude={"priority"}))
+    try:
+        job = job_queue.submit(query, priority=request.priority)
+    except QueueFullError as e:
+        return _queue_full_response(e)
+    return {**job.to_dict(), "status_url": f"/orchestrate/jobs/{job.id}", "events_url": f"/orchestrate/jobs/{job.id}/events"}
+
+@app.get("/orchestrate/jobs/metrics")
+async def brief_job_metrics():
+    """Queue depth, worker utilisation, outcome counters and queue-wait/run-time percentiles."""
+    return job_queue.metrics()
+
+@app.get("/orchestrate/traces/{trace_id}")
+async def get_brief_trace(trace_id: str):
+    """All spans recorded for a trace across the agents, ordered by start time, with per-agent totals."""
+    agents = [agent for agent in AGENT_PORTS if agent != "orchestrator"]
+    replies = await asyncio.gather(*(agent_client.get_json(agent, f"/traces/{trace_id}") for agent in agents), return_exceptions=True)
+    spans = [{**span, "agent": "orchestrator"} for span in metrics.trace(trace_id)]
+    unreachable = []
+    for agent, reply in zip(agents, replies):
+        if isinstance(reply, Exception):
+            unreachable.append(agent)
+            continue
+        spans.extend({**span, "agent": agent} for span in reply.get("spans", []))
+    if not spans:
+        raise HTTPException(status_code=404, detail=f"Trace '{trace_id}' not found or expired.")
+    spans.sort(key=lambda span: span["start"])
+    by_agent: Dict[str, float] = {}
+    for span in spans:
+        if span["name"].startswith("http:"):
+            by_agent[span["agent"]] = round(by_agent.get(span["agent"], 0.0) + span["duration_seconds"], 4)
+    return {"trace_id": trace_id, "spans": spans, "http_seconds_by_agent": by_agent, "unreachable_agents": unreachable}
+
+@app.get("/orchestrate/jobs/{job_id}")
+async def get_brief_job(job_id: str):
+    job = job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job '{job_id}' not found or expired.")
+    return job.to_dict()
+
+@app.get("/orchestrate/jobs/{job_id}/events")
+async def stream_brief_job_events(job_id: str):
+    """Server-Sent Events with the job's status on every change, ending with the result or error."""
+    job = job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job '{job_id}' not found or expired.")
+
+    async def events():
+        status = None
+        while True:
+            current = job.status if status is None else await job.wait_for_change(status, timeout=15.0)
+            if current == status:
+                yield ": keep-alive\n\n" # comment line keeps idle proxies from closing the stream
+                continue
+            status = current
+            yield format_sse("status", job.to_dict())
+            if status in ("succeeded", "failed"):
+                return
+
+    return StreamingResponse(events(), media_type=SSE_MEDIA_TYPE, headers=SSE_HEADERS)
+
+@app.post("/orchestrate/generate_brief/stream")
+async def orchestrate_market_brief_stream(query: UserQuery):
+    """
+    Streaming variant of /orchestrate/generate_brief/.
+    Relays the Language Agent's Server-Sent Events (stage progress, brief tokens, then `done`
+    or `error`) to the client chunk by chunk, without buffering the brief.
+    Each live stream holds a slot on the brief queue, so streams and queued briefs share admission control.
+    """
+    print("---ORCHESTRATOR: Received request to stream brief---")
+    try:
+        slot = job_queue.acquire_stream_slot()
+    except QueueFullError as e:
+        return _queue_full_response(e)
+    try:
+        question_for_language_agent = await _question_from_query(query)
+        lang_agent_request_data = LanguageAgentRequest(
+            question=question_for_language_agent,
+            portfolio_initial_data=query.portfolio_data
+        )
+        language_response = await agent_client.open_stream(
+            "POST", "language", "/language/generate_brief/stream", json=lang_agent_request_data.model_dump()
+        )
+    except httpx.HTTPError as e:
+        slot.release()
+        raise _agent_error(e)
+    except BaseException:
+        slot.release()
+        raise
+
+    async def relay():
+        try:
+            # aiter_raw yields each chunk as soon as it arrives on the socket
+            async for chunk in language_response.aiter_raw():
+                yield chunk
+        except httpx.HTTPError as e:
+            print(f"---ORCHESTRATOR ERROR: Language Agent stream interrupted: {e}")
+            yield format_sse("error", {"detail": f"Language Agent stream interrupted: {e}"}).encode()
+        finally:
+            await language_response.aclose()
+            slot.release()
+
+    return StreamingResponse(relay(), media_type=SSE_MEDIA_TYPE, headers=SSE_HEADERS)
+
+@app.on_event("startup")
+async def start_job_queue():
+    job_queue.start()
+
+@app.on_event("shutdown")
+async def shutdown():
+    await job_queue.stop()
+    await agent_client.aclose()
+
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=settings.ORCHESTRATOR_PORT)
\ No newline at end of file
@@ -1,16 +1,28 @@
 import streamlit as st
-import requests
+import httpx
 import json
 import base64
+import sys
 from io import BytesIO
+from pathlib import Path
+
+# `streamlit run streamlit_app/app.py` only puts this folder on sys.path; add the project root
+# so the app can share the agents' HTTP client.
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from utils.agent_client import SyncAgentClient
 
 # Import mic_recorder
 from streamlit_mic_recorder import mic_recorder
 
 st.set_page_config(layout="wide")
 
-# Backend API endpoints
-ORCHESTRATOR_URL = "http://localhost:8000" # Ensure this matches your orchestrator's running port
+# Backend API client: one keep-alive connection pool reused across reruns and sessions.
+# The orchestrator's host and port come from config.settings (AGENT_HOST, ORCHESTRATOR_PORT).
+@st.cache_resource
+def get_agent_client():
+    return SyncAgentClient()
+
+agent_client = get_agent_client()
 
 st.title("📈 AI-Powered Financial Market Brief Generator")
 
@@ -27,7 +39,7 @@ input_method = st.radio(
 )
 
 user_question = ""
-audio_file_base64 = None # This will hold the base64 encoded audio if voice input is used
+audio_bytes = None # Raw recording if voice input is used; uploaded as binary, not base64
 
 if input_method == "Text Input":
     user_question = st.text_area(
@@ -48,21 +60,21 @@ else: # Voice Input selected
         audio = mic_recorder(
             start_prompt="Start recording",
             stop_prompt="Stop recording",
+            format="wav", # decodes in the Voice Agent without an ffmpeg subprocess
             key="voice_input_recorder"
         )
         if audio:
-            st.audio(audio['bytes']) # Play back recorded audio for user confirmation
-            audio_file_base64 = base64.b64encode(audio['bytes']).decode('utf-8')
+            audio_bytes = audio['bytes']
+            st.audio(audio_bytes) # Play back recorded audio for user confirmation
             st.success("Audio recorded and ready for processing!")
         else:
             st.info("No audio recorded yet.")
     else: # Upload Audio File
         st.info("Upload an audio file (WAV or MP3 recommended).")
-        uploaded_audio_file = st.file_uploader("Upload your audio file:", type=["wav", "mp3", "ogg"], key="audio_uploader")
+        uploaded_audio_file = st.file_uploader("Upload your audio file:", type=["wav", "mp3", "ogg", "flac"], key="audio_uploader")
         if uploaded_audio_file:
             audio_bytes = uploaded_audio_file.read()
             st.audio(audio_bytes) # Play back uploaded audio for user confirmation
-            audio_file_base64 = base64.b64encode(audio_bytes).decode('utf-8')
             st.success("Audio file uploaded and ready for processing!")
         else:
             st.info("Please upload an audio file.")
@@ -85,57 +97,124 @@ if portfolio_input_str:
         st.error("Invalid JSON format for portfolio data. Please enter a valid JSON object.")
         portfolio_data = None # Indicate invalid data
 
+stream_brief = st.checkbox("Stream the brief as it is written", value=True, key="stream_brief_checkbox")
+
+# Progress messages for the stage events sent by the streaming endpoint
+STAGE_MESSAGES = {
+    "tickers_extracted": lambda e: f"Identified tickers: {', '.join(e.get('tickers', [])) or 'none'}",
+    "data_fetched": lambda e: f"Fetched market data for {len(e.get('symbols', []))} ticker(s)",
+    "news_fetched": lambda e: f"Collected {e.get('articles', 0)} news article(s)",
+    "analysis_done": lambda e: "Analysis complete, writing the brief...",
+}
+
+def iter_sse_events(response):
+    """Yields (event, data) pairs from a Server-Sent Events response as they arrive."""
+    event, data_lines = "message", []
+    for line in response.iter_lines():
+        if not line:
+            if data_lines:
+                yield event, json.loads("\n".join(data_lines))
+            event, data_lines = "message", []
+        elif line.startswith("event:"):
+            event = line[len("event:"):].strip()
+        elif line.startswith("data:"):
+            data_lines.append(line[len("data:"):].strip())
+
+def stream_market_brief(payload):
+    """Renders the brief token by token from the orchestrator's streaming endpoint."""
+    status = st.empty()
+    status.info("Extracting tickers from your question...")
+    st.subheader("📊 Your Market Brief:")
+    brief_placeholder = st.empty()
+    brief_text = ""
+
+    with agent_client.stream("POST", "orchestrator", "/orchestrate/generate_brief/stream", json=payload) as response:
+        for event, data in iter_sse_events(response):
+            if event == "stage" and data.get("stage") in STAGE_MESSAGES:
+                status.info(STAGE_MESSAGES[data["stage"]](data))
+            elif event == "token":
+                brief_text += data.get("text", "")
+                brief_placeholder.markdown(brief_text + "▌")
+            elif event == "done":
+                brief_text = data.get("brief") or brief_text
+                break
+            elif event == "error":
+                status.empty()
+                st.error(f"Error from API: {data.get('detail', 'No additional detail.')}")
+                return
+
+    status.empty()
+    if brief_text:
+        brief_placeholder.markdown(brief_text)
+    else:
+        brief_placeholder.markdown("No brief could be generated at this time. Please check your inputs or try again later.")
+
 # --- Generate Brief Button ---
 if st.button("Generate Market Brief", type="primary"):
     # Input validation
     if (input_method == "Text Input" and not user_question.strip()) or \
-       (input_method == "Voice Input" and not audio_file_base64):
+       (input_method == "Voice Input" and not audio_bytes):
         st.warning("Please provide a query (text or voice) to generate a market brief.")
     elif portfolio_data is None:
         st.info("Please correct the portfolio data JSON format before generating the brief.")
     else:
-        with st.spinner("Generating your market brief... This may take a moment as AI analyzes current data and news."):
-            try:
-                # Prepare the request payload
-                payload = {
-                    "query_text": user_question if input_method == "Text Input" else None,
-                    "audio_file_base64": audio_file_base64 if input_method == "Voice Input" else None,
-                    "portfolio_data": portfolio_data
-                }
-                headers = {"Content-Type": "application/json"}
-
-                # Send request to the Orchestrator
-                response = requests.post(f"{ORCHESTRATOR_URL}/orchestrate/generate_brief/", json=payload, headers=headers)
-                response.raise_for_status() # Raise an exception for HTTP errors (4xx or 5xx)
-
-                brief_data = response.json()
-                final_brief_text = brief_data.get("brief_text")
-                conclusion_audio_base64 = brief_data.get("conclusion_audio_base64")
-
-                st.subheader("📊 Your Market Brief:")
-                if final_brief_text:
-                    st.markdown(final_brief_text)
-                else:
-                    st.markdown("No brief could be generated at this time. Please check your inputs or try again later.")
-
-                if conclusion_audio_base64:
-                    st.subheader("🔊 Listen to the Conclusion:")
-                    try:
-                        audio_bytes = base64.b64decode(conclusion_audio_base64)
-                        st.audio(BytesIO(audio_bytes), format="audio/mpeg", start_time=0)
-                    except Exception as audio_err:
-                        st.error(f"Could not play conclusion audio: {audio_err}")
-                else:
-                    st.info("No audio conclusion available for this brief.")
-
-            except requests.exceptions.ConnectionError:
-                st.error("Could not connect to the backend API. Please ensure all agents and the orchestrator are running.")
-            except requests.exceptions.HTTPError as e:
-                error_detail = e.response.json().get('detail', 'No additional detail.') if e.response else str(e)
+        try:
+            if input_method == "Voice Input":
+                with st.spinner("Transcribing your question..."):
+                    transcription = agent_client.request(
+                        "POST", "orchestrator", "/orchestrate/transcribe",
+                        files={"file": ("query.wav", audio_bytes, "application/octet-stream")}
+                    ).json()
+                user_question = transcription.get("transcribed_text", "")
+                st.caption(f"Transcribed question: {user_question}")
+
+            # Prepare the request payload
+            payload = {
+                "query_text": user_question,
+                "portfolio_data": portfolio_data
+            }
+
+            if stream_brief:
+                stream_market_brief(payload)
+            else:
+                with st.spinner("Generating your market brief... This may take a moment as AI analyzes current data and news."):
+                    # Send request to the Orchestrator (raises for 4xx/5xx once retries are exhausted)
+                    brief_data = agent_client.post_json("orchestrator", "/orchestrate/generate_brief/", payload)
+                    final_brief_text = brief_data.get("brief_text")
+                    conclusion_audio_base64 = brief_data.get("conclusion_audio_base64")
+
+                    st.subheader("📊 Your Market Brief:")
+                    if final_brief_text:
+                        st.markdown(final_brief_text)
+                    else:
+                        st.markdown("No brief could be generated at this time. Please check your inputs or try again later.")
+
+                    if conclusion_audio_base64:
+                        st.subheader("🔊 Listen to the Conclusion:")
+                        try:
+                            audio_bytes = base64.b64decode(conclusion_audio_base64)
+                            st.audio(BytesIO(audio_bytes), format="audio/mpeg", start_time=0)
+                        except Exception as audio_err:
+                            st.error(f"Could not play conclusion audio: {audio_err}")
+                    else:
+                        st.info("No audio conclusion available for this brief.")
+
+        except httpx.ConnectError:
+            st.error("Could not connect to the backend API. Please ensure all agents and the orchestrator are running.")
+        except httpx.HTTPStatusError as e:
+            if e.response.status_code == 429:
+                # The orchestrator's brief queue is full; it says when a slot should free up
+                retry_after = e.response.headers.get("Retry-After", "a few")
+                st.warning(f"The service is busy generating other briefs. Please try again in {retry_after} seconds.")
+            else:
+                try:
+                    error_detail = e.response.json().get('detail', 'No additional detail.')
+                except json.JSONDecodeError:
+                    error_detail = e.response.text
                 st.error(f"Error from API: {e}. Detail: {error_detail}")
                 st.info("Please check the console/terminal where your agents are running for more specific error messages.")
-            except Exception as e:
-                st.error(f"An unexpected error occurred: {e}")
+        except Exception as e:
+            st.error(f"An unexpected error occurred: {e}")
     # This 'else' block was previously misplaced, it should be part of the outer 'if'
     # It seems it was duplicated or incorrectly indented.
     # The portfolio_data check is handled at the start of the 'if st.button' block now.
@@ -0,0 +1,261 @@
+import asyncio
+import random
+import time
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, Callable, Dict, Optional, Set
+
+import httpx
+
+from config.settings import settings
+from utils.tracing import span, trace_headers
+
+AGENT_PORTS = {
+    "orchestrator": settings.ORCHESTRATOR_PORT,
+    "api": settings.API_AGENT_PORT,
+    "scraping": settings.SCRAPING_AGENT_PORT,
+    "retriever": settings.RETRIEVER_AGENT_PORT,
+    "analysis": settings.ANALYSIS_AGENT_PORT,
+    "language": settings.LANGUAGE_AGENT_PORT,
+    "voice": settings.VOICE_AGENT_PORT,
+}
+
+# Responses worth retrying: the agent is overloaded, restarting, or behind a failing proxy
+RETRY_STATUS_CODES = {429, 502, 503, 504}
+# Rejections issued before the agent did any work; the only responses a non-idempotent call retries
+_REJECTED_STATUS_CODES = {429, 503}
+# Failures where the request certainly never reached the agent, so even a POST is safe to resend
+_NOT_SENT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+_IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS", "PUT", "DELETE"}
+
+
+def agent_timeout(agent: str) -> httpx.Timeout:
+    """Per-agent read timeout (how long a single call may take) with a shared connect timeout."""
+    read = settings.AGENT_TIMEOUT_SECONDS.get(agent, settings.AGENT_DEFAULT_TIMEOUT_SECONDS)
+    return httpx.Timeout(read, connect=settings.AGENT_CONNECT_TIMEOUT_SECONDS)
+
+
+def agent_limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=settings.AGENT_MAX_CONNECTIONS,
+        max_keepalive_connections=settings.AGENT_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=30.0,
+    )
+
+
+async def _close_quietly(client: httpx.AsyncClient):
+    try:
+        await client.aclose()
+    except Exception as e: # e.g. its sockets belonged to an event loop that has since closed
+        print(f"Closing an abandoned HTTP client failed: {e!r}")
+
+
+class LoopBoundClient:
+    """An httpx.AsyncClient that is re-created for each event loop using it.
+
+    A connection pool (and any asyncio primitives created alongside it) belongs to the loop that
+    opened it. Uvicorn runs one loop per worker, but scripts and tests may call asyncio.run()
+    repeatedly. `on_new_loop` runs whenever a fresh client is made, so owners can rebuild
+    per-loop state such as semaphores. The client left behind by the previous loop is closed
+    rather than leaked.
+    """
+
+    def __init__(self, factory: Callable[[], httpx.AsyncClient], on_new_loop: Optional[Callable[[], None]] = None):
+        self._factory = factory
+        self._on_new_loop = on_new_loop
+        self._client: Optional[httpx.AsyncClient] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._closing: Set[asyncio.Future] = set() # strong references to pending closes
+
+    def get(self) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._loop is not loop or self._client.is_closed:
+            previous, previous_loop = self._client, self._loop
+            self._client, self._loop = self._factory(), loop
+            if self._on_new_loop is not None:
+                self._on_new_loop()
+            if previous is not None and not previous.is_closed:
+                if previous_loop is not None and previous_loop.is_running() and not previous_loop.is_closed():
+                    # Still serving another thread: close the pool on its own loop
+                    asyncio.run_coroutine_threadsafe(_close_quietly(previous), previous_loop)
+                else:
+                    task = loop.create_task(_close_quietly(previous))
+                    self._closing.add(task)
+                    task.add_done_callback(self._closing.discard)
+        return self._client
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+class _RetryPolicy:
+    """Decides whether a failed agent call is retried and how long to wait before the next attempt."""
+
+    def __init__(self, max_retries: int = settings.AGENT_MAX_RETRIES, backoff_seconds: float = settings.AGENT_RETRY_BACKOFF_SECONDS,
+                 retry_rejections: bool = True):
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        # False: a 429 (e.g. the orchestrator's full brief queue) goes straight back to the caller
+        self.retry_rejections = retry_rejections
+
+    def should_retry(self, method: str, attempt: int, error: Optional[Exception] = None,
+                     response: Optional[httpx.Response] = None) -> bool:
+        if attempt >= self.max_retries:
+            return False
+        if response is not None:
+            if response.status_code == 429 and not self.retry_rejections:
+                return False
+            if method.upper() in _IDEMPOTENT_METHODS:
+                return response.status_code in RETRY_STATUS_CODES
+            # A 502/504 may come after the agent already ran a POST; only an explicit "come back
+            # later" (429/503 with Retry-After) means it was turned away before doing any work
+            return response.status_code in _REJECTED_STATUS_CODES and "Retry-After" in response.headers
+        if isinstance(error, _NOT_SENT_ERRORS):
+            return True
+        return method.upper() in _IDEMPOTENT_METHODS and isinstance(error, httpx.TransportError)
+
+    def delay(self, attempt: int, response: Optional[httpx.Response] = None) -> float:
+        """Honors a Retry-After header, otherwise exponential backoff with jitter."""
+        if response is not None:
+            retry_after = response.headers.get("Retry-After")
+            try:
+                return min(float(retry_after), 30.0)
+            except (TypeError, ValueError):
+                pass
+        return self.backoff_seconds * (2 ** attempt) * (0.5 + random.random())
+
+
+class AgentClient:
+    """Shared async HTTP client for calls between agents.
+
+    One pooled `httpx.AsyncClient` keeps connections to every agent alive across requests, so a
+    single worker can keep many briefs in flight without blocking its event loop. Agents are
+    addressed by name ("api", "analysis", ...); each has its own timeout, and connection failures,
+    429s and 5xx gateway errors are retried with backoff (for POSTs only when the request cannot
+    have been processed: connection errors, or 429/503 with Retry-After). HTTP errors surface as
+    `httpx.HTTPStatusError` once retries are exhausted.
+    """
+
+    def __init__(self, host: str = settings.AGENT_HOST, retry: Optional[_RetryPolicy] = None):
+        self.host = host
+        self.retry = retry or _RetryPolicy()
+        self._pool = LoopBoundClient(lambda: httpx.AsyncClient(limits=agent_limits()))
+
+    def url(self, agent: str, path: str) -> str:
+        return f"http://{self.host}:{AGENT_PORTS[agent]}{path}"
+
+    def _http(self) -> httpx.AsyncClient:
+        return self._pool.get()
+
+    async def _send(self, method: str, agent: str, path: str, stream: bool = False, **kwargs) -> httpx.Response:
+        with span(f"agent:{agent}"):
+            return await self._send_with_retries(method, agent, path, stream, **kwargs)
+
+    async def _send_with_retries(self, method: str, agent: str, path: str, stream: bool, **kwargs) -> httpx.Response:
+        client = self._http()
+        kwargs["headers"] = {**trace_headers(), **(kwargs.get("headers") or {})}
+        attempt = 0
+        while True:
+            request = client.build_request(method, self.url(agent, path), timeout=agent_timeout(agent), **kwargs)
+            try:
+                response = await client.send(request, stream=stream)
+            except httpx.TransportError as e:
+                if not self.retry.should_retry(method, attempt, error=e):
+                    raise
+                print(f"Agent call {method} {agent}{path} failed ({e!r}); retrying")
+                await asyncio.sleep(self.retry.delay(attempt))
+                attempt += 1
+                continue
+
+            if response.is_success or not self.retry.should_retry(method, attempt, response=response):
+                if not response.is_success and stream:
+                    await response.aread() # so callers can read the agent's error detail
+                response.raise_for_status()
+                return response
+            print(f"Agent call {method} {agent}{path} returned {response.status_code}; retrying")
+            await response.aclose()
+            await asyncio.sleep(self.retry.delay(attempt, response))
+            attempt += 1
+
+    async def request(self, method: str, agent: str, path: str, **kwargs) -> httpx.Response:
+        return await self._send(method, agent, path, **kwargs)
+
+    async def get_json(self, agent: str, path: str, params: Optional[Dict[str, Any]] = None) -> Any:
+        return (await self._send("GET", agent, path, params=params)).json()
+
+    async def post_json(self, agent: str, path: str, json: Any = None) -> Any:
+        return (await self._send("POST", agent, path, json=json)).json()
+
+    async def open_stream(self, method: str, agent: str, path: str, **kwargs) -> httpx.Response:
+        """Sends a request and returns the response with its body unread; the caller must aclose() it."""
+        return await self._send(method, agent, path, stream=True, **kwargs)
+
+    @asynccontextmanager
+    async def stream(self, method: str, agent: str, path: str, **kwargs):
+        response = await self.open_stream(method, agent, path, **kwargs)
+        try:
+            yield response
+        finally:
+            await response.aclose()
+
+    async def aclose(self):
+        await self._pool.aclose()
+
+
+class SyncAgentClient:
+    """Blocking counterpart of AgentClient for callers without an event loop (the Streamlit app).
+
+    A user is waiting on every call, so 429 rejections are not retried by default: sleeping for
+    the Retry-After would freeze the UI where it should say the service is busy.
+    """
+
+    def __init__(self, host: str = settings.AGENT_HOST, retry: Optional[_RetryPolicy] = None):
+        self.host = host
+        self.retry = retry or _RetryPolicy(retry_rejections=False)
+        self._client = httpx.Client(limits=agent_limits())
+
+    def url(self, agent: str, path: str) -> str:
+        return f"http://{self.host}:{AGENT_PORTS[agent]}{path}"
+
+    def _send(self, method: str, agent: str, path: str, stream: bool = False, **kwargs) -> httpx.Response:
+        attempt = 0
+        while True:
+            request = self._client.build_request(method, self.url(agent, path), timeout=agent_timeout(agent), **kwargs)
+            try:
+                response = self._client.send(request, stream=stream)
+            except httpx.TransportError as e:
+                if not self.retry.should_retry(method, attempt, error=e):
+                    raise
+                time.sleep(self.retry.delay(attempt))
+                attempt += 1
+                continue
+
+            if response.is_success or not self.retry.should_retry(method, attempt, response=response):
+                if not response.is_success and stream:
+                    response.read()
+                response.raise_for_status()
+                return response
+            response.close()
+            time.sleep(self.retry.delay(attempt, response))
+            attempt += 1
+
+    def request(self, method: str, agent: str, path: str, **kwargs) -> httpx.Response:
+        return self._send(method, agent, path, **kwargs)
+
+    def post_json(self, agent: str, path: str, json: Any = None) -> Any:
+        return self._send("POST", agent, path, json=json).json()
+
+    @contextmanager
+    def stream(self, method: str, agent: str, path: str, **kwargs):
+        response = self._send(method, agent, path, stream=True, **kwargs)
+        try:
+            yield response
+        finally:
+            response.close()
+
+    def close(self):
+        self._client.close()
+
+
+agent_client = AgentClient()
@@ -0,0 +1,118 @@
+import io
+from typing import List, Tuple
+
+import numpy as np
+import soundfile as sf
+
+from config.settings import settings
+
+
+def decode_audio(data: bytes) -> Tuple[np.ndarray, int]:
+    """Decodes an audio file in memory to mono float32 samples in [-1, 1] and its sample rate.
+
+    WAV, FLAC, OGG/Opus and MP3 are decoded in-process by libsndfile; anything else (e.g. WebM or
+    M4A from browser recorders) falls back to pydub, which needs an ffmpeg subprocess.
+    """
+    try:
+        samples, rate = sf.read(io.BytesIO(data), dtype="float32", always_2d=True)
+    except (sf.LibsndfileError, RuntimeError, TypeError):
+        from pydub import AudioSegment # optional: only needed for formats libsndfile cannot read
+        segment = AudioSegment.from_file(io.BytesIO(data))
+        raw = np.array(segment.get_array_of_samples(), dtype=np.float32) / float(1 << (8 * segment.sample_width - 1))
+        samples, rate = raw.reshape(-1, segment.channels), segment.frame_rate
+    return samples.mean(axis=1), int(rate)
+
+
+def resample(samples: np.ndarray, rate: int, target_rate: int) -> np.ndarray:
+    """Resamples to target_rate. Downsampling averages each output period first, which keeps
+    aliasing out of the speech band without pulling in a DSP dependency."""
+    if rate == target_rate or not len(samples):
+        return samples
+    if rate > target_rate:
+        if rate % target_rate == 0:
+            factor = rate // target_rate
+            usable = len(samples) - len(samples) % factor
+            return samples[:usable].reshape(-1, factor).mean(axis=1)
+        width = int(np.ceil(rate / target_rate))
+        samples = np.convolve(samples, np.full(width, 1.0 / width, dtype=np.float32), mode="same")
+    duration = len(samples) / rate
+    positions = np.arange(int(duration * target_rate)) * (rate / target_rate)
+    return np.interp(positions, np.arange(len(samples)), samples).astype(np.float32)
+
+
+def to_pcm16(samples: np.ndarray) -> bytes:
+    return (np.clip(samples, -1.0, 1.0) * 32767).astype("<i2").tobytes()
+
+
+def speech_segments(
+    samples: np.ndarray,
+    rate: int,
+    frame_ms: int = settings.VOICE_VAD_FRAME_MS,
+    min_silence_ms: int = settings.VOICE_VAD_MIN_SILENCE_MS,
+    max_chunk_seconds: float = settings.VOICE_CHUNK_MAX_SECONDS,
+    padding_ms: int = 200,
+) -> List[Tuple[int, int]]:
+    """Energy-based voice activity detection. Returns (start, end) sample ranges of speech.
+
+    A frame is speech when its RMS energy clears an adaptive threshold between the recording's
+    noise floor and its loud frames. Speech separated by less than min_silence_ms stays in one
+    segment; segments longer than max_chunk_seconds are cut at their quietest frame, so every
+    chunk fits one recognizer call and words are not split mid-utterance.
+    """
+    frame = max(1, rate * frame_ms // 1000)
+    count = len(samples) // frame
+    if count == 0:
+        return [(0, len(samples))] if len(samples) else []
+    energy = np.sqrt(np.mean(samples[:count * frame].reshape(count, frame) ** 2, axis=1))
+    floor, loud = np.percentile(energy, 10), np.percentile(energy, 90)
+    if loud < 1e-3:
+        return [] # silence
+    # Without quiet frames to contrast with (short clip spoken throughout) everything is speech
+    voiced = energy > floor + 0.2 * (loud - floor) if loud > floor * 2 else np.ones(count, dtype=bool)
+
+    segments: List[List[int]] = []
+    gap_frames = max(1, min_silence_ms // frame_ms)
+    for index in np.flatnonzero(voiced):
+        if segments and index - segments[-1][1] <= gap_frames:
+            segments[-1][1] = index + 1
+        else:
+            segments.append([index, index + 1])
+
+    max_frames = max(1, int(max_chunk_seconds * 1000 // frame_ms))
+    pad = padding_ms // frame_ms
+    chunks: List[Tuple[int, int]] = []
+    for start, end in segments:
+        start, end = max(0, start - pad), min(count, end + pad)
+        while end - start > max_frames:
+            # Cut in the quietest frame of the second half of the window
+            window = energy[start + max_frames // 2:start + max_frames]
+            cut = start + max_frames // 2 + int(np.argmin(window))
+            chunks.append((start, cut))
+            start = cut
+        chunks.append((start, end))
+    return [(start * frame, min(len(samples), end * frame)) for start, end in chunks]
+
+
+async def read_audio_upload(request, max_bytes: int = settings.VOICE_MAX_UPLOAD_BYTES) -> Tuple[bytes, str]:
+    """Reads an uploaded recording from a multipart form (field "file") or a raw binary body.
+    Returns (data, content type); raises ValueError when it is missing or too large."""
+    content_type = request.headers.get("content-type", "")
+    if content_type.startswith("multipart/form-data"):
+        form = await request.form()
+        upload = form.get("file")
+        if upload is None or isinstance(upload, str):
+            raise ValueError("Multipart upload needs a 'file' field.")
+        data = await upload.read(max_bytes + 1)
+        content_type = upload.content_type or "application/octet-stream"
+    else:
+        buffer = bytearray()
+        async for chunk in request.stream():
+            buffer += chunk
+            if len(buffer) > max_bytes:
+                break
+        data = bytes(buffer)
+    if not data:
+        raise ValueError("No audio received.")
+    if len(data) > max_bytes:
+        raise ValueError(f"Audio upload exceeds {max_bytes} bytes.")
+    return data, content_type
@@ -0,0 +1,214 @@
+import json
+import math
+import re
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from utils.indicators import compute_indicators
+from utils.timeseries import to_columnar
+
+# Gemini tokenizes English prose at roughly four characters per token. Counting locally keeps the
+# builder free of network calls; pass a different `count_tokens` for an exact tokenizer.
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text: str) -> int:
+    return math.ceil(len(text) / CHARS_PER_TOKEN) if text else 0
+
+
+class ContextSection:
+    """One prompt section: ranked items, each with progressively more compact renderings."""
+
+    def __init__(self, name: str, share: float, empty_text: str = "None available."):
+        self.name = name
+        self.share = share
+        self.empty_text = empty_text
+        self.items: List[Sequence[str]] = []
+
+    def add(self, *variants: str):
+        """Adds an item (in rank order) with its renderings from most to least detailed."""
+        variants = [v for v in variants if v]
+        if variants:
+            self.items.append(variants)
+
+
+class ContextBuilder:
+    """Fits prompt sections into a total token budget.
+
+    Sections are filled in the order they were added, each up to its share of the budget plus
+    whatever earlier sections left unused. Within a section, as many top-ranked items as fit in
+    their most compact rendering are guaranteed a place; each item then gets the most detailed
+    rendering that still leaves room for those. Items that do not fit at all are dropped.
+    """
+
+    def __init__(self, token_budget: int, count_tokens: Callable[[str], int] = estimate_tokens):
+        self.token_budget = token_budget
+        self.count_tokens = count_tokens
+        self.sections: List[ContextSection] = []
+
+    def section(self, name: str, share: float, empty_text: str = "None available.") -> ContextSection:
+        section = ContextSection(name, share, empty_text)
+        self.sections.append(section)
+        return section
+
+    def build(self):
+        """Returns (texts, usage): rendered text per section and token accounting per section."""
+        total_share = sum(s.share for s in self.sections) or 1.0
+        texts: Dict[str, str] = {}
+        usage: Dict[str, Dict[str, int]] = {}
+        carry = 0
+        for section in self.sections:
+            budget = int(self.token_budget * section.share / total_share) + carry
+            # +1 per rendering for the newline separator
+            costs = [[self.count_tokens(text) + 1 for text in variants] for variants in section.items]
+
+            # Reserve room for the top-ranked items that fit in their most compact rendering
+            guaranteed, reserved = 0, 0
+            for item_costs in costs:
+                if reserved + min(item_costs) > budget:
+                    break
+                reserved += min(item_costs)
+                guaranteed += 1
+            reserve_after = [0] * (len(costs) + 1)
+            for i in range(guaranteed - 1, -1, -1):
+                reserve_after[i] = reserve_after[i + 1] + min(costs[i + 1]) if i + 1 < guaranteed else 0
+
+            used, lines, included, compacted = 0, [], 0, 0
+            for i, variants in enumerate(section.items):
+                for level, (text, cost) in enumerate(zip(variants, costs[i])):
+                    if used + cost + reserve_after[i] <= budget:
+                        lines.append(text)
+                        used += cost
+                        included += 1
+                        compacted += 1 if level else 0
+                        break
+            texts[section.name] = "\n".join(lines) if lines else section.empty_text
+            carry = max(0, budget - used)
+            usage[section.name] = {
+                "tokens": used,
+                "budget": budget,
+                "items": included,
+                "compacted": compacted,
+                "dropped": len(section.items) - included,
+            }
+        usage["total"] = {"tokens": sum(u["tokens"] for u in usage.values()), "budget": self.token_budget}
+        return texts, usage
+
+
+# --- Renderers for the market-brief sections ---
+
+def _fmt(value: Any, suffix: str = "") -> str:
+    if value is None:
+        return "n/a"
+    if isinstance(value, float):
+        return f"{value:.2f}{suffix}"
+    return f"{value}{suffix}"
+
+
+def _portfolio_weight(portfolio_data: Dict[str, Any], ticker: str) -> float:
+    try:
+        return abs(float(portfolio_data.get(ticker, 0) or 0))
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _downsample(values: List[Optional[float]], points: int) -> List[Optional[float]]:
+    """Evenly spaced samples that always include the first and last value."""
+    if len(values) <= points:
+        return values
+    step = (len(values) - 1) / (points - 1)
+    return [values[round(i * step)] for i in range(points)]
+
+
+def _relevance_terms(question: str, tickers: List[str]) -> List[str]:
+    words = {w.lower() for w in re.findall(r"[A-Za-z][A-Za-z0-9&.-]{2,}", question)}
+    return sorted(words | {t.lower() for t in tickers})
+
+
+def build_brief_context(
+    question: str,
+    portfolio_data: Dict[str, Any],
+    stock_quotes: Dict[str, Any],
+    daily_adjusted_data: Dict[str, Any],
+    earnings_surprises: List[Dict[str, Any]],
+    recent_news: List[Dict[str, Any]],
+    retrieved_context: List[str],
+    token_budget: int,
+    history_points: int = 12,
+):
+    """Ranks and compacts the synthesis inputs so the prompt stays within token_budget.
+
+    Tickers are ranked by portfolio weight, then by the size of their recent move. History is
+    summarized into indicator statistics plus a downsampled close series, and news is ranked by
+    overlap with the question and tickers, truncating descriptions when space runs out.
+    Returns (sections, usage) as produced by ContextBuilder.build().
+    """
+    portfolio_data = portfolio_data or {}
+    builder = ContextBuilder(token_budget)
+
+    # Analysis Agent output and portfolio weights carry the most signal, so they go first
+    analysis = builder.section("retrieved_context", share=0.30, empty_text="No analysis available.")
+    for line in retrieved_context:
+        analysis.add(line, line[:600] + "..." if len(line) > 600 else None)
+
+    portfolio = builder.section("portfolio_data", share=0.05, empty_text="No portfolio provided.")
+    for ticker, weight in sorted(portfolio_data.items(), key=lambda kv: -_portfolio_weight(portfolio_data, kv[0])):
+        portfolio.add(f"{ticker}: {weight}")
+
+    indicators = compute_indicators(daily_adjusted_data) if daily_adjusted_data else {}
+
+    def rank(ticker: str):
+        move = (indicators.get(ticker) or {}).get("return_1mo") or 0.0
+        return (-_portfolio_weight(portfolio_data, ticker), -abs(move))
+
+    quotes = builder.section("stock_quotes", share=0.10)
+    for ticker in sorted(stock_quotes, key=rank):
+        quote = (stock_quotes[ticker] or {}).get("Global Quote", {})
+        if not quote:
+            continue
+        quotes.add(
+            f"{ticker}: price {_fmt(quote.get('price'))}, change {_fmt(quote.get('change'))} ({quote.get('change_percent', 'n/a')}), "
+            f"open {_fmt(quote.get('open'))}, high {_fmt(quote.get('high'))}, low {_fmt(quote.get('low'))}, volume {_fmt(quote.get('volume'))}",
+            f"{ticker}: {_fmt(quote.get('price'))} ({quote.get('change_percent', 'n/a')})"
+        )
+
+    history = builder.section("daily_adjusted_data", share=0.25)
+    for ticker in sorted(indicators, key=rank):
+        stats = indicators[ticker]
+        summary = (
+            f"{ticker} ({stats['observations']} sessions to {stats['last_date']}): "
+            f"1M {_fmt(stats['return_1mo'], '%')}, 3M {_fmt(stats['return_3mo'], '%')}, 6M {_fmt(stats['return_6mo'], '%')}, "
+            f"1Y {_fmt(stats['return_1y'], '%')}, vol21 {_fmt(stats['volatility_21d'], '%')}, "
+            f"vs SMA50 {_fmt(stats['price_vs_sma_50'], '%')}, SMA20/50 {_fmt(stats['sma_signal'])}, "
+            f"max drawdown {_fmt(stats['max_drawdown'], '%')}, 52w range {_fmt(stats['low_52w'])}-{_fmt(stats['high_52w'])}"
+        )
+        columnar = to_columnar(daily_adjusted_data[ticker]) or {}
+        closes = _downsample(columnar.get("close", []), history_points)
+        dates = _downsample(columnar.get("dates", []), history_points)
+        series = ", ".join(f"{d} {_fmt(c)}" for d, c in zip(dates, closes))
+        history.add(
+            f"{summary}; closes: {series}",
+            summary,
+            f"{ticker}: 1M {_fmt(stats['return_1mo'], '%')}, 6M {_fmt(stats['return_6mo'], '%')}, vol21 {_fmt(stats['volatility_21d'], '%')}"
+        )
+
+    news = builder.section("recent_news", share=0.25)
+    terms = _relevance_terms(question, list(stock_quotes) or list(daily_adjusted_data))
+
+    def relevance(item: Dict[str, Any]) -> int:
+        text = f"{item.get('title', '')} {item.get('description', '')}".lower()
+        return sum(1 for term in terms if term in text)
+
+    for item in sorted(recent_news, key=relevance, reverse=True):
+        title, source = item.get("title", "N/A"), item.get("source", "N/A")
+        description = item.get("description") or ""
+        news.add(
+            f"[{source}] {title}: {description}",
+            f"[{source}] {title}: {description[:160]}..." if len(description) > 160 else None,
+            f"[{source}] {title}"
+        )
+
+    earnings = builder.section("earnings_surprises", share=0.05)
+    for surprise in earnings_surprises:
+        earnings.add(json.dumps(surprise, separators=(",", ":")))
+
+    return builder.build()
@@ -0,0 +1,206 @@
+import asyncio
+import hashlib
+import os
+import re
+import threading
+from typing import Dict, List, Sequence
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from config.settings import settings
+from utils.sqlite_store import ThreadLocalConnection
+from utils.tracing import span
+from utils.ttl_cache import TTLCache
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+(?:[.'&-][a-z0-9]+)*")
+
+
+class HashingEmbeddings(Embeddings):
+    """Offline embedding backend: signed feature hashing of word unigrams and bigrams.
+
+    Needs no network or model download, so the retriever can run and be benchmarked locally.
+    Similarity is lexical rather than semantic.
+    """
+
+    def __init__(self, size: int = 768):
+        self.size = size
+
+    def _embed(self, text: str) -> List[float]:
+        tokens = _TOKEN_RE.findall(text.lower())
+        features = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+        vector = np.zeros(self.size, dtype=np.float32)
+        for feature in features:
+            digest = hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest()
+            bucket = int.from_bytes(digest[:4], "little") % self.size
+            vector[bucket] += 1.0 if digest[4] & 1 else -1.0
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed(text)
+
+
+def create_embeddings(backend: str = settings.EMBEDDING_BACKEND, model: str = settings.EMBEDDING_MODEL) -> Embeddings:
+    """Builds the configured embedding backend: "google", "hashing" or "sentence-transformers"."""
+    if backend == "google":
+        from langchain_google_genai import GoogleGenerativeAIEmbeddings
+        return GoogleGenerativeAIEmbeddings(model=model, google_api_key=settings.GOOGLE_API_KEY)
+    if backend == "hashing":
+        return HashingEmbeddings()
+    if backend == "sentence-transformers":
+        try:
+            from langchain_community.embeddings import HuggingFaceEmbeddings
+        except ImportError as e:
+            raise ImportError("The sentence-transformers backend needs `pip install sentence-transformers`.") from e
+        return HuggingFaceEmbeddings(model_name=model)
+    raise ValueError(f"Unknown embedding backend '{backend}'. Use 'google', 'hashing' or 'sentence-transformers'.")
+
+
+def unit_vector(vector: Sequence[float]) -> List[float]:
+    """L2-normalizes a vector, so squared L2 distances map to cosine similarity for every backend."""
+    array = np.asarray(vector, dtype=np.float32)
+    norm = float(np.linalg.norm(array))
+    return (array / norm).tolist() if norm else array.tolist()
+
+
+def embedding_key(model: str, kind: str, text: str) -> str:
+    """Content hash of the text, scoped to the model and to document vs. query embeddings."""
+    return hashlib.sha256(f"{model}\x00{kind}\x00{text}".encode("utf-8")).hexdigest()
+
+
+class CachedEmbeddings(Embeddings):
+    """Wraps an embedding backend with a content-addressed cache on local disk.
+
+    Vectors are keyed by a hash of (model, document/query, text) and stored as float32 blobs in
+    SQLite, with an in-memory LRU in front. Only texts missing from the cache reach the backend,
+    de-duplicated and in batches of `batch_size`, so re-ingesting overlapping filings costs
+    almost no embedding calls. Vectors are returned unit-normalized whatever the backend, which
+    the vector store's similarity score (1 - d/2) relies on.
+    """
+
+    def __init__(
+        self,
+        backend: Embeddings,
+        model: str,
+        path: str = settings.EMBEDDING_CACHE_PATH,
+        batch_size: int = settings.EMBEDDING_BATCH_SIZE,
+        concurrency: int = settings.EMBEDDING_CONCURRENCY,
+        max_memory_entries: int = settings.EMBEDDING_CACHE_MAX_MEMORY_ENTRIES,
+    ):
+        self.backend = backend
+        self.model = model
+        self.path = path
+        self.batch_size = max(1, batch_size)
+        self.concurrency = max(1, concurrency)
+        # Embeddings never go stale for a given model; the memory tier is effectively a plain LRU
+        self.memory = TTLCache(30 * 24 * 3600, max_memory_entries, name="embeddings")
+        self._connection = ThreadLocalConnection(path)
+        self._stats_lock = threading.Lock()
+        self._counters = {"disk_hits": 0, "embedded": 0, "backend_calls": 0}
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self._connection() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)")
+
+    def _count(self, name: str, amount: int):
+        with self._stats_lock:
+            self._counters[name] += amount
+
+    def _lookup(self, keys: Sequence[str]) -> Dict[str, List[float]]:
+        found: Dict[str, List[float]] = {}
+        missing = []
+        for key in keys:
+            hit, vector = self.memory.get(key)
+            if hit:
+                found[key] = vector
+            else:
+                missing.append(key)
+        conn = self._connection()
+        # SQLite caps bound parameters per statement, so look up in slices
+        for i in range(0, len(missing), 500):
+            chunk = missing[i:i + 500]
+            rows = conn.execute(
+                f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(chunk))})", chunk
+            ).fetchall()
+            for key, blob in rows:
+                vector = np.frombuffer(blob, dtype="<f4").tolist()
+                found[key] = vector
+                self.memory.set(key, vector)
+            self._count("disk_hits", len(rows))
+        return found
+
+    def _store(self, items: Dict[str, List[float]]):
+        with self._connection() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)",
+                [(key, np.asarray(vector, dtype="<f4").tobytes()) for key, vector in items.items()],
+            )
+        for key, vector in items.items():
+            self.memory.set(key, vector)
+
+    def _plan(self, texts: Sequence[str], kind: str):
+        keys = [embedding_key(self.model, kind, text) for text in texts]
+        found = self._lookup(list(dict.fromkeys(keys)))
+        # De-duplicate identical uncached texts (boilerplate repeats within a filing)
+        missing = {key: text for key, text in zip(keys, texts) if key not in found}
+        return keys, found, missing
+
+    def _batches(self, missing: Dict[str, str]):
+        items = list(missing.items())
+        return [items[i:i + self.batch_size] for i in range(0, len(items), self.batch_size)]
+
+    def _finish(self, keys: List[str], found: Dict[str, List[float]], batches, results) -> List[List[float]]:
+        embedded = {}
+        for batch, vectors in zip(batches, results):
+            embedded.update({key: unit_vector(vector) for (key, _), vector in zip(batch, vectors)})
+        if embedded:
+            self._store(embedded)
+            self._count("embedded", len(embedded))
+            self._count("backend_calls", len(batches))
+        found.update(embedded)
+        # Entries cached before vectors were normalized on the way in are normalized on the way out
+        return [unit_vector(found[key]) for key in keys]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys, found, missing = self._plan(texts, "document")
+        batches = self._batches(missing)
+        with span("upstream:embeddings"):
+            results = [self.backend.embed_documents([text for _, text in batch]) for batch in batches]
+        return self._finish(keys, found, batches, results)
+
+    def embed_query(self, text: str) -> List[float]:
+        keys, found, missing = self._plan([text], "query")
+        results = []
+        if missing:
+            with span("upstream:embeddings"):
+                results = [[self.backend.embed_query(text)]]
+        return self._finish(keys, found, self._batches(missing), results)[0]
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys, found, missing = await asyncio.to_thread(self._plan, texts, "document")
+        batches = self._batches(missing)
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def embed(batch):
+            async with semaphore:
+                with span("upstream:embeddings"):
+                    return await self.backend.aembed_documents([text for _, text in batch])
+
+        results = await asyncio.gather(*(embed(batch) for batch in batches))
+        return await asyncio.to_thread(self._finish, keys, found, batches, results)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        keys, found, missing = await asyncio.to_thread(self._plan, [text], "query")
+        results = []
+        if missing:
+            with span("upstream:embeddings"):
+                results = [[await self.backend.aembed_query(text)]]
+        return (await asyncio.to_thread(self._finish, keys, found, self._batches(missing), results))[0]
+
+    def stats(self) -> Dict[str, object]:
+        with self._stats_lock:
+            counters = dict(self._counters)
+        return {"model": self.model, "memory": self.memory.stats(), **counters}
@@ -0,0 +1,153 @@
+import math
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from utils.timeseries import to_columnar
+
+TRADING_DAYS_PER_YEAR = 252
+RETURN_HORIZONS = {"1d": 1, "5d": 5, "1mo": 21, "3mo": 63, "6mo": 126, "1y": 252}
+VOLATILITY_WINDOWS = (21, 63)
+SMA_WINDOWS = (20, 50, 200)
+VOLUME_WINDOW = 20
+CROSSOVER_LOOKBACK = 5 # trading days in which a 20/50-day SMA crossover counts as recent
+
+# Columns of the compact table rendered into LLM prompts, with their display headers
+TABLE_COLUMNS = [
+    ("ticker", "Ticker"),
+    ("last_close", "Close"),
+    ("return_1d", "1D%"),
+    ("return_5d", "5D%"),
+    ("return_1mo", "1M%"),
+    ("return_3mo", "3M%"),
+    ("return_6mo", "6M%"),
+    ("volatility_21d", "Vol21%"),
+    ("price_vs_sma_50", "vsSMA50%"),
+    ("sma_signal", "SMA20/50"),
+    ("max_drawdown", "MaxDD%"),
+    ("volume_zscore", "VolZ"),
+    ("range_position_52w", "52wPos%"),
+]
+
+
+def _stack_closes_and_volumes(histories: Dict[str, Dict[str, Any]]):
+    """Right-aligns every ticker's series into (days, tickers) matrices padded with NaN on the left."""
+    tickers, closes, volumes, last_dates = [], [], [], []
+    for ticker, payload in histories.items():
+        history = to_columnar(payload)
+        if not history:
+            continue
+        tickers.append(ticker)
+        closes.append(np.asarray(history["close"], dtype=np.float64))
+        volumes.append(np.asarray(history["volume"], dtype=np.float64))
+        last_dates.append(history["dates"][-1])
+
+    length = max((len(c) for c in closes), default=0)
+    close_matrix = np.full((length, len(tickers)), np.nan)
+    volume_matrix = np.full((length, len(tickers)), np.nan)
+    for j, (c, v) in enumerate(zip(closes, volumes)):
+        close_matrix[length - len(c):, j] = c
+        volume_matrix[length - len(v):, j] = v
+    return tickers, last_dates, close_matrix, volume_matrix
+
+
+def _trailing_window(values: np.ndarray, window: int, offset: int = 0) -> Optional[np.ndarray]:
+    """The `window` rows ending `offset` rows before the last one, or None if history is too short.
+
+    NaN left-padding inside the window propagates, so tickers with too little history yield NaN.
+    """
+    end = values.shape[0] - offset
+    if end - window < 0:
+        return None
+    return values[end - window:end]
+
+
+def _trailing_mean(values: np.ndarray, window: int, offset: int = 0) -> np.ndarray:
+    rows = _trailing_window(values, window, offset)
+    return rows.mean(axis=0) if rows is not None else np.full(values.shape[1], np.nan)
+
+
+def _trailing_std(values: np.ndarray, window: int, offset: int = 0) -> np.ndarray:
+    rows = _trailing_window(values, window, offset)
+    return rows.std(axis=0, ddof=1) if rows is not None else np.full(values.shape[1], np.nan)
+
+
+def compute_indicators(histories: Dict[str, Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """Computes technical indicators for every ticker in one vectorized pass.
+
+    `histories` maps tickers to daily history payloads (columnar or legacy AlphaVantage shape).
+    Returns {ticker: {indicator: value}}; percentages are in percent and values that the
+    available history is too short for are None.
+    """
+    tickers, last_dates, close, volume = _stack_closes_and_volumes(histories)
+    if not tickers:
+        return {}
+    days = close.shape[0]
+    last = close[-1]
+    metrics: Dict[str, np.ndarray] = {"last_close": last}
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        for name, horizon in RETURN_HORIZONS.items():
+            base = close[-1 - horizon] if days > horizon else np.full(len(tickers), np.nan)
+            metrics[f"return_{name}"] = (last / base - 1.0) * 100
+
+        log_returns = np.diff(np.log(close), axis=0)
+        for window in VOLATILITY_WINDOWS:
+            metrics[f"volatility_{window}d"] = _trailing_std(log_returns, window) * math.sqrt(TRADING_DAYS_PER_YEAR) * 100
+
+        for window in SMA_WINDOWS:
+            sma = _trailing_mean(close, window)
+            metrics[f"sma_{window}"] = sma
+            metrics[f"price_vs_sma_{window}"] = (last / sma - 1.0) * 100
+
+        # SMA20/50 crossover: sign of the spread now vs. CROSSOVER_LOOKBACK days ago
+        now = np.sign(metrics["sma_20"] - metrics["sma_50"])
+        earlier = np.sign(_trailing_mean(close, 20, CROSSOVER_LOOKBACK) - _trailing_mean(close, 50, CROSSOVER_LOOKBACK))
+
+        running_peak = np.fmax.accumulate(close, axis=0)
+        metrics["max_drawdown"] = np.nanmin(np.where(np.isnan(close), np.nan, close / running_peak - 1.0), axis=0) * 100
+
+        # Latest volume against the mean/std of the preceding VOLUME_WINDOW sessions
+        prior_mean = _trailing_mean(volume, VOLUME_WINDOW, offset=1)
+        prior_std = _trailing_std(volume, VOLUME_WINDOW, offset=1)
+        metrics["volume_zscore"] = np.where(prior_std > 0, (volume[-1] - prior_mean) / prior_std, np.nan)
+
+        year = close[-TRADING_DAYS_PER_YEAR:]
+        low, high = np.nanmin(year, axis=0), np.nanmax(year, axis=0)
+        metrics["low_52w"], metrics["high_52w"] = low, high
+        metrics["range_position_52w"] = np.where(high > low, (last - low) / (high - low) * 100, np.nan)
+
+    results = {}
+    for j, ticker in enumerate(tickers):
+        row: Dict[str, Any] = {"last_date": last_dates[j], "observations": int(np.count_nonzero(~np.isnan(close[:, j])))}
+        for name, values in metrics.items():
+            value = float(values[j])
+            row[name] = None if math.isnan(value) else round(value, 4)
+        if math.isnan(now[j]) or math.isnan(earlier[j]):
+            row["sma_signal"] = None
+        elif now[j] > 0 and earlier[j] <= 0:
+            row["sma_signal"] = "bullish_cross"
+        elif now[j] < 0 and earlier[j] >= 0:
+            row["sma_signal"] = "bearish_cross"
+        else:
+            row["sma_signal"] = "above" if now[j] > 0 else "below"
+        results[ticker] = row
+    return results
+
+
+def format_indicator_table(indicators: Dict[str, Dict[str, Any]], columns: Optional[List[tuple]] = None) -> str:
+    """Renders indicators as a compact pipe-separated table for LLM prompts."""
+    columns = columns or TABLE_COLUMNS
+    lines = [" | ".join(header for _, header in columns)]
+    for ticker, row in indicators.items():
+        cells = []
+        for key, _ in columns:
+            value = ticker if key == "ticker" else row.get(key)
+            if value is None:
+                cells.append("n/a")
+            elif isinstance(value, float):
+                cells.append(f"{value:.2f}")
+            else:
+                cells.append(str(value))
+        lines.append(" | ".join(cells))
+    return "\n".join(lines)
@@ -0,0 +1,175 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Optional
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.caches import BaseCache, RETURN_VAL_TYPE
+from langchain_core.globals import set_llm_cache
+from langchain_core.load import dumps, loads
+
+from config.settings import settings
+from utils.sqlite_store import ThreadLocalConnection
+from utils.tracing import observe
+from utils.ttl_cache import TTLCache
+
+# Whitespace (including JSON-escaped newlines/tabs) is collapsed so cosmetic prompt differences
+# still hit the same entry.
+_WHITESPACE_RE = re.compile(r"(?:\\[nrt]|\s)+")
+
+_ttl_override: ContextVar[Optional[float]] = ContextVar("llm_cache_ttl_override", default=None)
+
+
+@contextmanager
+def llm_cache_ttl(seconds: float):
+    """Overrides the TTL of LLM responses cached inside the block.
+
+    Prompts that embed market data use the default TTL, which tracks how long that data stays
+    fresh; prompts that do not (e.g. ticker extraction) can safely be kept for longer.
+    """
+    token = _ttl_override.set(seconds)
+    try:
+        yield
+    finally:
+        _ttl_override.reset(token)
+
+
+def cache_key(prompt: str, llm_string: str) -> str:
+    """Hash of the normalized prompt and the model parameters (model name, temperature, tools...)."""
+    normalized = _WHITESPACE_RE.sub(" ", prompt).strip()
+    return hashlib.sha256(f"{llm_string}\x00{normalized}".encode("utf-8")).hexdigest()
+
+
+class TieredLLMCache(BaseCache):
+    """LangChain LLM cache with an in-memory LRU tier in front of a shared on-disk SQLite tier.
+
+    Installed as the global LangChain cache, it covers every chat model call in the process,
+    including structured-output calls. The SQLite file is shared by all agents on the host, so a
+    response generated by one agent process is reused by the others.
+    """
+
+    def __init__(
+        self,
+        path: str = settings.LLM_CACHE_PATH,
+        ttl_seconds: float = settings.LLM_CACHE_TTL_SECONDS,
+        max_memory_entries: int = settings.LLM_CACHE_MAX_ENTRIES,
+    ):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.memory = TTLCache(ttl_seconds, max_memory_entries, name="llm_memory")
+        # One connection per thread; WAL lets several agent processes read while one writes.
+        self._connection = ThreadLocalConnection(path)
+        self._stats_lock = threading.Lock()
+        self._disk_hits = 0
+        self._disk_misses = 0
+        self._writes = 0
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self._connection() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS llm_cache_expires ON llm_cache (expires_at)")
+
+    def lookup(self, prompt: str, llm_string: str) -> Optional[RETURN_VAL_TYPE]:
+        key = cache_key(prompt, llm_string)
+        found, value = self.memory.get(key)
+        if found:
+            return value
+
+        try:
+            row = self._connection().execute(
+                "SELECT value, expires_at FROM llm_cache WHERE key = ? AND expires_at > ?", (key, time.time())
+            ).fetchone()
+        except sqlite3.Error as e:
+            print(f"LLM cache disk lookup failed: {e}")
+            row = None
+
+        with self._stats_lock:
+            if row is None:
+                self._disk_misses += 1
+            else:
+                self._disk_hits += 1
+        if row is None:
+            return None
+        generations = [loads(item) for item in json.loads(row[0])]
+        self.memory.set(key, generations, ttl_seconds=max(0.0, row[1] - time.time()))
+        return generations
+
+    def update(self, prompt: str, llm_string: str, return_val: RETURN_VAL_TYPE) -> None:
+        key = cache_key(prompt, llm_string)
+        ttl = _ttl_override.get() or self.ttl_seconds
+        self.memory.set(key, list(return_val), ttl_seconds=ttl)
+        try:
+            with self._connection() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO llm_cache (key, value, expires_at) VALUES (?, ?, ?)",
+                    (key, json.dumps([dumps(generation) for generation in return_val]), time.time() + ttl),
+                )
+                # Opportunistically drop expired rows so the file does not grow without bound
+                if self._writes % 100 == 0:
+                    conn.execute("DELETE FROM llm_cache WHERE expires_at <= ?", (time.time(),))
+        except sqlite3.Error as e:
+            print(f"LLM cache disk write failed: {e}")
+        with self._stats_lock:
+            self._writes += 1
+
+    def clear(self, **kwargs: Any) -> None:
+        self.memory.clear()
+        with self._connection() as conn:
+            conn.execute("DELETE FROM llm_cache")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            disk = {"hits": self._disk_hits, "misses": self._disk_misses, "writes": self._writes}
+        return {"memory": self.memory.stats(), "disk": disk}
+
+
+_llm_cache: Optional[TieredLLMCache] = None
+
+
+def install_llm_cache() -> Optional[TieredLLMCache]:
+    """Installs the shared tiered cache as LangChain's global LLM cache (once per process)."""
+    global _llm_cache
+    if not settings.LLM_CACHE_ENABLED:
+        return None
+    if _llm_cache is None:
+        _llm_cache = TieredLLMCache()
+        set_llm_cache(_llm_cache)
+    return _llm_cache
+
+
+class LLMCallTimer(BaseCallbackHandler):
+    """Times chat model calls as "upstream:gemini" spans, or "cache:llm" when the response came
+    from the LLM cache (no provider output and no streamed tokens), so cache hits do not hide
+    the provider's latency."""
+
+    run_inline = True
+
+    def __init__(self, upstream: str = "gemini"):
+        self.upstream = upstream
+        self._runs: Dict[Any, list] = {} # run_id -> [wall start, perf start, streamed]
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs: Any) -> None:
+        self._runs[run_id] = [time.time(), time.perf_counter(), False]
+
+    def on_llm_new_token(self, token: str, *, run_id, **kwargs: Any) -> None:
+        if run_id in self._runs:
+            self._runs[run_id][2] = True
+
+    def on_llm_end(self, response, *, run_id, **kwargs: Any) -> None:
+        run = self._runs.pop(run_id, None)
+        if run is not None:
+            called = response.llm_output is not None or run[2]
+            observe(f"upstream:{self.upstream}" if called else "cache:llm", time.perf_counter() - run[1], started_at=run[0])
+
+    def on_llm_error(self, error: BaseException, *, run_id, **kwargs: Any) -> None:
+        run = self._runs.pop(run_id, None)
+        if run is not None:
+            observe(f"upstream:{self.upstream}", time.perf_counter() - run[1], error=True, started_at=run[0])
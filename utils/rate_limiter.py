@@ -0,0 +1,51 @@
+import asyncio
+import threading
+import time
+from typing import Any, Dict
+
+
+class AsyncTokenBucket:
+    """Token-bucket rate limiter shared by every coroutine (and thread) in the process.
+
+    Holds up to `burst` tokens refilled at `rate` per second; each request takes one. A caller that
+    finds the bucket empty reserves the next token and sleeps until it is due, so waiting callers
+    are released in arrival order at exactly the configured rate. The bookkeeping never awaits,
+    so one bucket can be used from any event loop.
+    """
+
+    def __init__(self, rate: float, burst: int = 1, name: str = "rate_limiter"):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.name = name
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+        self._acquired = 0
+        self._waited_seconds = 0.0
+
+    def _reserve(self) -> float:
+        """Takes a token, possibly one not yet refilled, and returns how long to wait for it."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            self._acquired += 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+            self._waited_seconds += wait
+            return wait
+
+    async def acquire(self):
+        wait = self._reserve()
+        if wait:
+            await asyncio.sleep(wait)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "name": self.name,
+                "rate_per_second": self.rate,
+                "burst": self.burst,
+                "acquired": self._acquired,
+                "waited_seconds": round(self._waited_seconds, 3),
+            }
@@ -0,0 +1,278 @@
+import asyncio
+import importlib
+import io
+import json
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+from config.settings import settings
+from utils.tracing import span
+
+
+class SpeechEngineError(Exception):
+    """The engine could not process the request (service unreachable, quota, model failure)."""
+
+
+class EngineBusyError(Exception):
+    """The engine's queue is full; the caller should retry later."""
+
+
+# --- Speech-to-text engines: transcribe(16-bit mono PCM, sample rate) -> text ("" if no words) ---
+
+class GoogleSTTEngine:
+    """Google Web Speech API through SpeechRecognition. Network-bound, so it runs on threads."""
+
+    cpu_bound = False
+
+    def __init__(self, language: str = "en-US"):
+        import speech_recognition as sr
+        self._sr = sr
+        self.language = language
+
+    def transcribe(self, pcm: bytes, sample_rate: int) -> str:
+        sr = self._sr
+        try:
+            return sr.Recognizer().recognize_google(sr.AudioData(pcm, sample_rate, 2), language=self.language)
+        except sr.UnknownValueError:
+            return ""
+        except sr.RequestError as e:
+            raise SpeechEngineError(f"Google Speech Recognition request failed: {e}") from e
+
+
+class VoskSTTEngine:
+    """Offline Kaldi recognition with a Vosk model directory (STT_MODEL_PATH)."""
+
+    cpu_bound = True
+
+    def __init__(self, model_path: str = settings.STT_MODEL_PATH):
+        try:
+            from vosk import KaldiRecognizer, Model, SetLogLevel
+        except ImportError as e:
+            raise ImportError("The vosk STT engine needs `pip install vosk` and a model in STT_MODEL_PATH.") from e
+        SetLogLevel(-1)
+        self._recognizer = KaldiRecognizer
+        self.model = Model(model_path)
+
+    def transcribe(self, pcm: bytes, sample_rate: int) -> str:
+        recognizer = self._recognizer(self.model, sample_rate)
+        recognizer.AcceptWaveform(pcm)
+        return json.loads(recognizer.FinalResult()).get("text", "")
+
+
+class WhisperSTTEngine:
+    """Offline Whisper recognition through faster-whisper (STT_MODEL_PATH is a model size or directory)."""
+
+    cpu_bound = True
+
+    def __init__(self, model_path: str = settings.STT_MODEL_PATH):
+        try:
+            from faster_whisper import WhisperModel
+        except ImportError as e:
+            raise ImportError("The whisper STT engine needs `pip install faster-whisper`.") from e
+        # One engine per pool process, so each decodes on a single core
+        self.model = WhisperModel(model_path or "base.en", device="cpu", compute_type="int8", cpu_threads=1)
+
+    def transcribe(self, pcm: bytes, sample_rate: int) -> str:
+        audio = np.frombuffer(pcm, dtype="<i2").astype(np.float32) / 32768.0
+        segments, _ = self.model.transcribe(audio, language="en", beam_size=1)
+        return " ".join(segment.text.strip() for segment in segments)
+
+
+# --- Text-to-speech engines: synthesize(text) -> audio file bytes in media_type ---
+
+class GTTSEngine:
+    """Google Translate text-to-speech over the network; MP3 output."""
+
+    cpu_bound = False
+    media_type = "audio/mpeg"
+
+    def __init__(self, language: str = settings.TTS_LANGUAGE, tld: str = "com", slow: bool = False):
+        from gtts import gTTS
+        self._gtts = gTTS
+        self.language = language
+        self.tld = tld
+        self.slow = slow
+        self.voice_id = f"gtts:{language}:{tld}:{int(slow)}"
+
+    def synthesize(self, text: str) -> bytes:
+        buffer = io.BytesIO()
+        try:
+            self._gtts(text=text, lang=self.language, tld=self.tld, slow=self.slow).write_to_fp(buffer)
+        except Exception as e:
+            raise SpeechEngineError(f"gTTS request failed: {e}") from e
+        return buffer.getvalue()
+
+
+class Pyttsx3Engine:
+    """Local, offline synthesis through the OS speech engine (eSpeak, SAPI5, NSSpeech); WAV output."""
+
+    cpu_bound = True
+    media_type = "audio/wav"
+
+    def __init__(self, rate: int = 175, voice: str = ""):
+        try:
+            import pyttsx3
+        except ImportError as e:
+            raise ImportError("The pyttsx3 TTS engine needs `pip install pyttsx3` (and eSpeak on Linux).") from e
+        self._engine = pyttsx3.init()
+        self._engine.setProperty("rate", rate)
+        if voice:
+            self._engine.setProperty("voice", voice)
+        # The engine's event loop is not thread-safe
+        self._lock = threading.Lock()
+        self.voice_id = f"pyttsx3:{voice or 'default'}:{rate}"
+
+    def synthesize(self, text: str) -> bytes:
+        fd, path = tempfile.mkstemp(suffix=".wav")
+        os.close(fd)
+        try:
+            with self._lock:
+                self._engine.save_to_file(text, path)
+                self._engine.runAndWait()
+            with open(path, "rb") as f:
+                return f.read()
+        finally:
+            os.remove(path)
+
+
+STT_ENGINES = {"google": GoogleSTTEngine, "vosk": VoskSTTEngine, "whisper": WhisperSTTEngine}
+TTS_ENGINES = {"gtts": GTTSEngine, "pyttsx3": Pyttsx3Engine}
+
+
+def _engine_class(kind: str, name: str):
+    """Engine class by registered name, or any class given as "package.module:ClassName"."""
+    engines = STT_ENGINES if kind == "stt" else TTS_ENGINES
+    if name in engines:
+        return engines[name]
+    if ":" in name:
+        module, _, attribute = name.partition(":")
+        return getattr(importlib.import_module(module), attribute)
+    raise ValueError(f"Unknown {kind.upper()} engine '{name}'. Use one of: {', '.join(engines)}, or module:Class.")
+
+
+# --- Pool worker side: one warm engine instance per process ---
+
+_worker_engine: Any = None
+
+
+def _init_worker(kind: str, name: str):
+    global _worker_engine
+    _worker_engine = _engine_class(kind, name)()
+
+
+def _worker_call(method: str, *args):
+    return getattr(_worker_engine, method)(*args)
+
+
+def _worker_ready() -> int:
+    # Held briefly so that each of the start-up calls lands on a different, initialized worker
+    time.sleep(0.1)
+    return os.getpid()
+
+
+def _worker_voice_id() -> Optional[str]:
+    return getattr(_worker_engine, "voice_id", None)
+
+
+class EngineRunner:
+    """Runs a speech engine off the event loop with a bounded queue.
+
+    CPU-bound (local) engines live in a process pool: every worker process loads its own model
+    once at start-up and keeps it warm, so concurrent requests scale across cores. Network-bound
+    engines share one in-process instance on a thread pool. At most `workers + max_queue` calls
+    may be pending; beyond that `run()` raises EngineBusyError instead of queueing without bound.
+    """
+
+    def __init__(self, kind: str, name: str, workers: Optional[int] = None, max_queue: int = settings.SPEECH_ENGINE_MAX_QUEUE):
+        self.kind = kind
+        self.name = name
+        engine_class = _engine_class(kind, name)
+        self.cpu_bound = engine_class.cpu_bound
+        self.workers = max(1, workers or (settings.SPEECH_ENGINE_PROCESSES if self.cpu_bound else settings.SPEECH_ENGINE_THREADS))
+        self.max_pending = self.workers + max(0, max_queue)
+        self.media_type = getattr(engine_class, "media_type", None)
+        self._engine: Any = None
+        self._executor: Optional[Executor] = None
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._counters = {"completed": 0, "failed": 0, "rejected": 0}
+        self._busy_seconds = 0.0
+        if not self.cpu_bound:
+            self._engine = engine_class()
+        self.voice_id = getattr(self._engine, "voice_id", f"{name}:default")
+
+    def _pool(self) -> Executor:
+        if self._executor is None:
+            if self.cpu_bound:
+                # spawn, not fork: the parent runs an event loop and threads that must not be copied
+                self._executor = ProcessPoolExecutor(
+                    self.workers, mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker, initargs=(self.kind, self.name),
+                )
+            else:
+                self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix=f"{self.kind}-{self.name}")
+        return self._executor
+
+    async def start(self):
+        """Starts the pool and waits until every worker has loaded its engine."""
+        if self.cpu_bound:
+            loop = asyncio.get_running_loop()
+            executor = self._pool()
+            pids = await asyncio.gather(*(loop.run_in_executor(executor, _worker_ready) for _ in range(self.workers)))
+            # Voice parameters of a pooled engine are only known inside the workers
+            self.voice_id = await loop.run_in_executor(executor, _worker_voice_id) or self.voice_id
+            print(f"{self.kind.upper()} engine '{self.name}' ready in {len(set(pids))} worker processes.")
+
+    async def run(self, method: str, *args) -> Any:
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self._counters["rejected"] += 1
+                raise EngineBusyError(f"{self.kind.upper()} engine '{self.name}' is at capacity ({self.max_pending} pending).")
+            self._pending += 1
+        started = time.perf_counter()
+        try:
+            loop = asyncio.get_running_loop()
+            with span(f"upstream:{self.kind}.{self.name}"):
+                if self.cpu_bound:
+                    result = await loop.run_in_executor(self._pool(), _worker_call, method, *args)
+                else:
+                    result = await loop.run_in_executor(self._pool(), getattr(self._engine, method), *args)
+            self._counters["completed"] += 1
+            return result
+        except Exception:
+            self._counters["failed"] += 1
+            raise
+        finally:
+            with self._lock:
+                self._pending -= 1
+                self._busy_seconds += time.perf_counter() - started
+
+    async def transcribe(self, pcm: bytes, sample_rate: int) -> str:
+        return await self.run("transcribe", pcm, sample_rate)
+
+    async def synthesize(self, text: str) -> bytes:
+        return await self.run("synthesize", text)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "engine": self.name,
+                "mode": "processes" if self.cpu_bound else "threads",
+                "workers": self.workers,
+                "pending": self._pending,
+                "max_pending": self.max_pending,
+                **self._counters,
+                "busy_seconds": round(self._busy_seconds, 3),
+            }
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
@@ -0,0 +1,50 @@
+import sqlite3
+import threading
+from typing import Any, List, Optional
+
+
+class ThreadLocalConnection:
+    """Callable returning this thread's connection to a SQLite file in WAL mode.
+
+    One connection per thread (sqlite3 connections must not be shared across threads by default);
+    WAL lets several agent processes read while one writes. `isolation_level` and `timeout` are
+    passed to sqlite3.connect; `synchronous=None` keeps SQLite's default durability.
+    """
+
+    def __init__(self, path: str, timeout: float = 5.0, isolation_level: Optional[str] = "",
+                 synchronous: Optional[str] = "NORMAL"):
+        self.path = path
+        self.timeout = timeout
+        self.isolation_level = isolation_level
+        self.synchronous = synchronous
+        self._local = threading.local()
+
+    def __call__(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=self.isolation_level)
+            conn.execute("PRAGMA journal_mode=WAL")
+            if self.synchronous:
+                conn.execute(f"PRAGMA synchronous={self.synchronous}")
+            self._local.conn = conn
+        return conn
+
+
+def evict_lru(conn: sqlite3.Connection, table: str, key_column: str, size_column: str, max_bytes: int,
+              keep: Any = None) -> List[Any]:
+    """Deletes the least recently used rows of `table` (by its last_access column) until the sizes
+    sum to at most max_bytes, never the row keyed `keep`. Runs inside the caller's transaction and
+    returns the keys deleted."""
+    total = conn.execute(f"SELECT COALESCE(SUM({size_column}), 0) FROM {table}").fetchone()[0]
+    removed = []
+    if total <= max_bytes:
+        return removed
+    for key, size in conn.execute(f"SELECT {key_column}, {size_column} FROM {table} ORDER BY last_access").fetchall():
+        if total <= max_bytes:
+            break
+        if key == keep:
+            continue
+        conn.execute(f"DELETE FROM {table} WHERE {key_column} = ?", (key,))
+        total -= size
+        removed.append(key)
+    return removed
@@ -0,0 +1,12 @@
+import json
+from typing import Any, Dict
+
+SSE_MEDIA_TYPE = "text/event-stream"
+# Disables response buffering in proxies (e.g. nginx) so events reach the client as they are sent
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+
+def format_sse(event: str, data: Dict[str, Any]) -> str:
+    """Encodes one Server-Sent Event with a JSON payload."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
@@ -0,0 +1,188 @@
+import csv
+import os
+import re
+from collections import deque
+from typing import Dict, Iterable, List, Set, Tuple
+
+# Upper-case tokens that look like symbols but almost never mean one in a market question
+NON_TICKER_WORDS = {
+    "A", "I", "AI", "API", "ATH", "CEO", "CFO", "CPI", "CTO", "EPS", "ESG", "ETF", "EU", "EUR", "EV", "FED",
+    "FOMC", "FX", "GBP", "GDP", "IPO", "JPY", "M&A", "MTD", "OK", "P/E", "PE", "QOQ", "Q1", "Q2", "Q3", "Q4",
+    "ROE", "ROI", "SEC", "UK", "US", "USA", "USD", "YOY", "YTD",
+}
+# Listed symbols that are also ordinary words or abbreviations; a bare mention is only a hint and is
+# confirmed by the LLM, while a "$"-prefixed mention is always taken literally
+AMBIGUOUS_SYMBOLS = {"ARM", "COIN", "COST", "DE", "DIS", "LOW", "MA", "MS", "NOW", "SHOP", "SNOW", "SPOT"}
+
+# $AAPL, MSFT, BRK-B, 0700.HK, ^GSPC
+_SYMBOL_TOKEN_RE = re.compile(r"(?<![\w^$.-])([$^]?)([A-Z0-9]{1,6}(?:[.-][A-Z]{1,2})?)(?![\w-])")
+_SYMBOL_RE = re.compile(r"\^?[A-Z0-9]{1,6}(?:[.-][A-Z]{1,2})?")
+_WORD_CHARS = re.compile(r"\w")
+
+
+class _AhoCorasick:
+    """Multi-pattern matcher that finds every alias occurrence in one pass over the text."""
+
+    def __init__(self, patterns: Iterable[Tuple[str, str]]):
+        self.goto: List[Dict[str, int]] = [{}]
+        self.fail: List[int] = [0]
+        self.output: List[List[Tuple[str, str]]] = [[]]
+        for pattern, value in patterns:
+            node = 0
+            for char in pattern:
+                if char not in self.goto[node]:
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.output.append([])
+                    self.goto[node][char] = len(self.goto) - 1
+                node = self.goto[node][char]
+            self.output[node].append((pattern, value))
+
+        queue = deque(self.goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in self.goto[node].items():
+                queue.append(child)
+                fallback = self.fail[node]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[child] = self.goto[fallback].get(char, 0)
+                self.output[child] = self.output[child] + self.output[self.fail[child]]
+
+    def finditer(self, text: str):
+        """Yields (start, end, pattern, value) for every match, including overlapping ones."""
+        node = 0
+        for i, char in enumerate(text):
+            while node and char not in self.goto[node]:
+                node = self.fail[node]
+            node = self.goto[node].get(char, 0)
+            for pattern, value in self.output[node]:
+                yield i + 1 - len(pattern), i + 1, pattern, value
+
+
+class TickerResolution:
+    """Outcome of the local pass over a question.
+
+    `tickers` are validated symbols in order of first mention. `ambiguous` holds symbols whose
+    mention may not mean the company, and `unresolved` holds symbol-like tokens that are not in the
+    symbol file. The local result is final only when both are empty.
+    """
+
+    def __init__(self, tickers: List[str], ambiguous: List[str], unresolved: List[str]):
+        self.tickers = tickers
+        self.ambiguous = ambiguous
+        self.unresolved = unresolved
+
+    @property
+    def is_confident(self) -> bool:
+        return bool(self.tickers) and not self.ambiguous and not self.unresolved
+
+
+class TickerResolver:
+    """Resolves tickers and company names in free text against a local symbol file.
+
+    The file is a CSV with `symbol,name,aliases` columns, where aliases are "|"-separated. Aliases
+    are matched case-insensitively on word boundaries, except those prefixed with "~" (company names
+    that are also common words, like "Target"), which must match exactly and only count as hints.
+    """
+
+    def __init__(self, entries: Iterable[Tuple[str, str, List[str]]] = ()):
+        self.names: Dict[str, str] = {}
+        patterns, exact_patterns = [], []
+        for symbol, name, aliases in entries:
+            symbol = symbol.strip().upper()
+            self.names[symbol] = name
+            for alias in aliases:
+                alias = alias.strip()
+                if alias.startswith("~"):
+                    exact_patterns.append((alias[1:], symbol))
+                elif alias:
+                    patterns.append((alias.lower(), symbol))
+        self._names_matcher = _AhoCorasick(patterns)
+        self._exact_matcher = _AhoCorasick(exact_patterns)
+
+    @classmethod
+    def from_file(cls, path: str) -> "TickerResolver":
+        if not os.path.exists(path):
+            print(f"Ticker symbol file not found at {path}; every question will fall back to the LLM.")
+            return cls()
+        with open(path, newline="", encoding="utf-8") as f:
+            rows = [
+                (row["symbol"], row.get("name") or "", (row.get("aliases") or "").split("|"))
+                for row in csv.DictReader(f) if row.get("symbol")
+            ]
+        return cls(rows)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def is_known(self, symbol: str) -> bool:
+        return self.normalize(symbol) in self.names
+
+    @staticmethod
+    def normalize(symbol: str) -> str:
+        return symbol.strip().lstrip("$").upper()
+
+    @staticmethod
+    def looks_like_symbol(symbol: str) -> bool:
+        """Whether a (normalized) string has the shape of a listed symbol, as opposed to a company name."""
+        return bool(_SYMBOL_RE.fullmatch(symbol))
+
+    def validate(self, symbols: Iterable[str]) -> Tuple[List[str], List[str]]:
+        """Splits symbols into (known, unknown), normalized and de-duplicated in order."""
+        known, unknown = [], []
+        for symbol in dict.fromkeys(self.normalize(s) for s in symbols if s and s.strip()):
+            (known if symbol in self.names else unknown).append(symbol)
+        return known, unknown
+
+    @staticmethod
+    def _on_word_boundary(text: str, start: int, end: int) -> bool:
+        before = text[start - 1] if start > 0 else " "
+        after = text[end] if end < len(text) else " "
+        return not _WORD_CHARS.match(before) and not _WORD_CHARS.match(after)
+
+    def _name_matches(self, text: str) -> List[Tuple[int, int, str, bool]]:
+        """Longest non-overlapping alias matches as (start, end, symbol, is_exact_only)."""
+        candidates = [(s, e, v, False) for s, e, _, v in self._names_matcher.finditer(text.lower())]
+        candidates += [(s, e, v, True) for s, e, _, v in self._exact_matcher.finditer(text)]
+        candidates = [c for c in candidates if self._on_word_boundary(text, c[0], c[1])]
+        # Prefer longer aliases ("bank of america" over "america"), then earlier ones
+        candidates.sort(key=lambda c: (c[0] - c[1], c[0]))
+        taken: List[Tuple[int, int]] = []
+        matches = []
+        for start, end, symbol, exact in candidates:
+            if any(start < t_end and t_start < end for t_start, t_end in taken):
+                continue
+            taken.append((start, end))
+            matches.append((start, end, symbol, exact))
+        return matches
+
+    def resolve(self, text: str) -> TickerResolution:
+        mentions: List[Tuple[int, str]] = []
+        ambiguous: Set[str] = set()
+        unresolved: List[str] = []
+
+        names = self._name_matches(text)
+        for start, _, symbol, exact in names:
+            if exact:
+                ambiguous.add(symbol)
+            mentions.append((start, symbol))
+
+        for match in _SYMBOL_TOKEN_RE.finditer(text):
+            if any(start <= match.start() < end for start, end, _, _ in names):
+                continue  # part of a company name, e.g. the "T" in "AT&T"
+            prefix, token = match.groups()
+            symbol = prefix + token if prefix == "^" else token
+            if symbol in self.names:
+                if not prefix and (len(symbol) == 1 or symbol in AMBIGUOUS_SYMBOLS):
+                    ambiguous.add(symbol)
+                mentions.append((match.start(), symbol))
+            elif prefix == "$" or (len(token) > 1 and not token.isdigit() and token not in NON_TICKER_WORDS):
+                unresolved.append(prefix + token)
+
+        ordered = list(dict.fromkeys(symbol for _, symbol in sorted(mentions)))
+        return TickerResolution(
+            tickers=[s for s in ordered if s not in ambiguous],
+            ambiguous=[s for s in ordered if s in ambiguous],
+            unresolved=list(dict.fromkeys(unresolved)),
+        )
@@ -0,0 +1,40 @@
+from typing import Any, Dict, Optional
+
+# Legacy AlphaVantage-shaped field names and their columnar counterparts
+_LEGACY_FIELDS = {
+    "open": "1. open",
+    "high": "2. high",
+    "low": "3. low",
+    "close": "4. close",
+}
+
+
+def to_columnar(payload: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Returns daily history as oldest-first parallel arrays (dates, open, high, low, close, volume).
+
+    Accepts the API Agent's columnar payload as-is, and converts the legacy
+    {"Time Series (Daily)": {date: {"4. close": "..."}}} shape for older callers.
+    Returns None if the payload holds no history.
+    """
+    if not payload:
+        return None
+    if "dates" in payload:
+        return payload if payload["dates"] else None
+
+    daily_data = payload.get("Time Series (Daily)", {})
+    if not daily_data:
+        return None
+    dates = sorted(daily_data)
+    columnar: Dict[str, Any] = {"format": "columnar", "dates": dates}
+    for field, legacy_key in _LEGACY_FIELDS.items():
+        columnar[field] = [_to_float(daily_data[d].get(legacy_key)) for d in dates]
+    # AlphaVantage's adjusted series numbers volume "6."; the yfinance-backed shape uses "5."
+    columnar["volume"] = [_to_float(daily_data[d].get("5. volume", daily_data[d].get("6. volume"))) for d in dates]
+    return columnar
+
+
+def _to_float(value: Any) -> Optional[float]:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
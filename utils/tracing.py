@@ -0,0 +1,235 @@
+import functools
+import inspect
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+from config.settings import settings
+
+TRACE_HEADER = "X-Trace-Id"
+# Upper bounds (seconds) of the latency histogram buckets; the last bucket is open-ended
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_trace_id: ContextVar[Optional[str]] = ContextVar("trace_id", default=None)
+_parent_span: ContextVar[Optional[str]] = ContextVar("parent_span", default=None)
+
+
+def new_trace_id() -> str:
+    return uuid.uuid4().hex[:16]
+
+
+def current_trace_id() -> Optional[str]:
+    return _trace_id.get()
+
+
+def trace_headers() -> Dict[str, str]:
+    """Headers that carry the current trace to another agent."""
+    trace_id = _trace_id.get()
+    return {TRACE_HEADER: trace_id} if trace_id else {}
+
+
+@contextmanager
+def use_trace(trace_id: Optional[str]):
+    """Makes trace_id the current trace for the enclosed code (and tasks/threads started from it)."""
+    token = _trace_id.set(trace_id or new_trace_id())
+    try:
+        yield _trace_id.get()
+    finally:
+        _trace_id.reset(token)
+
+
+def percentile(samples: List[float], pct: float) -> Optional[float]:
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return round(ordered[min(len(ordered) - 1, int(pct / 100 * len(ordered)))], 4)
+
+
+class _Latency:
+    """Cumulative histogram plus a sliding window of recent samples for percentiles."""
+
+    def __init__(self, window: int):
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.count = 0
+        self.errors = 0
+        self.total = 0.0
+        self.samples: Deque[float] = deque(maxlen=window)
+
+    def observe(self, seconds: float, error: bool):
+        index = next((i for i, bound in enumerate(LATENCY_BUCKETS) if seconds <= bound), len(LATENCY_BUCKETS))
+        self.buckets[index] += 1
+        self.count += 1
+        self.errors += int(error)
+        self.total += seconds
+        self.samples.append(seconds)
+
+    def snapshot(self) -> Dict[str, Any]:
+        samples = list(self.samples)
+        bounds = [str(bound) for bound in LATENCY_BUCKETS] + ["+Inf"]
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "avg_seconds": round(self.total / self.count, 4) if self.count else None,
+            "p50_seconds": percentile(samples, 50),
+            "p90_seconds": percentile(samples, 90),
+            "p99_seconds": percentile(samples, 99),
+            "buckets": dict(zip(bounds, self.buckets)),
+        }
+
+
+class MetricsRegistry:
+    """Process-wide latency metrics keyed by span name, plus the spans of recent traces.
+
+    Span names are prefixed by what they measure: "http:" requests served, "stage:" brief
+    pipeline steps, "agent:" calls to other agents, "upstream:" external services and engines
+    (yfinance, NewsAPI, Gemini, SEC, embeddings, speech) and "cache:" answers served from a cache
+    in place of an upstream call.
+    """
+
+    def __init__(self, window: int = settings.METRICS_SAMPLE_WINDOW, max_traces: int = settings.TRACE_MAX_TRACES):
+        self.window = window
+        self.max_traces = max_traces
+        self.started_at = time.time()
+        self._latencies: Dict[str, _Latency] = {}
+        self._traces: "OrderedDict[str, List[Dict[str, Any]]]" = OrderedDict()
+        self._stats_sources: Dict[str, Callable[[], Any]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, name: str, seconds: float, error: bool = False, trace_id: Optional[str] = None,
+                parent: Optional[str] = None, started_at: Optional[float] = None):
+        with self._lock:
+            latency = self._latencies.get(name)
+            if latency is None:
+                latency = self._latencies[name] = _Latency(self.window)
+            latency.observe(seconds, error)
+            if trace_id:
+                spans = self._traces.get(trace_id)
+                if spans is None:
+                    spans = self._traces[trace_id] = []
+                    while len(self._traces) > self.max_traces:
+                        self._traces.popitem(last=False)
+                spans.append({
+                    "name": name,
+                    "parent": parent,
+                    "start": round(started_at if started_at is not None else time.time() - seconds, 4),
+                    "duration_seconds": round(seconds, 4),
+                    "error": error,
+                })
+
+    def add_stats_source(self, name: str, source: Callable[[], Any]):
+        """Adds a component's stats (cache hit rates, queue depth, ...) to the /metrics output."""
+        self._stats_sources[name] = source
+
+    def trace(self, trace_id: str) -> List[Dict[str, Any]]:
+        with self._lock:
+            return sorted(self._traces.get(trace_id, []), key=lambda span: span["start"])
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            latency = {name: self._latencies[name].snapshot() for name in sorted(self._latencies)}
+        stats = {}
+        for name, source in self._stats_sources.items():
+            try:
+                stats[name] = source()
+            except Exception as e:
+                stats[name] = {"error": str(e)}
+        return {"uptime_seconds": round(time.time() - self.started_at, 1), "latency": latency, "stats": stats}
+
+
+metrics = MetricsRegistry()
+
+
+def observe(name: str, seconds: float, error: bool = False, started_at: Optional[float] = None):
+    """Records a span that was timed elsewhere (e.g. by callbacks) under the current trace."""
+    metrics.observe(name, seconds, error, _trace_id.get(), _parent_span.get(), started_at)
+
+
+@contextmanager
+def span(name: str):
+    """Times the enclosed block as a span of the current trace (or just as a metric if there is none)."""
+    parent = _parent_span.get()
+    token = _parent_span.set(name)
+    started_at, started = time.time(), time.perf_counter()
+    error = False
+    try:
+        yield
+    except BaseException:
+        error = True
+        raise
+    finally:
+        _parent_span.reset(token)
+        metrics.observe(name, time.perf_counter() - started, error, _trace_id.get(), parent, started_at)
+
+
+def traced(name: str):
+    """Decorator form of span() for sync and async functions."""
+
+    def decorate(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with span(name):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+        return wrapper
+
+    return decorate
+
+
+class TracingMiddleware:
+    """ASGI middleware: adopts the caller's X-Trace-Id (or starts a trace), times every request
+    as an "http:" span named after its route template, and echoes the trace id in the response."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        headers = dict(scope.get("headers") or [])
+        incoming = headers.get(TRACE_HEADER.lower().encode())
+        with use_trace(incoming.decode("latin-1") if incoming else None) as trace_id:
+            status = {"code": 500}
+
+            async def send_with_trace(message):
+                if message["type"] == "http.response.start":
+                    status["code"] = message["status"]
+                    message = {**message, "headers": [*message.get("headers", []), (TRACE_HEADER.lower().encode(), trace_id.encode())]}
+                await send(message)
+
+            started_at, started = time.time(), time.perf_counter()
+            try:
+                await self.app(scope, receive, send_with_trace)
+            finally:
+                # Route templates ("/api/stock_quote/{symbol}") keep the number of series bounded
+                route = getattr(scope.get("route"), "path", None) or "unmatched"
+                if route not in ("/metrics", "/traces/{trace_id}"):
+                    metrics.observe(f"http:{scope['method']} {route}", time.perf_counter() - started,
+                                    status["code"] >= 500, trace_id, None, started_at)
+
+
+def install_tracing(app, stats: Optional[Dict[str, Callable[[], Any]]] = None):
+    """Adds trace propagation and request timing to an agent's FastAPI app, plus GET /metrics
+    (latency percentiles and histograms per span, error counts, component stats) and
+    GET /traces/{trace_id} (this process's spans of one trace)."""
+    app.add_middleware(TracingMiddleware)
+    for name, source in (stats or {}).items():
+        metrics.add_stats_source(name, source)
+
+    @app.get("/metrics")
+    async def get_metrics():
+        return metrics.snapshot()
+
+    @app.get("/traces/{trace_id}")
+    async def get_trace(trace_id: str):
+        return {"trace_id": trace_id, "spans": metrics.trace(trace_id)}
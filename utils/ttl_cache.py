@@ -0,0 +1,212 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional, Tuple
+
+
+class _Flight:
+    """An in-progress upstream load that concurrent callers for the same key wait on."""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.value: Any = None
+        self.found = False
+        self.error: Optional[BaseException] = None
+        self.error_message: Optional[str] = None
+
+
+class TTLCache:
+    """Thread-safe in-process cache with per-entry TTL, LRU eviction and single-flight loading.
+
+    Concurrent misses for the same key share one call to the loader: the first caller runs it
+    and the others block until its result (or exception) is available.
+    """
+
+    def __init__(self, ttl_seconds: float, max_size: int, name: str = "cache"):
+        self.ttl_seconds = ttl_seconds
+        self.max_size = max_size
+        self.name = name
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._flights: Dict[Hashable, _Flight] = {}
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._coalesced = 0
+        self._evictions = 0
+        self._expirations = 0
+
+    # --- Internal helpers (call with self._lock held) ---
+
+    def _lookup(self, key: Hashable) -> Tuple[bool, Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return False, None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            self._expirations += 1
+            return False, None
+        self._entries.move_to_end(key)
+        return True, value
+
+    def _store(self, key: Hashable, value: Any, ttl_seconds: Optional[float] = None):
+        ttl = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self._evictions += 1
+
+    # --- Public API ---
+
+    def get(self, key: Hashable) -> Tuple[bool, Any]:
+        """Returns (found, value) without loading anything on a miss."""
+        with self._lock:
+            found, value = self._lookup(key)
+            if found:
+                self._hits += 1
+            else:
+                self._misses += 1
+            return found, value
+
+    def set(self, key: Hashable, value: Any, ttl_seconds: Optional[float] = None):
+        with self._lock:
+            self._store(key, value, ttl_seconds)
+
+    def get_or_load(self, key: Hashable, loader: Callable[[], Any]) -> Any:
+        """Returns the cached value for key, calling loader() at most once across concurrent misses.
+
+        Exceptions raised by the loader are not cached; they are re-raised to every waiting caller.
+        """
+        with self._lock:
+            found, value = self._lookup(key)
+            if found:
+                self._hits += 1
+                return value
+            flight = self._flights.get(key)
+            is_leader = flight is None
+            if is_leader:
+                self._misses += 1
+                flight = self._flights[key] = _Flight()
+            else:
+                self._coalesced += 1
+
+        if not is_leader:
+            flight.event.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        try:
+            value = loader()
+            flight.value, flight.found = value, True
+            with self._lock:
+                self._store(key, value)
+            return value
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+            flight.event.set()
+
+    def get_many_or_load(
+        self,
+        keys: Iterable[Hashable],
+        loader: Callable[[List[Hashable]], Tuple[Dict[Hashable, Any], Dict[Hashable, str]]],
+    ) -> Tuple[Dict[Hashable, Any], Dict[Hashable, str]]:
+        """Batch variant of get_or_load.
+
+        Keys that are neither cached nor already being loaded are passed to one loader(missing_keys)
+        call, which returns (values, errors) dicts keyed like the input. Keys already in flight from
+        another caller are waited on instead of being fetched again. Errors are not cached.
+        """
+        values: Dict[Hashable, Any] = {}
+        errors: Dict[Hashable, str] = {}
+        led: Dict[Hashable, _Flight] = {}
+        followed: Dict[Hashable, _Flight] = {}
+
+        with self._lock:
+            for key in dict.fromkeys(keys):
+                found, value = self._lookup(key)
+                if found:
+                    self._hits += 1
+                    values[key] = value
+                elif key in self._flights:
+                    self._coalesced += 1
+                    followed[key] = self._flights[key]
+                else:
+                    self._misses += 1
+                    led[key] = self._flights[key] = _Flight()
+
+        if led:
+            try:
+                loaded, load_errors = loader(list(led))
+            except BaseException as e:
+                for flight in led.values():
+                    flight.error = e
+                raise
+            else:
+                with self._lock:
+                    for key, flight in led.items():
+                        if key in loaded:
+                            flight.value, flight.found = loaded[key], True
+                            self._store(key, loaded[key])
+                            values[key] = loaded[key]
+                        else:
+                            flight.error_message = load_errors.get(key, f"No data returned for {key}.")
+                            errors[key] = flight.error_message
+            finally:
+                with self._lock:
+                    for key in led:
+                        self._flights.pop(key, None)
+                for flight in led.values():
+                    flight.event.set()
+
+        for key, flight in followed.items():
+            flight.event.wait()
+            if flight.found:
+                values[key] = flight.value
+            elif flight.error is not None:
+                errors[key] = str(flight.error)
+            else:
+                errors[key] = flight.error_message or f"No data returned for {key}."
+
+        return values, errors
+
+    def invalidate(self, key: Hashable) -> bool:
+        """Drops a single entry. Returns True if it was cached."""
+        with self._lock:
+            return self._entries.pop(key, None) is not None
+
+    def invalidate_where(self, predicate: Callable[[Hashable], bool]) -> int:
+        """Drops every entry whose key matches predicate. Returns the number of entries removed."""
+        with self._lock:
+            stale = [key for key in self._entries if predicate(key)]
+            for key in stale:
+                del self._entries[key]
+            return len(stale)
+
+    def clear(self) -> int:
+        with self._lock:
+            removed = len(self._entries)
+            self._entries.clear()
+            return removed
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self._hits + self._misses + self._coalesced
+            return {
+                "name": self.name,
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self._hits,
+                "misses": self._misses,
+                "coalesced": self._coalesced,
+                "evictions": self._evictions,
+                "expirations": self._expirations,
+                "in_flight": len(self._flights),
+                "hit_rate": round(self._hits / lookups, 4) if lookups else 0.0,
+            }
@@ -0,0 +1,156 @@
+import asyncio
+import hashlib
+import io
+import os
+import re
+import struct
+import time
+from typing import AsyncIterator, Dict, List
+
+import soundfile as sf
+
+from config.settings import settings
+from utils.speech_engines import EngineRunner
+from utils.sqlite_store import ThreadLocalConnection, evict_lru
+
+# Sentence ends: ., ! or ? followed by whitespace and an upper-case letter, digit or quote
+_SENTENCE_END_RE = re.compile(r"[.!?]+[\"')\]]*\s+(?=[A-Z0-9\"'(])")
+# Words whose trailing period does not end a sentence ("Apple Inc. reported", "the U.S. market")
+_ABBREVIATION_RE = re.compile(r"(?:\b[A-Z]|\b[A-Z]\.[A-Z]|Inc|Corp|Co|Ltd|Mr|Ms|Mrs|Dr|vs|St|Jr|No|approx)\.$")
+
+
+def split_sentences(text: str, min_chars: int = settings.TTS_MIN_SEGMENT_CHARS) -> List[str]:
+    """Splits text into sentences, merging very short ones into the next so each synthesis call
+    carries enough text to sound natural."""
+    text = " ".join(text.split())
+    parts, start = [], 0
+    for match in _SENTENCE_END_RE.finditer(text):
+        if _ABBREVIATION_RE.search(text[start:match.start() + 1]):
+            continue
+        parts.append(text[start:match.end()].strip())
+        start = match.end()
+    parts.append(text[start:].strip())
+
+    segments: List[str] = []
+    for part in filter(None, parts):
+        if segments and len(segments[-1]) < min_chars:
+            segments[-1] = f"{segments[-1]} {part}"
+        else:
+            segments.append(part)
+    return segments
+
+
+def speech_key(voice_id: str, text: str) -> str:
+    """Content hash of a segment's text, scoped to the backend and its voice parameters."""
+    return hashlib.sha256(f"{voice_id}\x00{text}".encode("utf-8")).hexdigest()
+
+
+class SpeechCache:
+    """Size-bounded on-disk cache of synthesized segments (SQLite blobs, least recently used evicted)."""
+
+    def __init__(self, path: str = settings.TTS_CACHE_PATH, max_bytes: int = settings.TTS_CACHE_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._connection = ThreadLocalConnection(path)
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self._connection() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS speech (key TEXT PRIMARY KEY, audio BLOB NOT NULL, "
+                "size INTEGER NOT NULL, last_access REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS speech_lru ON speech(last_access)")
+
+    def get(self, key: str):
+        with self._connection() as conn:
+            row = conn.execute("SELECT audio FROM speech WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                conn.execute("UPDATE speech SET last_access = ? WHERE key = ?", (time.time(), key))
+        return row[0] if row else None
+
+    def put(self, key: str, audio: bytes):
+        with self._connection() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO speech (key, audio, size, last_access) VALUES (?, ?, ?, ?)",
+                (key, audio, len(audio), time.time()),
+            )
+            evict_lru(conn, "speech", "key", "size", self.max_bytes, keep=key)
+
+    def stats(self) -> Dict[str, int]:
+        entries, stored = self._connection().execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM speech").fetchone()
+        return {"entries": entries, "stored_bytes": stored, "max_bytes": self.max_bytes}
+
+
+def _wav_stream_header(sample_rate: int, channels: int) -> bytes:
+    """16-bit PCM WAV header with unknown length, so segments can follow as they are synthesized."""
+    block = channels * 2
+    return b"RIFF" + struct.pack("<I", 0xFFFFFFFF) + b"WAVEfmt " + struct.pack(
+        "<IHHIIHH", 16, 1, channels, sample_rate, sample_rate * block, block, 16
+    ) + b"data" + struct.pack("<I", 0xFFFFFFFF)
+
+
+class SpeechSynthesizer:
+    """Sentence-parallel text-to-speech with a persistent segment cache.
+
+    Text is split into sentences; cached segments are read from disk and the rest are synthesized
+    concurrently on the TTS engine (at most `concurrency` per text). `stream()` yields the audio in
+    sentence order as soon as each segment is ready, so playback starts after the first sentence.
+    MP3 segments are concatenated as-is; WAV segments are re-framed into one continuous stream.
+    """
+
+    def __init__(self, engine: EngineRunner = None, cache: SpeechCache = None, concurrency: int = settings.TTS_CONCURRENCY):
+        self.engine = engine or EngineRunner("tts", settings.TTS_ENGINE)
+        self.cache = cache or SpeechCache()
+        self.concurrency = max(1, concurrency)
+        self._counters = {"segments": 0, "cache_hits": 0, "synthesized": 0}
+
+    @property
+    def media_type(self) -> str:
+        return self.engine.media_type
+
+    async def _segment(self, text: str) -> bytes:
+        key = speech_key(self.engine.voice_id, text)
+        audio = await asyncio.to_thread(self.cache.get, key)
+        self._counters["segments"] += 1
+        if audio is not None:
+            self._counters["cache_hits"] += 1
+            return audio
+        audio = await self.engine.synthesize(text)
+        await asyncio.to_thread(self.cache.put, key, audio)
+        self._counters["synthesized"] += 1
+        return audio
+
+    async def stream(self, text: str) -> AsyncIterator[bytes]:
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def segment(sentence: str) -> bytes:
+            async with semaphore:
+                return await self._segment(sentence)
+
+        tasks = [asyncio.create_task(segment(sentence)) for sentence in split_sentences(text)]
+        try:
+            header_sent = False
+            for task in tasks:
+                audio = await task
+                if self.media_type != "audio/wav":
+                    yield audio
+                    continue
+                samples, rate = sf.read(io.BytesIO(audio), dtype="int16", always_2d=True)
+                if not header_sent:
+                    yield _wav_stream_header(rate, samples.shape[1])
+                    header_sent = True
+                yield samples.tobytes()
+        finally:
+            for task in tasks:
+                task.cancel() # client went away: stop synthesizing the remaining sentences
+
+    async def synthesize(self, text: str) -> bytes:
+        """The whole recording as one file."""
+        audio = bytearray(b"".join([chunk async for chunk in self.stream(text)]))
+        if self.media_type == "audio/wav" and audio:
+            # The length is known now; fill in the sizes left open for streaming
+            audio[4:8] = struct.pack("<I", len(audio) - 8)
+            audio[40:44] = struct.pack("<I", len(audio) - 44)
+        return bytes(audio)
+
+    def stats(self) -> Dict[str, object]:
+        return {"voice": self.engine.voice_id, **self._counters, "engine": self.engine.stats(), "cache": self.cache.stats()}